@@ -0,0 +1,33 @@
+class EagerLoadingSerializerMixin:
+    """
+    Lets a serializer declare the relations its fields read.
+    - `select_related_fields`: forward FK / one-to-one relations (joined in the same query).
+    - `prefetch_related_fields`: many-to-many / reverse relations (one extra query each).
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix=''):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*(prefix + field for field in cls.select_related_fields))
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*(prefix + field for field in cls.prefetch_related_fields))
+        return queryset
+
+
+class EagerLoadingMixin:
+    """
+    View mixin that applies the serializer's declared relations to every queryset
+    the view reads, so list endpoints cost a constant number of queries per page.
+    - `eager_loading_prefix` is used when the view's queryset is not of the
+      serializer's model (e.g. `'post__'` for timeline rows that point at posts).
+    """
+    eager_loading_prefix = ''
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset, prefix=self.eager_loading_prefix)
+        return queryset
@@ -0,0 +1,158 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a fixed tuple of ordering fields.
+    - The cursor stores the ordering values of the last row of a page, so the next
+      page is `WHERE (a, b) < (last_a, last_b)` instead of an OFFSET, and the cost
+      of a page does not depend on how deep the client has scrolled.
+    - `ordering` must end with a unique field (usually `id`) so that ties are stable,
+      and should be backed by a composite index on the same columns.
+    - Works on querysets of model instances and of `.values()` dicts.
+    """
+    ordering = ('-created_on', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.get_ordering(reverse)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, position))
+
+        # Fetch one extra row to know whether another page follows
+        results = list(queryset[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return tuple(self.ordering)
+        return tuple(field[1:] if field.startswith('-') else f"-{field}" for field in self.ordering)
+
+    def get_keyset_filter(self, ordering, position):
+        """
+        Builds `(a < x) OR (a = x AND b < y) OR ...` for the given ordering,
+        flipping each comparison for ascending fields.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def get_position(self, item):
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            value = item[name] if isinstance(item, dict) else getattr(item, name)
+            # isoformat() keeps microseconds, which the keyset comparison needs
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return position
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = data['p']
+            reverse = bool(data.get('r', False))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return self.clean_position(position), reverse
+
+    def clean_position(self, position):
+        """Converts cursor values through the ordering fields, so a tampered cursor is a 404 and not a 500."""
+        cleaned = []
+        for field, value in zip(self.ordering, position):
+            if value is None or isinstance(value, (dict, list, bool)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(self.model._meta.get_field(field.lstrip('-')).to_python(value))
+            except (FieldDoesNotExist, ValidationError, TypeError, ValueError, OverflowError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def encode_cursor(self, position, reverse=False):
+        data = {'p': position}
+        if reverse:
+            data['r'] = True
+        encoded = base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
@@ -30,6 +30,7 @@ AUTHENTICATION_BACKENDS = [
 
 
 import os
+import sys
 from datetime import timedelta
 
 
@@ -182,14 +183,89 @@ TEMPLATES = [
 WSGI_APPLICATION = "ITIHub.wsgi.application"
 ASGI_APPLICATION = 'ITIHub.asgi.application'
 
+# Redis is shared by the channel layer (db 0) and the cache (db 1)
+REDIS_HOST = os.getenv("REDIS_HOST", "127.0.0.1")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+
+# `manage.py test` runs without Redis
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)],
+            "hosts": [(REDIS_HOST, REDIS_PORT)],
         },
     },
 }
+if TESTING:
+    CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/1",
+        "KEY_PREFIX": "itihub",
+    },
+}
+if TESTING or os.getenv("USE_LOCMEM_CACHE"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
+# WebSocket token auth (see chat/middleware.py): decoded tokens are cached per process
+WS_AUTH_CACHE_TTL = 300
+WS_AUTH_CACHE_SIZE = 10000
+WS_AUTH_CLAIMS_ONLY = False  # True: trust the JWT claims and skip the user lookup entirely
+
+# Group chat membership checks (see chat/membership.py)
+CHAT_MEMBERSHIP_LOCAL_TTL = 5  # seconds a process trusts its own copy
+CHAT_MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+
+# Group chat write-behind buffer (see chat/buffer.py): broadcast first, bulk-insert
+# every CHAT_WRITE_BUFFER_INTERVAL_MS or CHAT_WRITE_BUFFER_MAX_MESSAGES messages
+CHAT_WRITE_BUFFER = True
+CHAT_WRITE_BUFFER_INTERVAL_MS = 50
+CHAT_WRITE_BUFFER_MAX_MESSAGES = 100
+CHAT_WRITE_BUFFER_MAX_ATTEMPTS = 3  # retries for a message whose INSERT failed for a transient reason
+
+# Chat presence and typing (see chat/presence.py): a socket's presence expires
+# unless it is refreshed within CHAT_PRESENCE_TTL seconds; typing events from one
+# socket are coalesced to one per CHAT_TYPING_THROTTLE seconds
+CHAT_PRESENCE_BACKEND = "chat.presence.RedisPresenceBackend"
+CHAT_PRESENCE_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/2"
+if TESTING:
+    CHAT_PRESENCE_BACKEND = "chat.presence.InMemoryPresenceBackend"
+CHAT_PRESENCE_TTL = 60
+CHAT_TYPING_THROTTLE = 3
+
+# Rendered post / feed page caching (see posts/cache.py)
+POST_CACHE_TIMEOUT = 60 * 60
+FEED_PAGE_CACHE_TIMEOUT = 30
+
+# Notification fan-out pipeline (see notifications/pipeline.py)
+NOTIFICATION_QUEUE_BACKEND = "notifications.pipeline.DatabaseQueueBackend"
+NOTIFICATION_WORKERS = 2
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_PIPELINE_EAGER = TESTING  # tests see notifications right after the write
+NOTIFICATION_WORKERS_AUTOSTART = True  # set False when running `manage.py run_notification_workers`
+# "collapsed": one notification per (member, group) carrying an unread counter;
+# "per_message": one notification per member per group message (old behaviour)
+GROUP_CHAT_NOTIFICATION_MODE = "collapsed"
+# False: chat messages create no notification rows; unread chat state then comes
+# only from the read cursors (see chat/receipts.py and /api/chat/unread/)
+CHAT_MESSAGE_NOTIFICATIONS = True
+# Reactions / mentions on the same target merge into one unread row for this long (seconds)
+NOTIFICATION_COALESCE_WINDOW = 24 * 60 * 60
+# Read notifications older than this are pruned (see notifications/retention.py)
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_RETENTION_BATCH = 1000
+NOTIFICATION_RETENTION_ARCHIVE = False  # copy to ArchivedNotification before deleting
+NOTIFICATION_RETENTION_INTERVAL = 6 * 60 * 60  # run inside the worker pool; None to use the command only
+# Mark-all-as-read / clear-all walk the rows in primary-key chunks of this size (0 = one statement)
+NOTIFICATION_BULK_BATCH_SIZE = 1000
 default_app_config = 'ITIHub.apps.ITIHubConfig'
 
 
@@ -201,6 +277,17 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Take the write lock at BEGIN so concurrent writers queue on the busy
+            # timeout instead of failing on a read -> write lock upgrade.
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
+        # A file-backed test database, so threaded tests get the same locking
+        # as a real deployment (the shared in-memory one fails fast with "table is locked").
+        "TEST": {
+            "NAME": BASE_DIR / "test_db.sqlite3",
+        },
     }
 }
 
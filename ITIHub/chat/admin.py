@@ -5,6 +5,7 @@ from .models import *
 admin.site.register(GroupChat)
 admin.site.register(GroupMessage)
 admin.site.register(ChatMessage)
+admin.site.register(ConversationSummary)
 from .models import ChatBotMessage
 
 admin.site.register(ChatBotMessage)
\ No newline at end of file
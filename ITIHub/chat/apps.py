@@ -2,3 +2,6 @@ from django.apps import AppConfig
 
 class ChatConfig(AppConfig):
     name = 'chat'
+
+    def ready(self):
+        import chat.signals
@@ -0,0 +1,158 @@
+"""
+Write-behind buffer for group chat messages.
+
+GroupChatConsumer broadcasts a message first and then hands it to this buffer
+instead of awaiting a single-row INSERT. The buffer is per worker process and
+writes its pending messages with one `bulk_create` when either
+CHAT_WRITE_BUFFER_MAX_MESSAGES messages are waiting or
+CHAT_WRITE_BUFFER_INTERVAL_MS has passed since the first of them arrived.
+
+Durability:
+- consumers flush on disconnect and before edit / delete / clear, which need ids;
+- pending messages are written at interpreter exit (atexit);
+- when the batch INSERT fails, its messages are written one by one: rows the
+  database rejects (IntegrityError, e.g. their group was deleted) are dropped and
+  logged. Any other failure stops the batch there and puts the unwritten rest back
+  at the head of the buffer, so ids keep following send order, and re-arms the
+  timer. A message is dropped after CHAT_WRITE_BUFFER_MAX_ATTEMPTS failures, so
+  one bad row never holds up the rest for long.
+Messages still in memory when the process is killed hard are lost; set
+CHAT_WRITE_BUFFER = False to persist every message before broadcasting it.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from .models import GroupMessage, group_messages_created
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, "CHAT_WRITE_BUFFER", True)
+INTERVAL_MS = getattr(settings, "CHAT_WRITE_BUFFER_INTERVAL_MS", 50)
+MAX_MESSAGES = getattr(settings, "CHAT_WRITE_BUFFER_MAX_MESSAGES", 100)
+MAX_ATTEMPTS = getattr(settings, "CHAT_WRITE_BUFFER_MAX_ATTEMPTS", 3)
+
+
+class MessageWriteBuffer:
+    def __init__(self, interval_ms=INTERVAL_MS, max_messages=MAX_MESSAGES):
+        self.interval = interval_ms / 1000
+        self.max_messages = max_messages
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._timer_loop = None
+        self._loop = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def add(self, message):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._pending.append(message)
+            self._loop = loop
+            full = len(self._pending) >= self.max_messages
+            if not full:
+                self._arm_timer(loop)
+        if full:
+            await self.flush()
+
+    def _arm_timer(self, loop):
+        # Called with the lock held. A timer left on a loop that has since gone
+        # away never fires; start a new one
+        if self._timer is None or self._timer_loop is not loop:
+            self._timer = loop.call_later(self.interval, self._schedule_flush)
+            self._timer_loop = loop
+
+    def _rearm(self):
+        with self._lock:
+            if self._pending and self._loop is not None:
+                self._arm_timer(self._loop)
+
+    def _schedule_flush(self):
+        self._timer = None
+        asyncio.ensure_future(self.flush()).add_done_callback(self._flush_done)
+
+    @staticmethod
+    def _flush_done(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Flushing buffered group messages failed", exc_info=future.exception())
+
+    async def flush(self):
+        self._cancel_timer()
+        # database_sync_to_async runs on one shared thread, so batches are taken and
+        # written in order, and a flush also waits for a write already in progress
+        await database_sync_to_async(self._write_pending)()
+
+    def flush_sync(self):
+        self._cancel_timer()
+        self._write_pending()
+
+    def _cancel_timer(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _write_pending(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self.write(batch)
+
+    def write(self, batch):
+        try:
+            with transaction.atomic():
+                messages = GroupMessage.objects.bulk_create(batch)
+        except Exception:
+            logger.exception("Writing %s buffered group messages failed; writing them one by one", len(batch))
+            messages = self.write_each(batch)
+        if messages:
+            group_messages_created.send(sender=GroupMessage, messages=messages)
+
+    def write_each(self, batch):
+        written = []
+        for index, message in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    GroupMessage.objects.bulk_create([message])
+            except IntegrityError:
+                logger.exception("Dropping buffered group message for group %s: rejected by the database", message.group_id)
+                continue
+            except Exception:
+                message._write_attempts = getattr(message, "_write_attempts", 1) + 1
+                if message._write_attempts > MAX_ATTEMPTS:
+                    logger.exception("Dropping buffered group message for group %s after %s attempts",
+                                     message.group_id, MAX_ATTEMPTS)
+                    continue
+                logger.exception("Writing buffered group message for group %s failed; retrying", message.group_id)
+                self._requeue(batch[index:])
+                break
+            written.append(message)
+        return written
+
+    def _requeue(self, messages):
+        # Back at the head: these were sent before anything still pending
+        with self._lock:
+            self._pending[:0] = messages
+            loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._rearm)
+
+
+message_buffer = MessageWriteBuffer()
+
+
+@atexit.register
+def _flush_at_exit():
+    if not message_buffer:
+        return
+    try:
+        message_buffer.flush_sync()
+    finally:
+        close_old_connections()
@@ -1,13 +1,14 @@
 import logging  # Add this import
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
 import json
 from datetime import datetime
-from .models import GroupMessage, ChatMessage
-from django.contrib.auth.models import User
+from .models import GroupMessage, ChatMessage, conversation_key
+from . import buffer, inbox, membership, presence, receipts
+from .buffer import message_buffer
 import os
 import django
-from django.db.models import Q  # Add this import
 
 logger = logging.getLogger(__name__)
 
@@ -15,13 +16,105 @@ logger = logging.getLogger(__name__)
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ITIHub.settings')
 django.setup()
 
-class GroupChatConsumer(AsyncWebsocketConsumer):
+class ReadReceiptsMixin:
+    """Reports the reader's cursor back to them and shares cursor moves with the room."""
+
+    async def send_read_state(self, state):
+        await self.send(text_data=json.dumps({
+            "event": "read_state",
+            "last_read_id": state.last_read_id,
+            "unread_count": state.unread_count,
+        }))
+        if state.moved:
+            await self.channel_layer.group_send(
+                self.group_name,
+                {
+                    "type": "read_receipt",
+                    "user_id": self.user.id,
+                    "username": self.user.username,
+                    "message_id": state.last_read_id,
+                }
+            )
+
+    async def read_receipt(self, event):
+        await self.send(text_data=json.dumps({
+            "event": "read_receipt",
+            "user_id": event["user_id"],
+            "username": event["username"],
+            "message_id": event["message_id"],
+        }))
+
+class PresenceMixin:
+    """Keeps the socket registered in its presence rooms and relays throttled typing events."""
+    presence_rooms = ()
+
+    async def enter_presence(self, rooms):
+        """Registers the socket; True if it is the user's first connection to the first room."""
+        self.presence_rooms = rooms
+        self.presence_refreshed = time.monotonic()
+        self.typing_throttle = presence.TypingThrottle()
+        joined = [await sync_to_async(presence.join)(room, self.user.id, self.channel_name) for room in rooms]
+        return joined[0]
+
+    async def refresh_presence(self, force=False):
+        if not self.presence_rooms:
+            return
+        if not force and time.monotonic() - self.presence_refreshed < presence.TTL / 3:
+            return
+        self.presence_refreshed = time.monotonic()
+        for room in self.presence_rooms:
+            await sync_to_async(presence.join)(room, self.user.id, self.channel_name)
+
+    async def leave_presence(self):
+        """Unregisters the socket; True if the user has no connection left in the first room."""
+        left = [await sync_to_async(presence.leave)(room, self.user.id, self.channel_name) for room in self.presence_rooms]
+        self.presence_rooms = ()
+        return bool(left) and left[0]
+
+    async def relay_typing(self, is_typing):
+        if not self.typing_throttle.should_send(is_typing):
+            return
+        await self.channel_layer.group_send(
+            self.group_name,
+            {
+                "type": "typing",
+                "user_id": self.user.id,
+                "username": self.user.username,
+                "is_typing": is_typing,
+                "expires_in": self.typing_throttle.expires_in,
+                "channel": self.channel_name,
+            }
+        )
+
+    async def typing(self, event):
+        # The typist's own socket does not need its echo
+        if event["channel"] == self.channel_name:
+            return
+        await self.send(text_data=json.dumps({
+            "event": "typing",
+            "user_id": event["user_id"],
+            "username": event["username"],
+            "is_typing": event["is_typing"],
+            "expires_in": event["expires_in"],
+        }))
+
+    async def handle_presence_action(self, action, data):
+        """Heartbeat and typing frames; True if `action` was one of them."""
+        await self.refresh_presence(force=action == 'heartbeat')
+        if action == 'heartbeat':
+            return True
+        if action == 'typing':
+            await self.relay_typing(bool(data.get('is_typing', True)))
+            return True
+        return False
+
+class GroupChatConsumer(PresenceMixin, ReadReceiptsMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.group_id = self.scope['url_route']['kwargs'].get('group_id')
         self.user = self.scope['user']
 
-        # Ensure the user is authenticated
-        if self.user.is_anonymous:
+        # Ensure the user is authenticated and belongs to the group
+        if self.user.is_anonymous or not await membership.ais_group_member(self.group_id, self.user.id):
             await self.close()
             return
 
@@ -34,6 +127,9 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         await self.accept()
+        # Only a user's first open socket counts as joining
+        if not await self.enter_presence([f"group:{self.group_id}", f"user:{self.user.id}"]):
+            return
         # Notify the group of a new connection (optional)
         await self.channel_layer.group_send(
             self.group_name,
@@ -45,11 +141,18 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
         )
 
     async def disconnect(self, close_code):
-        if hasattr(self, 'group_name'):
-            await self.channel_layer.group_discard(
-                self.group_name,
-                self.channel_name
-            )
+        # Persist whatever this process still holds before the socket goes away
+        await message_buffer.flush()
+        # Rejected connections never joined the group
+        if not hasattr(self, 'group_name'):
+            return
+        await self.channel_layer.group_discard(
+            self.group_name,
+            self.channel_name
+        )
+        # Only the user's last socket closing counts as leaving
+        if not await self.leave_presence():
+            return
         # Notify the group of a disconnection (optional)
         await self.channel_layer.group_send(
             self.group_name,
@@ -61,13 +164,18 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
         )
 
     async def receive(self, text_data):
+        # Membership can be revoked while the socket is open
+        if not await membership.ais_group_member(self.group_id, self.user.id):
+            await self.close(code=4403)
+            return
+
         data = json.loads(text_data)
-        action = data.get('action')  # Determine the action (send, edit, delete, clear)
+        action = data.get('action')  # Determine the action (send, typing, heartbeat, read, edit, delete, clear)
+        if await self.handle_presence_action(action, data):
+            return
 
         if action == 'send':
             message = data['message']
-            # Save the message to the database
-            await self.save_group_message(message)
             # Broadcast the message to the group
             await self.channel_layer.group_send(
                 self.group_name,
@@ -78,6 +186,15 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
                     "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
                 }
             )
+            # Save the message to the database (write-behind, see buffer.py)
+            await self.save_group_message(message)
+            return
+
+        # Edit / delete / clear / read address stored messages, so write out pending ones first
+        await message_buffer.flush()
+        if action == 'read':
+            state = await self.mark_group_read(data.get('message_id'))
+            await self.send_read_state(state)
         elif action == 'edit':
             message_id = data['message_id']
             new_content = data['new_content']
@@ -162,13 +279,15 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
         }))
 
     @sync_to_async
-    def save_group_message(self, message):
-        # Save the message to the database
-        GroupMessage.objects.create(
-            group_id=self.group_id,
-            sender=self.user,
-            content=message
-        )
+    def mark_group_read(self, message_id=None):
+        return receipts.mark_group_read(self.user.id, self.group_id, message_id)
+
+    async def save_group_message(self, message):
+        message = GroupMessage(group_id=self.group_id, sender_id=self.user.id, content=message)
+        if buffer.ENABLED:
+            await message_buffer.add(message)
+        else:
+            await sync_to_async(message.save)()
 
     @sync_to_async
     def edit_group_message(self, message_id, new_content):
@@ -187,7 +306,7 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
         # Delete all messages in the group chat from the database
         GroupMessage.objects.filter(group_id=self.group_id).delete()
 
-class PrivateChatConsumer(AsyncWebsocketConsumer):
+class PrivateChatConsumer(PresenceMixin, ReadReceiptsMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope['user']
         self.other_user_id = self.scope['url_route']['kwargs']['user_id']
@@ -206,9 +325,13 @@ class PrivateChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         await self.accept()
+        await self.enter_presence([f"private:{conversation_key(self.user.id, self.other_user_id)}", f"user:{self.user.id}"])
+        # Opening the conversation reads it
+        await self.send_read_state(await self.mark_conversation_read())
 
     async def disconnect(self, close_code):
         if hasattr(self, 'group_name'):
+            await self.leave_presence()
             await self.channel_layer.group_discard(
                 self.group_name,
                 self.channel_name
@@ -216,9 +339,13 @@ class PrivateChatConsumer(AsyncWebsocketConsumer):
 
     async def receive(self, text_data):
         data = json.loads(text_data)
-        action = data.get('action')  # Determine the action (send, edit, delete, clear)
+        action = data.get('action')  # Determine the action (read, send, typing, heartbeat, edit, delete, clear)
+        if await self.handle_presence_action(action, data):
+            return
 
-        if action == 'send':
+        if action == 'read':
+            await self.send_read_state(await self.mark_conversation_read(data.get('message_id')))
+        elif action == 'send':
             message = data['message']
             # Save the message to the database
             await self.save_private_message(message)
@@ -299,32 +426,33 @@ class PrivateChatConsumer(AsyncWebsocketConsumer):
             "message": "Private chat has been cleared."
         }))
 
+    @sync_to_async
+    def mark_conversation_read(self, message_id=None):
+        return receipts.mark_conversation_read(self.user.id, self.other_user_id, message_id)
+
     @sync_to_async
     def save_private_message(self, message):
         # Save the message to the database
-        other_user = User.objects.get(id=self.other_user_id)
         ChatMessage.objects.create(
-            sender=self.user,
-            receiver=other_user,
+            sender_id=self.user.id,
+            receiver_id=self.other_user_id,
             message=message
         )
 
     @sync_to_async
     def edit_private_message(self, message_id, new_content):
         # Update the message in the database
-        message = ChatMessage.objects.get(id=message_id, sender=self.user)
+        message = ChatMessage.objects.get(id=message_id, sender_id=self.user.id)
         message.message = new_content
         message.save()
 
     @sync_to_async
     def delete_private_message(self, message_id):
         # Delete the message from the database
-        ChatMessage.objects.filter(id=message_id, sender=self.user).delete()
+        ChatMessage.objects.filter(id=message_id, sender_id=self.user.id).delete()
 
     @sync_to_async
     def clear_private_messages(self):
         # Delete all messages in the private chat from the database
-        ChatMessage.objects.filter(
-            Q(sender=self.user, receiver_id=self.other_user_id) |
-            Q(sender_id=self.other_user_id, receiver=self.user)
-        ).delete()
\ No newline at end of file
+        inbox.clear(self.user.id, self.other_user_id)
+        ChatMessage.objects.conversation(self.user.id, self.other_user_id).delete()
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+Per-participant conversation summaries (ConversationSummary) behind the inbox.
+
+Each private message updates the two summary rows of its conversation: the last
+message for both, plus one more unread for the receiver; the sender's own count
+drops to zero and their read cursor moves to the message, since replying means
+they have seen the conversation (see receipts.py). The inbox is
+then one index range over the user's rows instead of a scan of every message
+they ever sent or received.
+"""
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, OuterRef, Q, Subquery, Value, When
+
+from .models import ChatMessage, ConversationSummary, conversation_key
+
+
+def record_message(message):
+    """Called for every new private message (post_save)."""
+    if not message.receiver_id or message.receiver_id == message.sender_id:
+        return
+    key = message.conversation_key or conversation_key(message.sender_id, message.receiver_id)
+    with transaction.atomic():
+        ConversationSummary.objects.bulk_create(
+            [
+                ConversationSummary(user_id=message.sender_id, other_user_id=message.receiver_id, conversation_key=key),
+                ConversationSummary(user_id=message.receiver_id, other_user_id=message.sender_id, conversation_key=key),
+            ],
+            ignore_conflicts=True,
+        )
+        rows = ConversationSummary.objects.filter(conversation_key=key)
+        rows.update(
+            unread_count=Case(When(user_id=message.receiver_id, then=F('unread_count') + 1), default=Value(0)),
+            last_read_id=Case(
+                When(user_id=message.sender_id, then=Value(message.id)),
+                default=F('last_read_id'),
+                output_field=BigIntegerField(),
+            ),
+        )
+        # Messages saved concurrently may commit out of order; keep the newest one
+        rows.filter(Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.timestamp)).update(
+            last_message_id=message.id, last_message_at=message.timestamp
+        )
+
+
+def refresh_last_message(key):
+    """
+    Points rows whose last message was deleted (set to NULL by the foreign key) at
+    the newest remaining message of the conversation. A no-op for other deletes.
+    """
+    latest = ChatMessage.objects.filter(conversation_key=OuterRef('conversation_key')).order_by('-timestamp', '-id')
+    ConversationSummary.objects.filter(conversation_key=key, last_message__isnull=True).update(
+        last_message_id=Subquery(latest.values('id')[:1]),
+        last_message_at=Subquery(latest.values('timestamp')[:1]),
+    )
+
+
+def clear(user_id, other_user_id):
+    """Drops both summary rows once a conversation has been cleared."""
+    ConversationSummary.objects.filter(conversation_key=conversation_key(user_id, other_user_id)).delete()
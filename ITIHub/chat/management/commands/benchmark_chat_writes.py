@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from chat.buffer import MessageWriteBuffer
+from chat.models import GroupChat, GroupMessage
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures group chat messages/sec through one process's receive path: a per-message "
+        "INSERT (CHAT_WRITE_BUFFER = False) versus the write-behind buffer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000)
+        parser.add_argument('--max-messages', type=int, default=100, help="Buffer size that triggers a flush.")
+        parser.add_argument('--interval-ms', type=int, default=50, help="Buffer flush interval.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        stamp = int(time.time())
+        user = User.objects.create_user(username=f"bench_{stamp}", email=f"bench_{stamp}@example.invalid", password=None)
+        group = GroupChat.objects.create(name=f"bench {stamp}")
+        group.members.add(user)
+        try:
+            for mode in ("direct", "buffered"):
+                elapsed, persisted = asyncio.run(self.run(mode, group, user, options))
+                self.stdout.write(
+                    f"{mode:8} messages={options['messages']} elapsed={elapsed:6.2f} s "
+                    f"throughput={options['messages'] / elapsed:8.0f} msg/s  "
+                    f"receive path={elapsed / options['messages'] * 1000:6.3f} ms/msg  persisted={persisted}"
+                )
+                GroupMessage.objects.filter(group=group).delete()
+        finally:
+            group.delete()
+            user.delete()
+
+    async def run(self, mode, group, user, options):
+        buffer = MessageWriteBuffer(interval_ms=options['interval_ms'], max_messages=options['max_messages'])
+        save = database_sync_to_async(lambda message: message.save())
+        start = time.perf_counter()
+        for i in range(options['messages']):
+            message = GroupMessage(group_id=group.id, sender_id=user.id, content=f"message {i}")
+            if mode == "direct":
+                await save(message)
+            else:
+                await buffer.add(message)
+        # The consumer flushes on disconnect; count it so both modes end fully persisted
+        await buffer.flush()
+        elapsed = time.perf_counter() - start
+        persisted = await database_sync_to_async(GroupMessage.objects.filter(group=group).count)()
+        return elapsed, persisted
@@ -0,0 +1,95 @@
+"""
+Who may use a group chat socket: the group's members and supervisors.
+
+Consumers check this on connect and on every received frame, so lookups are
+layered to stay off the database:
+- a per-process dict, trusted for CHAT_MEMBERSHIP_LOCAL_TTL seconds;
+- the shared Django cache (Redis), deleted by the m2m_changed receivers in
+  chat/signals.py whenever members or supervisors change;
+- one query over both m2m tables when neither has the group.
+Other processes notice a change within the local TTL. Cache errors are logged and
+fall through to the database, so a cache outage never drops sockets.
+"""
+import logging
+import threading
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import GroupChat
+
+logger = logging.getLogger(__name__)
+
+LOCAL_TTL = getattr(settings, "CHAT_MEMBERSHIP_LOCAL_TTL", 5)
+CACHE_TIMEOUT = getattr(settings, "CHAT_MEMBERSHIP_CACHE_TIMEOUT", 60 * 60)
+
+_local = {}
+_lock = threading.Lock()
+
+
+def _key(group_id):
+    return f"chat:group:{group_id}:members"
+
+
+def _local_get(group_id):
+    with _lock:
+        entry = _local.get(group_id)
+    if entry and entry[1] > time.monotonic():
+        return entry[0]
+    return None
+
+
+def _local_set(group_id, member_ids):
+    with _lock:
+        _local[group_id] = (member_ids, time.monotonic() + LOCAL_TTL)
+
+
+def load_member_ids(group_id):
+    members = GroupChat.members.through.objects.filter(groupchat_id=group_id).values_list("user_id", flat=True)
+    supervisors = GroupChat.supervisors.through.objects.filter(groupchat_id=group_id).values_list("user_id", flat=True)
+    return frozenset(members.union(supervisors))
+
+
+def group_member_ids(group_id):
+    member_ids = _local_get(group_id)
+    if member_ids is not None:
+        return member_ids
+    try:
+        cached = cache.get(_key(group_id))
+    except Exception:
+        logger.exception("Group membership cache read failed")
+        cached = None
+    if cached is not None:
+        member_ids = frozenset(cached)
+    else:
+        member_ids = load_member_ids(group_id)
+        try:
+            cache.set(_key(group_id), list(member_ids), CACHE_TIMEOUT)
+        except Exception:
+            logger.exception("Group membership cache write failed")
+    _local_set(group_id, member_ids)
+    return member_ids
+
+
+def is_group_member(group_id, user_id):
+    return user_id in group_member_ids(group_id)
+
+
+async def ais_group_member(group_id, user_id):
+    # A fresh local entry answers without leaving the event loop
+    member_ids = _local_get(group_id)
+    if member_ids is None:
+        member_ids = await database_sync_to_async(group_member_ids)(group_id)
+    return user_id in member_ids
+
+
+def invalidate(group_ids):
+    with _lock:
+        for group_id in group_ids:
+            _local.pop(group_id, None)
+    try:
+        cache.delete_many([_key(group_id) for group_id in group_ids])
+    except Exception:
+        logger.exception("Group membership cache delete failed")
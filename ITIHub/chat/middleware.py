@@ -1,4 +1,10 @@
+import hashlib
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+
 import django
 from urllib.parse import parse_qs
 from channels.auth import AuthMiddlewareStack
@@ -8,12 +14,96 @@ from channels.db import database_sync_to_async
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ITIHub.settings')
 django.setup()
 
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Decoded tokens are cached per process for at most this long (and never past the token's expiry)
+AUTH_CACHE_TTL = getattr(settings, "WS_AUTH_CACHE_TTL", 300)
+AUTH_CACHE_SIZE = getattr(settings, "WS_AUTH_CACHE_SIZE", 10000)
+# Build the scope user from the JWT claims alone, without a database read
+AUTH_CLAIMS_ONLY = getattr(settings, "WS_AUTH_CLAIMS_ONLY", False)
+
+CLAIM_FIELDS = ("user_id", "username", "is_student", "is_supervisor")
+
+
+class UserSnapshot:
+    """
+    Lightweight, read-only stand-in for the User model in a socket's scope.
+    Carries only what the consumers read; use `id` for foreign keys.
+    """
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+
+    def __init__(self, id, username, is_student=False, is_supervisor=False):
+        self.id = self.pk = id
+        self.username = username
+        self.is_student = is_student
+        self.is_supervisor = is_supervisor
+
+    def __str__(self):
+        return self.username
+
+    def __repr__(self):
+        return f"<UserSnapshot {self.id} {self.username}>"
+
+
+class TokenUserCache:
+    """Thread-safe LRU of token digest -> (UserSnapshot, expires_at)."""
+
+    def __init__(self, ttl=AUTH_CACHE_TTL, max_size=AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, token, user, token_expiry):
+        expires_at = min(time.time() + self.ttl, token_expiry)
+        with self._lock:
+            self._entries[self.key(token)] = (user, expires_at)
+            self._entries.move_to_end(self.key(token))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_user_cache = TokenUserCache()
+
+
 class TokenAuthMiddleware:
     """
     Custom middleware to authenticate WebSocket connections using a token.
+    - With `?token=<access token>` the scope user is a UserSnapshot, served from a
+      per-process cache of decoded tokens; on a miss it comes from the token claims
+      (WS_AUTH_CLAIMS_ONLY) or from one database read.
+    - Without a token the connection goes through the session-based `fallback`.
+    Deactivating a user takes effect on their sockets after at most WS_AUTH_CACHE_TTL.
     """
-    def __init__(self, inner):
+    def __init__(self, inner, fallback=None):
         self.inner = inner
+        self.fallback = fallback or inner
 
     async def __call__(self, scope, receive, send):
         # Parse the query string to extract the token
@@ -22,35 +112,53 @@ class TokenAuthMiddleware:
         token = query_params.get('token', [None])[0]
 
         if not token:
-            print("No token provided in the query string.")
-            scope['user'] = await self.get_anonymous_user()
-        else:
-            scope['user'] = await self.get_user_from_token(token)
+            return await self.fallback(scope, receive, send)
 
+        scope = dict(scope, user=await self.get_user_from_token(token))
         return await self.inner(scope, receive, send)
 
-    @database_sync_to_async
-    def get_user_from_token(self, token):
+    async def get_user_from_token(self, token):
         # IMPORT ALL DJANGO COMPONENTS INSIDE THE ASYNC-SAFE METHOD
         from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
         from rest_framework_simplejwt.tokens import AccessToken
-        from django.contrib.auth import get_user_model
-        from django.contrib.auth.models import AnonymousUser
+
+        user = token_user_cache.get(token)
+        if user is not None:
+            return user
 
         try:
             access_token = AccessToken(token)
-            User = get_user_model()
-            user = User.objects.get(id=access_token['user_id'])
-            print(f"Authenticated user: {user}")
-            return user
-        except (InvalidToken, TokenError, User.DoesNotExist) as e:
-            print(f"Authentication error: {e}")
+        except (InvalidToken, TokenError) as e:
+            logger.info("WebSocket authentication error: %s", e)
             return AnonymousUser()
 
+        # Tokens from the refresh endpoint do not carry the custom claims
+        if AUTH_CLAIMS_ONLY and all(field in access_token for field in CLAIM_FIELDS):
+            user = UserSnapshot(
+                id=access_token['user_id'],
+                username=access_token['username'],
+                is_student=access_token['is_student'],
+                is_supervisor=access_token['is_supervisor'],
+            )
+        else:
+            user = await self.load_user(access_token['user_id'])
+            if user is None:
+                return AnonymousUser()
+
+        token_user_cache.set(token, user, access_token['exp'])
+        return user
+
     @database_sync_to_async
-    def get_anonymous_user(self):
-        from django.contrib.auth.models import AnonymousUser
-        return AnonymousUser()
+    def load_user(self, user_id):
+        from django.contrib.auth import get_user_model
+
+        row = (
+            get_user_model().objects.filter(id=user_id, is_active=True)
+            .values('id', 'username', 'is_student', 'is_supervisor')
+            .first()
+        )
+        return UserSnapshot(**row) if row else None
+
 
 def TokenAuthMiddlewareStack(inner):
-    return TokenAuthMiddleware(AuthMiddlewareStack(inner))
\ No newline at end of file
+    return TokenAuthMiddleware(inner, fallback=AuthMiddlewareStack(inner))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sender', 'receiver', 'timestamp', 'id'], name='chat_message_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupmessage',
+            index=models.Index(fields=['group', 'timestamp', 'id'], name='group_message_history_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Cast, Concat, Greatest, Least
+
+
+def backfill_conversation_keys(apps, schema_editor):
+    # One UPDATE computing "min:max" in the database, so large tables are not loaded row by row
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    ChatMessage.objects.filter(sender__isnull=False, receiver__isnull=False).update(
+        conversation_key=Concat(
+            Cast(Least('sender_id', 'receiver_id'), models.CharField()),
+            models.Value(':'),
+            Cast(Greatest('sender_id', 'receiver_id'), models.CharField()),
+            output_field=models.CharField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='chat_message_history_idx',
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='conversation_key',
+            field=models.CharField(blank=True, editable=False, max_length=41, null=True),
+        ),
+        migrations.RunPython(backfill_conversation_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['conversation_key', 'timestamp', 'id'], name='chat_conversation_idx'),
+        ),
+    ]
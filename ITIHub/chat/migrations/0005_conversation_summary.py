@@ -0,0 +1,63 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    ConversationSummary = apps.get_model('chat', 'ConversationSummary')
+    Notification = apps.get_model('notifications', 'Notification')
+
+    last_ids = (
+        ChatMessage.objects.filter(conversation_key__isnull=False)
+        .values('conversation_key').annotate(last_id=models.Max('id')).values_list('last_id', flat=True)
+    )
+    # Unread private-chat notifications are the best record of what each side has not seen
+    unread = {
+        (row['recipient_id'], row['sender_id']): row['total']
+        for row in Notification.objects.filter(notification_type='chat', is_read=False)
+        .values('recipient_id', 'sender_id').annotate(total=models.Count('id')).order_by()
+    }
+    rows = []
+    for message in ChatMessage.objects.filter(id__in=list(last_ids)).exclude(sender_id=models.F('receiver_id')):
+        for user_id, other_id in ((message.sender_id, message.receiver_id), (message.receiver_id, message.sender_id)):
+            rows.append(ConversationSummary(
+                user_id=user_id,
+                other_user_id=other_id,
+                conversation_key=message.conversation_key,
+                last_message_id=message.id,
+                last_message_at=message.timestamp,
+                unread_count=unread.get((user_id, other_id), 0),
+            ))
+    ConversationSummary.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_conversation_key'),
+        ('notifications', '0007_coalesced_notifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conversation_key', models.CharField(max_length=41)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.chatmessage')),
+                ('other_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'last_message_at', 'id'], name='conversation_inbox_idx'), models.Index(fields=['conversation_key'], name='conversation_summary_key_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'other_user'), name='unique_conversation_summary')],
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
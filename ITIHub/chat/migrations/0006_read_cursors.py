@@ -0,0 +1,75 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def start_cursors(apps, schema_editor):
+    # Conversations with nothing unread were read up to their last message
+    ConversationSummary = apps.get_model('chat', 'ConversationSummary')
+    ConversationSummary.objects.filter(unread_count=0).update(last_read_id=models.F('last_message_id'))
+
+    # Group members start at their group's newest message instead of the whole history
+    GroupChat = apps.get_model('chat', 'GroupChat')
+    GroupMessage = apps.get_model('chat', 'GroupMessage')
+    GroupReadCursor = apps.get_model('chat', 'GroupReadCursor')
+    newest = dict(
+        GroupMessage.objects.values('group_id').annotate(newest=models.Max('id'))
+        .values_list('group_id', 'newest').order_by()
+    )
+    members = GroupChat.members.through.objects.values_list('groupchat_id', 'user_id').iterator()
+    batch = []
+    for group_id, user_id in members:
+        batch.append(GroupReadCursor(user_id=user_id, group_id=group_id, last_read_id=newest.get(group_id, 0)))
+        if len(batch) >= 1000:
+            GroupReadCursor.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    GroupReadCursor.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_conversation_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationsummary',
+            name='last_read_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['conversation_key', 'id'], name='chat_conversation_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupmessage',
+            index=models.Index(fields=['group', 'id'], name='group_message_unread_idx'),
+        ),
+        migrations.AddField(
+            model_name='groupreadcursor',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chat.groupchat'),
+        ),
+        migrations.AddField(
+            model_name='groupreadcursor',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_read_cursors', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='groupreadcursor',
+            constraint=models.UniqueConstraint(fields=('user', 'group'), name='unique_group_read_cursor'),
+        ),
+        migrations.RunPython(start_cursors, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,19 @@
 from django.db import models
 from django.conf import settings  # Import settings to reference AUTH_USER_MODEL
+from django.dispatch import Signal
+
+# Sent after the write-behind buffer bulk-inserts group messages, which skips
+# post_save. Args: messages (list of GroupMessage with ids).
+group_messages_created = Signal()
+# Sent when a read cursor moves forward. Args: user_id, last_read_id and either
+# other_user_id (private conversation) or group_id.
+messages_read = Signal()
+
+
+def conversation_key(user_id, other_id):
+    """Canonical "min:max" key of a private conversation, the same from both sides."""
+    low, high = sorted((int(user_id), int(other_id)))
+    return f"{low}:{high}"
 
 
 class GroupChat(models.Model):
@@ -17,19 +31,94 @@ class GroupMessage(models.Model):
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # History pages: a group's messages newest first (see chat/pagination.py)
+            models.Index(fields=['group', 'timestamp', 'id'], name='group_message_history_idx'),
+            # Unread counts: messages after a member's read cursor
+            models.Index(fields=['group', 'id'], name='group_message_unread_idx'),
+        ]
+
     def __str__(self):
         return f'{self.sender.username}: {self.content[:20]}'
 
+class ChatMessageQuerySet(models.QuerySet):
+    def conversation(self, user_id, other_id):
+        """Both directions of a private chat, as one range on chat_conversation_idx."""
+        return self.filter(conversation_key=conversation_key(user_id, other_id))
+
+
 class ChatMessage(models.Model):
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="sent_messages", on_delete=models.CASCADE)
     receiver = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="received_messages", on_delete=models.CASCADE, null=True, blank=True)
     group_chat = models.ForeignKey(GroupChat, on_delete=models.CASCADE, null=True, blank=True)
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # "min_user_id:max_user_id", set on save for private messages (see conversation_key)
+    conversation_key = models.CharField(max_length=41, null=True, blank=True, editable=False)
+
+    objects = ChatMessageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # History pages and clears: a whole conversation is one range on this index
+            models.Index(fields=['conversation_key', 'timestamp', 'id'], name='chat_conversation_idx'),
+            # Unread counts: messages after a participant's read cursor
+            models.Index(fields=['conversation_key', 'id'], name='chat_conversation_unread_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.sender_id and self.receiver_id:
+            self.conversation_key = conversation_key(self.sender_id, self.receiver_id)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'conversation_key'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.sender.username}: {self.message[:20]}'
 
+class ConversationSummary(models.Model):
+    """
+    One participant's inbox entry for a private conversation; each conversation has
+    two rows, one per participant. Maintained on write by chat/inbox.py.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='conversations', on_delete=models.CASCADE)
+    other_user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    conversation_key = models.CharField(max_length=41)
+    last_message = models.ForeignKey(ChatMessage, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    # Read cursor: id of the newest message this participant has read (see chat/receipts.py)
+    last_read_id = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'other_user'], name='unique_conversation_summary'),
+        ]
+        indexes = [
+            # Inbox pages: a user's conversations, most recent first
+            models.Index(fields=['user', 'last_message_at', 'id'], name='conversation_inbox_idx'),
+            models.Index(fields=['conversation_key'], name='conversation_summary_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.other_user_id} ({self.unread_count} unread)"
+
+class GroupReadCursor(models.Model):
+    """A member's read position in a group chat; unread is the range of messages after it."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='group_read_cursors', on_delete=models.CASCADE)
+    group = models.ForeignKey(GroupChat, related_name='read_cursors', on_delete=models.CASCADE)
+    last_read_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'group'], name='unique_group_read_cursor'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} read {self.group_id} up to {self.last_read_id}"
+
 class ChatBotMessage(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     message = models.TextField()
@@ -0,0 +1,58 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from ITIHub.pagination import KeysetCursorPagination
+
+
+class MessageCursorPagination(KeysetCursorPagination):
+    """
+    Chat history newest first, paged by message id:
+    - no cursor: the latest `limit` messages;
+    - `?before=<id>`: the page of older messages ("load older", the `next` link);
+    - `?after=<id>`: the page of newer messages (the `previous` link).
+    The anchor message is looked up inside the same history, and the page is a
+    keyset range on `(timestamp, id)` served by the history indexes.
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
+    invalid_cursor_message = 'Unknown message'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.queryset = queryset
+        return super().paginate_queryset(queryset, request, view)
+
+    def decode_cursor(self, request):
+        for param, reverse in (('before', False), ('after', True)):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                anchor = self.queryset.filter(id=int(value)).values('timestamp', 'id').first()
+            except ValueError:
+                anchor = None
+            if anchor is None:
+                raise NotFound(self.invalid_cursor_message)
+            return [anchor['timestamp'], anchor['id']], reverse
+        return None, False
+
+    def message_link(self, param, message):
+        url = remove_query_param(remove_query_param(self.base_url, 'before'), 'after')
+        return replace_query_param(url, param, message.id)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.message_link('before', self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.message_link('after', self.page[0])
+
+
+class InboxCursorPagination(KeysetCursorPagination):
+    """A user's conversations, most recently active first (conversation_inbox_idx)."""
+    ordering = ('-last_message_at', '-id')
+    page_size = 30
@@ -0,0 +1,171 @@
+"""
+Who is connected to the chat, kept out of the database.
+
+Every chat socket registers its connection in a few presence rooms:
+"group:<id>" for a group chat socket, "private:<conversation_key>" for a private
+one, and "user:<id>" for both. Each registration expires CHAT_PRESENCE_TTL seconds
+ahead; sockets refresh it while they are used (at most every TTL / 3 seconds, or
+on an explicit heartbeat) and remove it on disconnect. Connections of a crashed
+process simply age out. A user is present in a room while any of their
+connections is.
+
+Backends (CHAT_PRESENCE_BACKEND):
+- RedisPresenceBackend: one sorted set per room, member "<user_id>:<connection>",
+  score = expiry time; shared by every process (CHAT_PRESENCE_URL).
+- InMemoryPresenceBackend: the same in a process-local dict, for single-node / dev use.
+
+Typing indicators are coalesced per socket by TypingThrottle.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+BACKEND = getattr(settings, "CHAT_PRESENCE_BACKEND", "chat.presence.InMemoryPresenceBackend")
+PRESENCE_URL = getattr(settings, "CHAT_PRESENCE_URL", "redis://localhost:6379/2")
+TTL = getattr(settings, "CHAT_PRESENCE_TTL", 60)
+TYPING_THROTTLE = getattr(settings, "CHAT_TYPING_THROTTLE", 3)
+
+
+def _user_id(member):
+    if isinstance(member, bytes):
+        member = member.decode()
+    return int(member.split(":", 1)[0])
+
+
+class RedisPresenceBackend:
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(PRESENCE_URL)
+
+    def key(self, room):
+        return f"presence:{room}"
+
+    def add(self, room, user_id, connection, expires_at):
+        """Registers or refreshes a connection; True if the user had no other live one."""
+        key = self.key(room)
+        pipe = self.client.pipeline()
+        pipe.zrangebyscore(key, time.time(), "+inf")
+        pipe.zadd(key, {f"{user_id}:{connection}": expires_at})
+        # Idle rooms disappear on their own
+        pipe.expire(key, int(TTL * 2))
+        live = pipe.execute()[0]
+        return user_id not in {_user_id(member) for member in live}
+
+    def remove(self, room, user_id, connection):
+        """Drops a connection; True if the user has no live connection left."""
+        key = self.key(room)
+        pipe = self.client.pipeline()
+        pipe.zrem(key, f"{user_id}:{connection}")
+        pipe.zremrangebyscore(key, "-inf", time.time())
+        pipe.zrange(key, 0, -1)
+        remaining = pipe.execute()[2]
+        return user_id not in {_user_id(member) for member in remaining}
+
+    def user_ids(self, rooms):
+        """Present user ids of each room, in one round trip."""
+        now = time.time()
+        pipe = self.client.pipeline()
+        for room in rooms:
+            pipe.zrangebyscore(self.key(room), now, "+inf")
+        return [{_user_id(member) for member in members} for members in pipe.execute()]
+
+
+class InMemoryPresenceBackend:
+    """Process-local presence; only correct when every socket is served by this process."""
+
+    def __init__(self):
+        self._rooms = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def _live(self, room):
+        now = time.time()
+        connections = self._rooms[room]
+        for member in [member for member, expires_at in connections.items() if expires_at <= now]:
+            del connections[member]
+        return connections
+
+    def add(self, room, user_id, connection, expires_at):
+        with self._lock:
+            connections = self._live(room)
+            joined = user_id not in {_user_id(member) for member in connections}
+            connections[f"{user_id}:{connection}"] = expires_at
+        return joined
+
+    def remove(self, room, user_id, connection):
+        with self._lock:
+            connections = self._live(room)
+            connections.pop(f"{user_id}:{connection}", None)
+            left = user_id not in {_user_id(member) for member in connections}
+            if not connections:
+                del self._rooms[room]
+        return left
+
+    def user_ids(self, rooms):
+        with self._lock:
+            return [{_user_id(member) for member in self._live(room)} for room in rooms]
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(BACKEND)()
+        return _backend
+
+
+def join(room, user_id, connection):
+    return get_backend().add(room, user_id, connection, time.time() + TTL)
+
+
+def leave(room, user_id, connection):
+    return get_backend().remove(room, user_id, connection)
+
+
+def present_user_ids(room):
+    return get_backend().user_ids([room])[0]
+
+
+def online_user_ids(user_ids):
+    """The subset of `user_ids` with at least one open chat socket."""
+    user_ids = list(user_ids)
+    present = get_backend().user_ids([f"user:{user_id}" for user_id in user_ids])
+    return {user_id for user_id, users in zip(user_ids, present) if users}
+
+
+class TypingThrottle:
+    """
+    Coalesces one socket's typing events: the first "typing" of a burst is sent,
+    repeats within CHAT_TYPING_THROTTLE seconds are dropped, and a "stopped" is
+    sent once after a burst. Clients expire an indicator after `expires_in` seconds
+    in case the "stopped" never comes.
+    """
+
+    def __init__(self, interval=TYPING_THROTTLE):
+        self.interval = interval
+        self.expires_in = interval * 2
+        self.typing = False
+        self.last_sent = None
+
+    def should_send(self, is_typing, now=None):
+        now = time.monotonic() if now is None else now
+        if is_typing:
+            if self.typing and now - self.last_sent < self.interval:
+                return False
+            self.typing, self.last_sent = True, now
+            return True
+        if not self.typing:
+            return False
+        self.typing = False
+        return True
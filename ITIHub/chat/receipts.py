@@ -0,0 +1,113 @@
+"""
+Read cursors for private conversations and group chats.
+
+A participant's cursor is the id of the newest message they have read:
+`ConversationSummary.last_read_id` in a private chat, `GroupReadCursor` in a group.
+Cursors only move forward. Unread counts are the messages from others after the
+cursor, one range on the (conversation_key, id) / (group, id) indexes, so reading
+never touches a row per message. Every move sends `messages_read`, which the
+notifications app uses to settle the matching chat notifications.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from .models import ChatMessage, ConversationSummary, GroupMessage, GroupReadCursor, messages_read
+
+ReadState = namedtuple('ReadState', 'last_read_id unread_count moved')
+
+
+def newest_id(messages, up_to=None):
+    """Newest message id, optionally capped at `up_to` so clients cannot read ahead."""
+    if up_to is not None:
+        messages = messages.filter(id__lte=up_to)
+    return messages.order_by('-id').values_list('id', flat=True).first()
+
+
+def conversation_unread_count(user_id, other_user_id, last_read_id=None):
+    messages = ChatMessage.objects.conversation(user_id, other_user_id).filter(sender_id=other_user_id)
+    if last_read_id:
+        messages = messages.filter(id__gt=last_read_id)
+    return messages.count()
+
+
+def group_unread_counts(user_id, group_ids):
+    """{group_id: unread} for `group_ids`, one range per group in a single query."""
+    group_ids = list(group_ids)
+    if not group_ids:
+        return {}
+    cursors = dict(
+        GroupReadCursor.objects.filter(user_id=user_id, group_id__in=group_ids).values_list('group_id', 'last_read_id')
+    )
+    ranges = Q()
+    for group_id in group_ids:
+        ranges |= Q(group_id=group_id, id__gt=cursors.get(group_id, 0))
+    counts = dict(
+        GroupMessage.objects.filter(ranges).exclude(sender_id=user_id)
+        .values('group_id').annotate(total=Count('id')).values_list('group_id', 'total').order_by()
+    )
+    return {group_id: counts.get(group_id, 0) for group_id in group_ids}
+
+
+def start_group_cursors(group_ids, user_ids):
+    """
+    Puts the cursors of newly added members at each group's newest message,
+    so history from before they joined is not counted as unread.
+    """
+    newest = dict(
+        GroupMessage.objects.filter(group_id__in=group_ids)
+        .values('group_id').annotate(newest=Max('id')).values_list('group_id', 'newest').order_by()
+    )
+    GroupReadCursor.objects.bulk_create(
+        [
+            GroupReadCursor(user_id=user_id, group_id=group_id, last_read_id=newest.get(group_id, 0))
+            for group_id in group_ids
+            for user_id in user_ids
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'group'],
+        update_fields=['last_read_id', 'updated_at'],
+    )
+
+
+def mark_conversation_read(user_id, other_user_id, message_id=None):
+    """Moves the user's cursor up to `message_id` (default: the newest message)."""
+    read_id = newest_id(ChatMessage.objects.conversation(user_id, other_user_id), message_id)
+    with transaction.atomic():
+        summary = (
+            ConversationSummary.objects.select_for_update()
+            .filter(user_id=user_id, other_user_id=other_user_id).first()
+        )
+        if summary is None:
+            return ReadState(None, 0, False)
+        moved = read_id is not None and (summary.last_read_id or 0) < read_id
+        if moved:
+            summary.last_read_id = read_id
+            summary.unread_count = conversation_unread_count(user_id, other_user_id, read_id)
+            summary.save(update_fields=['last_read_id', 'unread_count'])
+    state = ReadState(summary.last_read_id, summary.unread_count, moved)
+    if moved:
+        messages_read.send(
+            sender=ChatMessage, user_id=user_id, other_user_id=other_user_id,
+            last_read_id=state.last_read_id, unread_count=state.unread_count,
+        )
+    return state
+
+
+def mark_group_read(user_id, group_id, message_id=None):
+    """Moves the member's cursor up to `message_id` (default: the newest message)."""
+    read_id = newest_id(GroupMessage.objects.filter(group_id=group_id), message_id)
+    with transaction.atomic():
+        cursor, _ = GroupReadCursor.objects.select_for_update().get_or_create(user_id=user_id, group_id=group_id)
+        moved = read_id is not None and cursor.last_read_id < read_id
+        if moved:
+            cursor.last_read_id = read_id
+            cursor.save(update_fields=['last_read_id', 'updated_at'])
+    state = ReadState(cursor.last_read_id, group_unread_counts(user_id, [group_id])[group_id], moved)
+    if moved:
+        messages_read.send(
+            sender=GroupMessage, user_id=user_id, group_id=group_id,
+            last_read_id=state.last_read_id, unread_count=state.unread_count,
+        )
+    return state
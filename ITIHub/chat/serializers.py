@@ -1,6 +1,7 @@
 from rest_framework import serializers
-from .models import GroupChat, GroupMessage, ChatMessage, ChatBotMessage
+from .models import GroupChat, GroupMessage, ChatMessage, ChatBotMessage, ConversationSummary
 from django.contrib.auth import get_user_model
+from ITIHub.eager_loading import EagerLoadingSerializerMixin
 
 User = get_user_model()
 
@@ -12,7 +13,8 @@ class GroupChatSerializer(serializers.ModelSerializer):
         model = GroupChat
         fields = '__all__'
 
-class GroupMessageSerializer(serializers.ModelSerializer):
+class GroupMessageSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
+    select_related_fields = ('sender',)
     id = serializers.ReadOnlyField()  # Include the ID field
     sender = serializers.ReadOnlyField(source='sender.username')
 
@@ -20,7 +22,8 @@ class GroupMessageSerializer(serializers.ModelSerializer):
         model = GroupMessage
         fields = ['id', 'content', 'timestamp', 'sender']  # Include 'id' in the fields
 
-class ChatMessageSerializer(serializers.ModelSerializer):
+class ChatMessageSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
+    select_related_fields = ('sender', 'receiver')
     id = serializers.ReadOnlyField()
     sender = serializers.ReadOnlyField(source='sender.username')
     receiver = serializers.ReadOnlyField(source='receiver.username')
@@ -29,6 +32,29 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         model = ChatMessage
         fields = ['id', 'message', 'timestamp', 'sender', 'receiver']
 
+class ConversationSummarySerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
+    select_related_fields = ('other_user', 'last_message')
+    other_user = serializers.SerializerMethodField()
+    last_message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ConversationSummary
+        fields = ['id', 'conversation_key', 'other_user', 'last_message', 'last_message_at', 'unread_count', 'last_read_id']
+
+    def get_other_user(self, obj):
+        return {"id": obj.other_user_id, "username": obj.other_user.username, "email": obj.other_user.email}
+
+    def get_last_message(self, obj):
+        message = obj.last_message
+        if message is None:
+            return None
+        return {
+            "id": message.id,
+            "message": message.message,
+            "timestamp": message.timestamp,
+            "is_mine": message.sender_id == obj.user_id,
+        }
+
 class ChatBotMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatBotMessage
@@ -0,0 +1,59 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import inbox, membership, receipts
+from .models import ChatMessage, GroupChat
+
+
+def invalidate_membership(instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # A user is removed from all their groups; pk_set is not given for clears
+        instance._cleared_group_ids = list(
+            GroupChat.objects.filter(**{kwargs["field_name"]: instance}).values_list("id", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        membership.invalidate([instance.pk])
+    elif action == "post_clear":
+        membership.invalidate(getattr(instance, "_cleared_group_ids", []))
+    else:
+        membership.invalidate(pk_set or [])
+
+
+@receiver(m2m_changed, sender=GroupChat.members.through)
+def members_changed(sender, **kwargs):
+    invalidate_membership(field_name="members", **kwargs)
+
+
+@receiver(m2m_changed, sender=GroupChat.members.through)
+def start_new_member_cursors(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add" or not pk_set:
+        return
+    if reverse:
+        receipts.start_group_cursors(list(pk_set), [instance.pk])
+    else:
+        receipts.start_group_cursors([instance.pk], list(pk_set))
+
+
+@receiver(m2m_changed, sender=GroupChat.supervisors.through)
+def supervisors_changed(sender, **kwargs):
+    invalidate_membership(field_name="supervisors", **kwargs)
+
+
+@receiver(post_delete, sender=GroupChat)
+def group_deleted(sender, instance, **kwargs):
+    membership.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=ChatMessage)
+def update_conversation_summary(sender, instance, created, **kwargs):
+    if created:
+        inbox.record_message(instance)
+
+
+@receiver(post_delete, sender=ChatMessage)
+def refresh_conversation_summary(sender, instance, **kwargs):
+    if instance.conversation_key:
+        inbox.refresh_last_message(instance.conversation_key)
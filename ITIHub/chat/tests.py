@@ -1,3 +1,481 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ITIHub.asgi import application
+from notifications.models import Notification
+from users.models import User
+from . import presence
+from .buffer import MessageWriteBuffer, message_buffer
+from .middleware import TokenAuthMiddleware, UserSnapshot, token_user_cache
+from .models import ChatMessage, ConversationSummary, GroupChat, GroupMessage
+
+
+class TokenAuthCacheTests(TransactionTestCase):
+    """Socket authentication reads the database at most once per token."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.middleware = TokenAuthMiddleware(inner=None)
+        token_user_cache.clear()
+
+    def authenticate(self, token):
+        with CaptureQueriesContext(connection) as context:
+            user = async_to_sync(self.middleware.get_user_from_token)(str(token))
+        return user, len(context.captured_queries)
+
+    def test_second_connection_is_served_from_cache(self):
+        token = AccessToken.for_user(self.user)
+
+        first, first_queries = self.authenticate(token)
+        second, second_queries = self.authenticate(token)
+
+        self.assertIsInstance(first, UserSnapshot)
+        self.assertEqual((second.id, second.username), (self.user.id, "reader"))
+        self.assertEqual((first_queries, second_queries), (1, 0))
+
+    def test_claims_only_mode_skips_the_database(self):
+        from chat import middleware
+
+        token = AccessToken.for_user(self.user)
+        token["username"], token["is_student"], token["is_supervisor"] = "reader", True, False
+        middleware.AUTH_CLAIMS_ONLY = True
+        try:
+            user, queries = self.authenticate(token)
+        finally:
+            middleware.AUTH_CLAIMS_ONLY = False
+        self.assertEqual((user.username, user.is_student, queries), ("reader", True, 0))
+
+    def test_invalid_token_is_anonymous(self):
+        user, _ = self.authenticate("not-a-token")
+        self.assertTrue(user.is_anonymous)
+
+
+class GroupChatWriteBufferTests(TransactionTestCase):
+    """Group messages are broadcast first and persisted in batches."""
+
+    def setUp(self):
+        presence.get_backend().clear()  # user_joined is only sent for a user's first socket
+        self.sender = User.objects.create_user(username="sender", email="sender@example.com", password="pass")
+        self.member = User.objects.create_user(username="member", email="member@example.com", password="pass")
+        self.group = GroupChat.objects.create(name="Track")
+        self.group.members.add(self.sender, self.member)
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat/group/{self.group.id}/?token={AccessToken.for_user(user)}"
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from(timeout=5)  # user_joined
+        return communicator
+
+    async def test_buffered_messages_are_written_and_notified(self):
+        communicator = await self.connect(self.sender)
+
+        for i in range(3):
+            await communicator.send_json_to({"action": "send", "message": f"hello {i}"})
+            broadcast = await communicator.receive_json_from(timeout=5)
+            self.assertEqual(broadcast["message"], f"hello {i}")
+
+        await communicator.disconnect()
+        self.assertEqual(len(message_buffer), 0)
+
+        contents = await database_sync_to_async(
+            lambda: list(GroupMessage.objects.filter(group=self.group).order_by("id").values_list("content", flat=True))
+        )()
+        self.assertEqual(contents, ["hello 0", "hello 1", "hello 2"])
+        notification = await database_sync_to_async(Notification.objects.get)(recipient=self.member, group=self.group)
+        self.assertEqual(notification.unread_count, 3)
+
+    def test_unwritable_message_does_not_block_the_buffer(self):
+        buffer = MessageWriteBuffer()
+        gone = GroupChat.objects.create(name="Gone")
+        buffer._pending.append(GroupMessage(group_id=gone.id, sender=self.sender, content="lost"))
+        gone.delete()
+        with self.assertLogs("chat.buffer", "ERROR"):
+            for i in range(3):
+                buffer._pending.append(GroupMessage(group=self.group, sender=self.sender, content=f"hello {i}"))
+                buffer.flush_sync()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(
+            list(GroupMessage.objects.order_by("id").values_list("content", flat=True)), ["hello 0", "hello 1", "hello 2"]
+        )
+
+    async def test_failed_write_is_retried_in_send_order(self):
+        buffer = MessageWriteBuffer(interval_ms=20)
+        failures = [OperationalError("database is locked")] * 2
+        bulk_create = GroupMessage.objects.bulk_create
+
+        def flaky_bulk_create(messages, *args, **kwargs):
+            # Fails the batch and then the row holding "hello 1" once each
+            if failures and any(message.content == "hello 1" for message in messages):
+                raise failures.pop()
+            return bulk_create(messages, *args, **kwargs)
+
+        def contents():
+            return list(GroupMessage.objects.order_by("id").values_list("content", flat=True))
+
+        with mock.patch.object(GroupMessage.objects, "bulk_create", side_effect=flaky_bulk_create), \
+                self.assertLogs("chat.buffer", "ERROR"):
+            for i in range(3):
+                await buffer.add(GroupMessage(group=self.group, sender=self.sender, content=f"hello {i}"))
+            # No further messages arrive: the retry has to come from the re-armed timer
+            for _ in range(100):
+                await asyncio.sleep(0.02)
+                if not len(buffer) and len(await database_sync_to_async(contents)()) == 3:
+                    break
+
+        self.assertEqual(await database_sync_to_async(contents)(), ["hello 0", "hello 1", "hello 2"])
+
+    async def test_failed_timed_flush_is_logged(self):
+        buffer = MessageWriteBuffer(interval_ms=10)
+
+        def broken():
+            raise RuntimeError("boom")
+
+        with mock.patch.object(buffer, "_write_pending", broken), \
+                self.assertLogs("chat.buffer", "ERROR") as logs:
+            await buffer.add(GroupMessage(group=self.group, sender=self.sender, content="hello"))
+            await asyncio.sleep(0.2)
+
+        self.assertIn("Flushing buffered group messages failed", logs.output[0])
+
+
+class GroupMembershipTests(TransactionTestCase):
+    """Only members and supervisors may use a group socket; checks come from the cache."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from . import membership
+
+        cache.clear()
+        membership.invalidate(list(GroupChat.objects.values_list("id", flat=True)))
+        self.member = User.objects.create_user(username="member", email="member@example.com", password="pass")
+        self.outsider = User.objects.create_user(username="outsider", email="outsider@example.com", password="pass")
+        self.group = GroupChat.objects.create(name="Track")
+        self.group.members.add(self.member)
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat/group/{self.group.id}/?token={AccessToken.for_user(user)}"
+        )
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_outsider_is_rejected(self):
+        _, connected = await self.connect(self.outsider)
+        self.assertFalse(connected)
+
+    async def test_removed_member_is_closed_on_next_message(self):
+        communicator, connected = await self.connect(self.member)
+        self.assertTrue(connected)
+        await communicator.receive_json_from(timeout=5)  # user_joined
+
+        await database_sync_to_async(self.group.members.remove)(self.member)
+        await communicator.send_json_to({"action": "send", "message": "still here?"})
+        output = await communicator.receive_output(timeout=5)
+        self.assertEqual(output, {"type": "websocket.close", "code": 4403})
+
+    def test_membership_is_served_from_cache(self):
+        from . import membership
+
+        self.assertTrue(membership.is_group_member(self.group.id, self.member.id))
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(10):
+                membership.is_group_member(self.group.id, self.member.id)
+        self.assertEqual(len(context.captured_queries), 0)
+
+        self.group.supervisors.add(self.outsider)
+        self.assertTrue(membership.is_group_member(self.group.id, self.outsider.id))
+
+    def test_cache_errors_fall_back_to_the_database(self):
+        from . import membership
+
+        with mock.patch.object(membership.cache, "get", side_effect=ConnectionError("cache down")), \
+                mock.patch.object(membership.cache, "set", side_effect=ConnectionError("cache down")), \
+                mock.patch.object(membership.cache, "delete_many", side_effect=ConnectionError("cache down")), \
+                self.assertLogs("chat.membership", "ERROR"):
+            self.assertTrue(membership.is_group_member(self.group.id, self.member.id))
+            self.group.members.remove(self.member)
+            self.assertFalse(membership.is_group_member(self.group.id, self.member.id))
+
+
+class ChatHistoryPaginationTests(APITestCase):
+    """History endpoints page newest first and walk back with message-id cursors."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([message["id"] for message in data["results"]])
+            url = data["next"]
+        return pages
+
+    def test_group_history_loads_older_pages(self):
+        group = GroupChat.objects.create(name="Track")
+        group.members.add(self.user)
+        ids = [GroupMessage.objects.create(group=group, sender=self.user, content=f"m{i}").id for i in range(7)]
+
+        pages = self.walk(f"/api/chat/groups/{group.id}/messages/?limit=3")
+
+        self.assertEqual(pages, [ids[6:3:-1], ids[3:0:-1], ids[:1]])
+        newer = self.client.get(f"/api/chat/groups/{group.id}/messages/?limit=3&after={ids[1]}").json()
+        self.assertEqual([message["id"] for message in newer["results"]], ids[4:1:-1])
+
+    def test_private_history_covers_both_directions(self):
+        ids = []
+        for i in range(5):
+            sender, receiver = (self.user, self.other) if i % 2 else (self.other, self.user)
+            ids.append(ChatMessage.objects.create(sender=sender, receiver=receiver, message=f"m{i}").id)
+        third = User.objects.create_user(username="third", email="third@example.com", password="pass")
+        ChatMessage.objects.create(sender=third, receiver=self.user, message="elsewhere")
+
+        pages = self.walk(f"/api/chat/messages/{self.other.id}/?limit=2")
+
+        self.assertEqual(sum(pages, []), ids[::-1])
+        response = self.client.post(f"/api/chat/messages/{self.other.id}/", {"message": "hello"})
+        self.assertEqual(response.json()["id"], ChatMessage.objects.latest("id").id)
+
+    def test_conversation_is_one_index_range(self):
+        sent = ChatMessage.objects.create(sender=self.user, receiver=self.other, message="hi")
+        received = ChatMessage.objects.create(sender=self.other, receiver=self.user, message="hello")
+        self.assertEqual(sent.conversation_key, received.conversation_key)
+
+        conversation = ChatMessage.objects.conversation(self.other.id, self.user.id)
+        self.assertEqual(set(conversation.values_list("id", flat=True)), {sent.id, received.id})
+        self.assertIn("chat_conversation_idx", conversation.order_by("-timestamp", "-id").explain())
+
+        self.client.delete(f"/api/chat/private-chats/{self.other.id}/clear/")
+        self.assertFalse(conversation.exists())
+
+    def test_unknown_anchor_is_not_found(self):
+        response = self.client.get(f"/api/chat/messages/{self.other.id}/?before=999")
+        self.assertEqual(response.status_code, 404)
+
+
+class InboxTests(APITestCase):
+    """The inbox reads one summary row per conversation, kept current on write."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+        self.partners = 0
+
+    def add_conversation(self, messages):
+        self.partners += 1
+        other = User.objects.create_user(
+            username=f"partner{self.partners}", email=f"partner{self.partners}@example.com", password="pass"
+        )
+        for i in range(messages):
+            ChatMessage.objects.create(sender=other, receiver=self.user, message=f"m{i}")
+        return other
+
+    def inbox(self):
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get("/api/chat/inbox/").json()
+        return data["results"], len(context.captured_queries)
+
+    def test_inbox_lists_last_message_and_unread_per_conversation(self):
+        quiet = self.add_conversation(1)
+        busy = self.add_conversation(3)
+        ChatMessage.objects.create(sender=self.user, receiver=quiet, message="reply")
+
+        results, queries = self.inbox()
+
+        self.assertEqual([entry["other_user"]["id"] for entry in results], [quiet.id, busy.id])
+        self.assertEqual((results[0]["last_message"]["message"], results[0]["last_message"]["is_mine"]), ("reply", True))
+        self.assertEqual([entry["unread_count"] for entry in results], [0, 3])
+        self.assertEqual(ConversationSummary.objects.get(user=quiet).unread_count, 1)
+
+        for _ in range(5):
+            self.add_conversation(4)
+        more, more_queries = self.inbox()
+        self.assertEqual(len(more), 7)
+        self.assertEqual(queries, more_queries)
+
+    def test_deleting_and_clearing_keep_summaries_current(self):
+        other = self.add_conversation(2)
+        last = ChatMessage.objects.latest("id")
+        self.client.force_authenticate(other)
+        self.client.delete(f"/api/chat/messages/{last.id}/delete/")
+
+        summary = ConversationSummary.objects.get(user=self.user)
+        self.assertEqual(summary.last_message.message, "m0")
+
+        self.client.delete(f"/api/chat/private-chats/{self.user.id}/clear/")
+        self.assertFalse(ConversationSummary.objects.exists())
+        self.assertEqual(self.client.get("/api/chat/private_chat_users/").json(), [])
+
+
+class ReadCursorTests(APITestCase):
+    """Read cursors drive unread counts and settle the chat notifications they cover."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+        self.group = GroupChat.objects.create(name="Track")
+        self.group.members.add(self.user, self.other)
+
+    def private_messages(self, count):
+        return [ChatMessage.objects.create(sender=self.other, receiver=self.user, message=f"m{i}").id for i in range(count)]
+
+    def group_messages(self, count):
+        return [GroupMessage.objects.create(group=self.group, sender=self.other, content=f"m{i}").id for i in range(count)]
+
+    def test_private_cursor_moves_forward_only(self):
+        ids = self.private_messages(3)
+
+        state = self.client.post(f"/api/chat/messages/{self.other.id}/read/", {"message_id": ids[1]}).json()
+        self.assertEqual(state, {"last_read_id": ids[1], "unread_count": 1})
+        self.assertEqual(
+            Notification.objects.filter(recipient=self.user, notification_type="chat", is_read=False).count(), 1
+        )
+        self.assertEqual(self.client.get("/api/notifications/counts/").json()["chat"], 1)
+
+        state = self.client.post(f"/api/chat/messages/{self.other.id}/read/", {"message_id": ids[0]}).json()
+        self.assertEqual(state["last_read_id"], ids[1])
+        state = self.client.post(f"/api/chat/messages/{self.other.id}/read/").json()
+        self.assertEqual(state, {"last_read_id": ids[2], "unread_count": 0})
+
+    def test_group_unread_is_a_range_count(self):
+        ids = self.group_messages(4)
+
+        state = self.client.post(f"/api/chat/groups/{self.group.id}/read/", {"message_id": ids[1]}).json()
+        self.assertEqual(state, {"last_read_id": ids[1], "unread_count": 2})
+        row = Notification.objects.get(recipient=self.user, group=self.group)
+        self.assertEqual((row.unread_count, row.is_read), (2, False))
+        self.assertEqual(self.client.get("/api/chat/unread/").json()["groups"], {str(self.group.id): 2})
+
+        outsider = User.objects.create_user(username="outsider", email="outsider@example.com", password="pass")
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.post(f"/api/chat/groups/{self.group.id}/read/").status_code, 404)
+
+    def test_member_joining_later_does_not_inherit_the_history_as_unread(self):
+        self.group_messages(3)
+        newcomer = User.objects.create_user(username="newcomer", email="newcomer@example.com", password="pass")
+        newcomer.group_members.add(self.group)
+        self.client.force_authenticate(newcomer)
+        self.assertEqual(self.client.get("/api/chat/unread/").json()["groups"], {str(self.group.id): 0})
+
+        self.group_messages(2)
+        self.assertEqual(self.client.get("/api/chat/unread/").json()["groups"], {str(self.group.id): 2})
+
+    @override_settings(CHAT_MESSAGE_NOTIFICATIONS=False)
+    def test_cursors_count_unread_without_notification_rows(self):
+        self.private_messages(2)
+        self.group_messages(3)
+
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(
+            self.client.get("/api/chat/unread/").json(),
+            {"conversations": {str(self.other.id): 2}, "groups": {str(self.group.id): 3}},
+        )
+
+
+class ReadReceiptSocketTests(TransactionTestCase):
+    """A read over the socket answers with the reader's state and tells the room."""
+
+    def setUp(self):
+        presence.get_backend().clear()  # user_joined is only sent for a user's first socket
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass")
+        self.group = GroupChat.objects.create(name="Track")
+        self.group.members.add(self.user, self.other)
+
+    async def test_group_read_receipt(self):
+        message = await database_sync_to_async(GroupMessage.objects.create)(group=self.group, sender=self.other, content="hi")
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat/group/{self.group.id}/?token={AccessToken.for_user(self.user)}"
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from(timeout=5)  # user_joined
+
+        await communicator.send_json_to({"action": "read"})
+        state = await communicator.receive_json_from(timeout=5)
+        receipt = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(state, {"event": "read_state", "last_read_id": message.id, "unread_count": 0})
+        self.assertEqual((receipt["event"], receipt["user_id"], receipt["message_id"]), ("read_receipt", self.user.id, message.id))
+        await communicator.disconnect()
+
+
+class PresenceTests(TransactionTestCase):
+    """Presence lives in the presence backend; typing events are coalesced per socket."""
+
+    def setUp(self):
+        presence.get_backend().clear()
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass")
+        self.group = GroupChat.objects.create(name="Track")
+        self.group.members.add(self.user, self.other)
+
+    async def connect(self, user, announced=True):
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat/group/{self.group.id}/?token={AccessToken.for_user(user)}"
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        if announced:
+            joined = await communicator.receive_json_from(timeout=5)
+            self.assertEqual((joined["event"], joined["username"]), ("user_joined", user.username))
+        return communicator
+
+    def get_presence(self, url):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.get(url).json()
+
+    async def test_joins_are_announced_once_per_user(self):
+        reader = await self.connect(self.user)
+        second_tab = await self.connect(self.user, announced=False)
+        other = await self.connect(self.other)
+        joined = await reader.receive_json_from(timeout=5)
+        self.assertEqual(joined["username"], "other")
+        self.assertTrue(await reader.receive_nothing(timeout=0.2))
+
+        online = await database_sync_to_async(self.get_presence)(f"/api/chat/groups/{self.group.id}/presence/")
+        self.assertEqual(online, {"online": sorted([self.user.id, self.other.id])})
+
+        await second_tab.disconnect()
+        self.assertTrue(await other.receive_nothing(timeout=0.2))
+        await reader.disconnect()
+        self.assertEqual((await other.receive_json_from(timeout=5))["event"], "user_left")
+        online = await database_sync_to_async(self.get_presence)(f"/api/chat/presence/?users={self.user.id},{self.other.id}")
+        self.assertEqual(online, {"online": [self.other.id]})
+        await other.disconnect()
+
+    async def test_typing_is_coalesced(self):
+        reader = await self.connect(self.user)
+        typist = await self.connect(self.other)
+        await reader.receive_json_from(timeout=5)  # other's user_joined
+
+        for _ in range(10):
+            await typist.send_json_to({"action": "typing"})
+        await typist.send_json_to({"action": "typing", "is_typing": False})
+
+        started = await reader.receive_json_from(timeout=5)
+        stopped = await reader.receive_json_from(timeout=5)
+        self.assertEqual((started["event"], started["is_typing"]), ("typing", True))
+        self.assertFalse(stopped["is_typing"])
+        self.assertTrue(await reader.receive_nothing(timeout=0.2))
+        self.assertTrue(await typist.receive_nothing(timeout=0.2))
+        await reader.disconnect()
+        await typist.disconnect()
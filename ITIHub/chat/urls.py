@@ -1,7 +1,8 @@
 from django.urls import path
 from .views import (
     GroupChatListCreateView, GroupChatDetailView, GroupMessageListCreateView,
-    ChatMessageListCreateView, UserChatDashboardView, PrivateChatUsersView,
+    ChatMessageListCreateView, UserChatDashboardView, PrivateChatUsersView, InboxView,
+    ConversationReadView, GroupReadView, ChatUnreadCountsView, PresenceView, GroupPresenceView,
     ClearGroupChatView, ClearPrivateChatView, EditMessageView, DeleteMessageView, delete_group_message, ChatBotView, ChatBotMessagesView, EditGroupMessageView
 )
 
@@ -11,6 +12,12 @@ urlpatterns = [
     path('groups/<int:group_id>/messages/', GroupMessageListCreateView.as_view(), name='group_message_list_create'),
     path('messages/<int:receiver_id>/', ChatMessageListCreateView.as_view(), name='chat_message_list_create'),
     path('user_chats/', UserChatDashboardView.as_view(), name='user_chat_dashboard'),
+    path('inbox/', InboxView.as_view(), name='chat_inbox'),
+    path('unread/', ChatUnreadCountsView.as_view(), name='chat_unread_counts'),
+    path('messages/<int:receiver_id>/read/', ConversationReadView.as_view(), name='conversation_read'),
+    path('groups/<int:group_id>/read/', GroupReadView.as_view(), name='group_read'),
+    path('presence/', PresenceView.as_view(), name='chat_presence'),
+    path('groups/<int:group_id>/presence/', GroupPresenceView.as_view(), name='group_presence'),
     path('private_chat_users/', PrivateChatUsersView.as_view(), name='private_chat_users'),  
     path('group-chats/<int:group_id>/clear/', ClearGroupChatView.as_view(), name='clear-group-chat'),
     path('private-chats/<int:receiver_id>/clear/', ClearPrivateChatView.as_view(), name='clear-private-chat'),
@@ -2,11 +2,10 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth import get_user_model
 User = get_user_model()
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
 from rest_framework import generics, permissions
 from rest_framework.response import Response
-from .models import GroupChat, GroupMessage, ChatMessage
-from .serializers import GroupChatSerializer, GroupMessageSerializer, ChatMessageSerializer
+from .models import GroupChat, GroupMessage, ChatMessage, ConversationSummary
+from .serializers import GroupChatSerializer, GroupMessageSerializer, ChatMessageSerializer, ConversationSummarySerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -19,6 +18,9 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 import openai
 from django.conf import settings
+from ITIHub.eager_loading import EagerLoadingMixin
+from .pagination import InboxCursorPagination, MessageCursorPagination
+from . import inbox, membership, presence, receipts
 
 
 # 🟢 View Group Chat Page
@@ -39,9 +41,13 @@ class UserChatDashboardView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
+        # The last message of each conversation, read through the inbox summaries
+        last_message_ids = ConversationSummary.objects.filter(user=user, last_message__isnull=False).values('last_message_id')
         return {
-            "group_chats": GroupChat.objects.filter(members=user),
-            "private_chats": ChatMessage.objects.filter(Q(sender=user) | Q(receiver=user)).distinct()
+            "group_chats": GroupChat.objects.filter(members=user).prefetch_related('members', 'supervisors'),
+            "private_chats": ChatMessageSerializer.setup_eager_loading(
+                ChatMessage.objects.filter(id__in=last_message_ids).order_by('-timestamp', '-id')
+            ),
         }
 
     def list(self, request, *args, **kwargs):
@@ -66,9 +72,10 @@ class GroupChatDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 # 🟢 Send/Retrieve Group Messages
 @method_decorator(csrf_exempt, name="dispatch")
-class GroupMessageListCreateView(generics.ListCreateAPIView):
+class GroupMessageListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     serializer_class = GroupMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageCursorPagination
 
     def get_queryset(self):
         return GroupMessage.objects.filter(group_id=self.kwargs['group_id'])
@@ -79,24 +86,102 @@ class GroupMessageListCreateView(generics.ListCreateAPIView):
 
 # 🟢 Send/Retrieve Private Messages
 @method_decorator(csrf_exempt, name="dispatch")
-class ChatMessageListCreateView(generics.ListCreateAPIView):
+class ChatMessageListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     serializer_class = ChatMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageCursorPagination
 
     def get_queryset(self):
         user1 = self.request.user
         user2 = get_object_or_404(User, id=self.kwargs['receiver_id'])
-        return ChatMessage.objects.filter(Q(sender=user1, receiver=user2) | Q(sender=user2, receiver=user1))
+        return ChatMessage.objects.conversation(user1.id, user2.id)
 
     def perform_create(self, serializer):
         receiver = get_object_or_404(User, id=self.kwargs['receiver_id'])
         message = serializer.save(sender=self.request.user, receiver=receiver)
         print(f"Message created: {message}")
 
-    def create(self, request, *args, **kwargs):
-        response = super().create(request, *args, **kwargs)
-        response.data['id'] = self.get_queryset().last().id
-        return response
+# 🟢 Inbox: one entry per private conversation with its last message and unread count
+@method_decorator(csrf_exempt, name="dispatch")
+class InboxView(EagerLoadingMixin, generics.ListAPIView):
+    serializer_class = ConversationSummarySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = InboxCursorPagination
+
+    def get_queryset(self):
+        return ConversationSummary.objects.filter(user=self.request.user, last_message_at__isnull=False)
+
+def read_state_response(state):
+    return Response({"last_read_id": state.last_read_id, "unread_count": state.unread_count})
+
+def requested_message_id(request):
+    message_id = request.data.get("message_id")
+    if message_id in (None, ""):
+        return None
+    try:
+        return int(message_id)
+    except (TypeError, ValueError):
+        return False
+
+# 🟢 Read cursors: mark a conversation / group read up to a message (default: the newest)
+@method_decorator(csrf_exempt, name="dispatch")
+class ConversationReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, receiver_id, *args, **kwargs):
+        message_id = requested_message_id(request)
+        if message_id is False:
+            return Response({"error": "message_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return read_state_response(receipts.mark_conversation_read(request.user.id, receiver_id, message_id))
+
+@method_decorator(csrf_exempt, name="dispatch")
+class GroupReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, group_id, *args, **kwargs):
+        if not membership.is_group_member(group_id, request.user.id):
+            return Response({"error": "Group not found or you are not a member."}, status=status.HTTP_404_NOT_FOUND)
+        message_id = requested_message_id(request)
+        if message_id is False:
+            return Response({"error": "message_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return read_state_response(receipts.mark_group_read(request.user.id, group_id, message_id))
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ChatUnreadCountsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        conversations = ConversationSummary.objects.filter(user=user, unread_count__gt=0)
+        group_ids = GroupChat.objects.filter(members=user).values_list('id', flat=True)
+        return Response({
+            "conversations": {str(other_id): count for other_id, count in conversations.values_list('other_user_id', 'unread_count')},
+            "groups": {str(group_id): count for group_id, count in receipts.group_unread_counts(user.id, group_ids).items()},
+        })
+
+# 🟢 Presence: who has a chat socket open (see presence.py)
+MAX_PRESENCE_USERS = 200
+
+@method_decorator(csrf_exempt, name="dispatch")
+class PresenceView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            user_ids = [int(value) for value in request.query_params.get("users", "").split(",") if value]
+        except ValueError:
+            return Response({"error": "users must be a comma-separated list of ids."}, status=status.HTTP_400_BAD_REQUEST)
+        online = presence.online_user_ids(user_ids[:MAX_PRESENCE_USERS])
+        return Response({"online": sorted(online)})
+
+@method_decorator(csrf_exempt, name="dispatch")
+class GroupPresenceView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, group_id, *args, **kwargs):
+        if not membership.is_group_member(group_id, request.user.id):
+            return Response({"error": "Group not found or you are not a member."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"online": sorted(presence.present_user_ids(f"group:{group_id}"))})
 
 @method_decorator(csrf_exempt, name="dispatch")
 class PrivateChatUsersView(APIView):
@@ -106,8 +191,8 @@ class PrivateChatUsersView(APIView):
         user = request.user
         # Get all users who have private chats with the authenticated user
         chat_users = User.objects.filter(
-            Q(sent_messages__receiver=user) | Q(received_messages__sender=user)
-        ).distinct()
+            id__in=ConversationSummary.objects.filter(user=user).values('other_user_id')
+        )
 
         # Serialize the user data
         user_data = [{"id": chat_user.id, "username": chat_user.username , "email": chat_user.email} for chat_user in chat_users]
@@ -134,7 +219,9 @@ class ClearPrivateChatView(APIView):
     def delete(self, request, receiver_id, *args, **kwargs):
         user1 = request.user
         user2 = get_object_or_404(User, id=receiver_id)
-        ChatMessage.objects.filter(Q(sender=user1, receiver=user2) | Q(sender=user2, receiver=user1)).delete()
+        # Summaries go first so the per-message delete signals have nothing to refresh
+        inbox.clear(user1.id, user2.id)
+        ChatMessage.objects.conversation(user1.id, user2.id).delete()
         return Response({"message": "Private chat cleared successfully."}, status=status.HTTP_204_NO_CONTENT)
 
 # 🟢 Edit a Message
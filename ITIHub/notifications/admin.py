@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Notification
+from .models import Notification, NotificationEvent, NotificationCounter, ArchivedNotification
 
 # Register your models here.
-admin.site.register(Notification)
\ No newline at end of file
+admin.site.register(Notification)
+admin.site.register(NotificationEvent)
+admin.site.register(NotificationCounter)
+admin.site.register(ArchivedNotification)
@@ -0,0 +1,51 @@
+"""
+Chunked bulk operations over a user's notifications.
+
+Mark-all-as-read and clear-all used to run one unbounded UPDATE / DELETE, which
+for a user with tens of thousands of rows holds the table lock long enough to
+stall the notification workers' inserts. `run_in_chunks` walks the rows by
+primary-key range instead: each chunk is `id > last AND id <= upper`, runs in
+its own transaction (with its unread-count delta) and commits before the next.
+"""
+from django.conf import settings
+
+from . import unread
+
+# Rows per chunk; 0 runs the whole operation as a single statement
+BULK_BATCH_SIZE = getattr(settings, "NOTIFICATION_BULK_BATCH_SIZE", 1000)
+
+
+def mark_read(chunk):
+    return chunk.update(is_read=True, unread_count=0)
+
+
+def delete(chunk):
+    return chunk.delete()[0]
+
+
+def run_in_chunks(recipient_id, queryset, action, batch_size=None, progress=None):
+    """
+    Applies `action(chunk_queryset) -> rows affected` to `queryset` one primary-key
+    range at a time. `progress(chunks, processed)` is called after each committed
+    chunk. Returns (processed, chunks).
+    """
+    batch_size = BULK_BATCH_SIZE if batch_size is None else batch_size
+    queryset = queryset.order_by()
+    processed = chunks = 0
+    last_id = 0
+    while True:
+        remaining = queryset.filter(id__gt=last_id)
+        upper = None
+        if batch_size:
+            # The id that closes this chunk; none left means this is the last one
+            boundary = list(remaining.order_by('id').values_list('id', flat=True)[batch_size - 1:batch_size])
+            upper = boundary[0] if boundary else None
+        chunk = remaining if upper is None else remaining.filter(id__lte=upper)
+
+        processed += unread.clear_unread(recipient_id, chunk, lambda: action(chunk))
+        chunks += 1
+        if progress:
+            progress(chunks, processed)
+        if upper is None:
+            return processed, chunks
+        last_id = upper
@@ -0,0 +1,103 @@
+"""
+Coalescing of reaction and mention notifications.
+
+Repeated events about the same target ("X, Y and 48 others reacted to your post")
+update one row in place instead of inserting a row per actor. A row is keyed by
+(recipient, notification_type, target object) and keeps absorbing events while
+it is unread and was last touched less than NOTIFICATION_COALESCE_WINDOW seconds
+ago; after that a fresh row starts. The row remembers how many actors it covers
+and the last few of them, newest first.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from . import unread
+from .models import Notification
+from .pipeline import deliver, notifications_updated
+
+COALESCE_WINDOW = getattr(settings, "NOTIFICATION_COALESCE_WINDOW", 24 * 60 * 60)
+RECENT_ACTORS = 3
+
+
+def target_rows(notification_type, content_type, object_id):
+    return Notification.objects.filter(
+        notification_type=notification_type, related_content_type=content_type, related_object_id=object_id
+    )
+
+
+def coalesce(recipient_id, actor, notification_type, target, reaction_type=None):
+    """Records that `actor` did `notification_type` on `target`, merging into the open row if there is one."""
+    content_type = ContentType.objects.get_for_model(target)
+    entry = {"id": actor.id, "username": actor.username}
+    now = timezone.now()
+    with transaction.atomic():
+        row = (
+            target_rows(notification_type, content_type, target.id)
+            .select_for_update()
+            .filter(recipient_id=recipient_id, is_read=False, updated_at__gte=now - timedelta(seconds=COALESCE_WINDOW))
+            .order_by('-updated_at')
+            .first()
+        )
+        if row is None:
+            deliver([
+                Notification(
+                    recipient_id=recipient_id,
+                    sender_id=actor.id,
+                    notification_type=notification_type,
+                    reaction_type=reaction_type,
+                    related_content_type=content_type,
+                    related_object_id=target.id,
+                    actor_count=1,
+                    recent_actors=[entry],
+                )
+            ])
+            return
+
+        # An actor already on the row (e.g. a post edited again) only moves to the front
+        if not any(recent["id"] == actor.id for recent in row.recent_actors):
+            row.actor_count += 1
+        row.recent_actors = ([entry] + [recent for recent in row.recent_actors if recent["id"] != actor.id])[:RECENT_ACTORS]
+        row.sender_id = actor.id
+        if reaction_type:
+            row.reaction_type = reaction_type
+        # Resurface the row at the top of the list
+        row.created_at = now
+        row.save(update_fields=["actor_count", "recent_actors", "sender", "reaction_type", "created_at", "updated_at"])
+        notifications_updated.send(sender=Notification, notification_ids=[row.id])
+
+
+def uncoalesce(recipient_id, actor_id, notification_type, content_type, object_id, since=None):
+    """
+    Takes `actor_id` back out of the row of `recipient_id` that counted it; the row goes
+    when nobody is left. `since` is when the actor's event happened and picks the row
+    when the actor is no longer among its recent actors; only rows counting actors
+    beyond their recent ones can hold such an actor.
+    """
+    with transaction.atomic():
+        candidates = list(
+            target_rows(notification_type, content_type, object_id)
+            .select_for_update().filter(recipient_id=recipient_id).order_by('-updated_at')[:20]
+        )
+        row = next((c for c in candidates if any(recent["id"] == actor_id for recent in c.recent_actors)), None)
+        if row is None:
+            hidden = [c for c in candidates if c.actor_count > len(c.recent_actors)]
+            # Rows of one target do not overlap in time: the oldest one touched after the event absorbed it
+            later = [c for c in hidden if since is None or c.updated_at >= since]
+            row = later[-1] if later else None
+        if row is None:
+            return
+
+        if row.actor_count <= 1:
+            row.delete()
+            unread.announce(unread.notification_changes([row], sign=-1))
+            return
+        row.actor_count -= 1
+        row.recent_actors = [recent for recent in row.recent_actors if recent["id"] != actor_id]
+        if row.sender_id == actor_id:
+            row.sender_id = row.recent_actors[0]["id"] if row.recent_actors else None
+        row.save(update_fields=["actor_count", "recent_actors", "sender", "updated_at"])
+        notifications_updated.send(sender=Notification, notification_ids=[row.id])
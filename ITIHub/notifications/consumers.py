@@ -0,0 +1,65 @@
+import json
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .counters import get_counts
+from .models import Notification
+from .realtime import user_group
+from .serializers import NotificationSerializer
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Per-user notification stream. New notifications, in-place updates (collapsed
+    group chat rows) and unread-count deltas are pushed here, so clients do not
+    need to poll the unread endpoints. Notifications arrive as ids and are
+    rendered here, only for recipients that are connected.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+
+        # Ensure the user is authenticated
+        if self.user.is_anonymous:
+            await self.close()
+            return
+
+        self.group_name = user_group(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        # Starting point for the deltas that follow
+        counts = await database_sync_to_async(get_counts)(self.user.id)
+        await self.send(text_data=json.dumps({"event": "unread_counts", "counts": counts}))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def notification_created(self, event):
+        await self.send_notification("notification_created", event["notification_id"])
+
+    async def notification_updated(self, event):
+        await self.send_notification("notification_updated", event["notification_id"])
+
+    async def send_notification(self, name, notification_id):
+        data = await self.render_notification(notification_id)
+        # Gone already (read and cleared, or its source deleted)
+        if data is None:
+            return
+        await self.send(text_data=json.dumps({"event": name, "notification": data}))
+
+    @database_sync_to_async
+    def render_notification(self, notification_id):
+        notification = NotificationSerializer.setup_eager_loading(
+            Notification.objects.filter(id=notification_id, recipient_id=self.user.id)
+        ).first()
+        if notification is None:
+            return None
+        return NotificationSerializer(notification).data
+
+    async def unread_changed(self, event):
+        await self.send(text_data=json.dumps({
+            "event": "unread_changed",
+            "deltas": event["deltas"],
+        }))
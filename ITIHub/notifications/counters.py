@@ -0,0 +1,62 @@
+"""
+Unread badge counters (NotificationCounter), one row per user.
+
+The `unread_changed` receiver applies the deltas inside the writer's transaction.
+Recipients that share the same deltas, such as every member of a group chat, are
+updated with one UPDATE.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Notification, NotificationCounter
+
+FIELDS = NotificationCounter.CATEGORIES
+
+
+def apply_changes(changes):
+    """`changes` is {recipient_id: {category: delta}}, as sent by `unread_changed`."""
+    if not changes:
+        return
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=recipient_id) for recipient_id in changes], ignore_conflicts=True
+    )
+    by_deltas = defaultdict(list)
+    for recipient_id, deltas in changes.items():
+        by_deltas[tuple(sorted(deltas.items()))].append(recipient_id)
+    for deltas, recipient_ids in by_deltas.items():
+        NotificationCounter.objects.filter(user_id__in=recipient_ids).update(
+            **{FIELDS[category]: F(FIELDS[category]) + delta for category, delta in deltas}
+        )
+
+
+def get_counts(user_id):
+    counter = NotificationCounter.objects.filter(user_id=user_id).first()
+    if counter is None:
+        return {category: 0 for category in FIELDS}
+    return counter.as_dict()
+
+
+def reconcile(user_ids=None, batch_size=500):
+    """Recomputes the counters from the Notification table; returns how many rows were written."""
+    notifications = Notification.objects.all()
+    counters = NotificationCounter.objects.all()
+    if user_ids is not None:
+        notifications = notifications.filter(recipient_id__in=user_ids)
+        counters = counters.filter(user_id__in=user_ids)
+
+    with transaction.atomic():
+        counts = notifications.unread_counts_by_recipient()
+        counters.update(**{field: 0 for field in FIELDS.values()})
+        NotificationCounter.objects.bulk_create(
+            [
+                NotificationCounter(user_id=user_id, **{FIELDS[category]: count for category, count in values.items()})
+                for user_id, values in counts.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=list(FIELDS.values()),
+            batch_size=batch_size,
+        )
+    return len(counts)
@@ -0,0 +1,201 @@
+"""
+Fan-out handlers run by the notification workers (see pipeline.py).
+Each one receives the compact payload queued by a receiver in signals.py,
+re-reads what it needs and hands the notifications to `deliver()`.
+The source object may be gone by the time the event runs; then nothing is sent.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from chat.models import ChatMessage, GroupChat, GroupMessage
+from posts.models import Post, Comment, Reaction
+from users.models import Follow
+from . import unread
+from .models import Notification
+from .coalescing import coalesce
+from .pipeline import handler, deliver, notifications_updated, BATCH_SIZE
+
+User = get_user_model()
+
+
+@handler("private_message")
+def private_message(payload):
+    message = ChatMessage.objects.filter(id=payload["message_id"]).only("id", "sender_id", "receiver_id").first()
+    if not message or not message.receiver_id:
+        return
+    deliver([
+        Notification(
+            recipient_id=message.receiver_id,
+            sender_id=message.sender_id,
+            notification_type="chat",
+            related_content_type=ContentType.objects.get_for_model(ChatMessage),
+            related_object_id=message.id
+        )
+    ])
+
+
+@handler("group_message")
+def group_message(payload):
+    if not GroupMessage.objects.filter(id=payload["message_id"]).exists():
+        return
+    if getattr(settings, "GROUP_CHAT_NOTIFICATION_MODE", "collapsed") == "collapsed":
+        collapse_group_message(payload)
+    else:
+        fan_out_group_message(payload)
+
+
+def collapse_group_message(payload):
+    """
+    Collapsed mode: every member keeps a single row per group. A new message is one
+    UPDATE over the group's rows; only members without a row yet get an INSERT.
+    """
+    try:
+        with transaction.atomic():
+            _collapse_group_message(payload)
+    except IntegrityError:
+        # Another worker created a member's row first; the retry bumps it instead
+        with transaction.atomic():
+            _collapse_group_message(payload)
+
+
+def _collapse_group_message(payload):
+    group_id, sender_id, message_id = payload["group_id"], payload["sender_id"], payload["message_id"]
+    now = timezone.now()
+    member_ids = GroupChat.members.through.objects.filter(groupchat_id=group_id).values("user_id")
+    # Rows left behind by members who have since been removed are not bumped
+    rows = Notification.objects.filter(group_id=group_id, recipient_id__in=member_ids).exclude(recipient_id=sender_id)
+    bumped = dict(rows.values_list("id", "recipient_id"))
+    if bumped:
+        Notification.objects.filter(id__in=bumped).update(
+            unread_count=F("unread_count") + 1,
+            is_read=False,
+            sender_id=sender_id,
+            last_message_id=message_id,
+            related_object_id=message_id,
+            created_at=now,
+            updated_at=now,
+        )
+        notifications_updated.send(sender=Notification, notification_ids=list(bumped))
+        unread.announce(unread.bump_changes(bumped.values(), "group_chat"))
+
+    missing = (
+        GroupChat.members.through.objects.filter(groupchat_id=group_id)
+        .exclude(user_id=sender_id)
+        .exclude(user_id__in=rows.values("recipient_id"))
+        .values_list("user_id", flat=True)
+    )
+    content_type = ContentType.objects.get_for_model(GroupMessage)
+    deliver(
+        Notification(
+            recipient_id=member_id,
+            sender_id=sender_id,
+            notification_type="group_chat",
+            group_id=group_id,
+            unread_count=1,
+            last_message_id=message_id,
+            related_content_type=content_type,
+            related_object_id=message_id,
+        )
+        for member_id in missing
+    )
+
+
+def fan_out_group_message(payload):
+    """Per-message mode: one row per member per message."""
+    content_type = ContentType.objects.get_for_model(GroupMessage)
+    member_ids = (
+        GroupChat.members.through.objects.filter(groupchat_id=payload["group_id"])
+        .exclude(user_id=payload["sender_id"])
+        .values_list("user_id", flat=True)
+        .order_by("user_id")
+    )
+    # Walk the member list in chunks so a large group never builds one huge batch
+    last_id = 0
+    while True:
+        chunk = list(member_ids.filter(user_id__gt=last_id)[:BATCH_SIZE])
+        if not chunk:
+            break
+        deliver(
+            Notification(
+                recipient_id=member_id,
+                sender_id=payload["sender_id"],
+                notification_type="group_chat",
+                related_content_type=content_type,
+                related_object_id=payload["message_id"],
+            )
+            for member_id in chunk
+        )
+        last_id = chunk[-1]
+
+
+@handler("follow")
+def follow(payload):
+    instance = Follow.objects.filter(id=payload["follow_id"]).first()
+    if not instance:
+        return
+    deliver([
+        Notification(
+            recipient_id=instance.following_id,
+            sender_id=instance.follower_id,
+            notification_type="follow",
+            related_content_type=ContentType.objects.get_for_model(Follow),
+            related_object_id=instance.id
+        )
+    ])
+
+
+@handler("comment")
+def comment(payload):
+    instance = Comment.objects.filter(id=payload["comment_id"]).select_related("post").first()
+    if not instance or not instance.post.author_id or instance.post.author_id == instance.author_id:
+        return
+    deliver([
+        Notification(
+            recipient_id=instance.post.author_id,
+            sender_id=instance.author_id,
+            notification_type="comment",
+            related_content_type=ContentType.objects.get_for_model(Comment),
+            related_object_id=instance.id
+        )
+    ])
+
+
+def extract_mentions(text):
+    return set(re.findall(r'@([\w.-]+)', text))
+
+
+@handler("mention")
+def mention(payload):
+    model = Post if payload["model"] == "post" else Comment
+    instance = model.objects.filter(id=payload["object_id"]).select_related("author").first()
+    if not instance:
+        return
+    text = instance.body if model is Post else instance.comment
+    # Mentions coalesce per post, whether they were made in the post or in its comments
+    target = instance if model is Post else instance.post
+
+    mentioned_ids = (
+        User.objects.filter(username__in=extract_mentions(text))
+        .exclude(id=instance.author_id)
+        .values_list("id", flat=True)
+    )
+    for user_id in mentioned_ids:
+        coalesce(user_id, instance.author, "mention", target)
+
+
+@handler("reaction")
+def reaction(payload):
+    instance = Reaction.objects.filter(id=payload["reaction_id"]).select_related("user", "post", "comment").first()
+    if not instance:
+        return
+    target = instance.post or instance.comment
+    if not target or not target.author_id or target.author_id == instance.user_id:
+        return
+    # Reads the current type, so a switch made while the event was queued is not lost
+    coalesce(target.author_id, instance.user, "reaction", target, reaction_type=instance.reaction_type)
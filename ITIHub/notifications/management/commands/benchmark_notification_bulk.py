@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from notifications import bulk
+from notifications.models import Notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway user with many unread notifications and times mark-all-as-read / clear-all "
+        "as one statement versus primary-key chunks. The longest chunk is how long other writers wait."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help="Notifications to seed.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per chunk in batched mode.")
+
+    def handle(self, *args, **options):
+        rows, batch_size = options['rows'], options['batch_size']
+        User = get_user_model()
+        user = User.objects.create_user(
+            username=f"bench_{int(time.time())}", email=f"bench_{int(time.time())}@example.invalid", password=None
+        )
+        try:
+            for label, action in (("mark-all-as-read", bulk.mark_read), ("clear-all", bulk.delete)):
+                for mode, size in (("single", 0), ("batched", batch_size)):
+                    self.seed(user, rows)
+                    queryset = Notification.objects.filter(recipient=user)
+                    if action is bulk.mark_read:
+                        queryset = queryset.filter(is_read=False)
+                    total, longest, chunks = self.run(user, queryset, action, size)
+                    self.stdout.write(
+                        f"{label:17} {mode:8} rows={rows} chunks={chunks:4} "
+                        f"total={total * 1000:8.1f} ms  longest lock={longest * 1000:7.1f} ms"
+                    )
+        finally:
+            Notification.objects.filter(recipient=user).delete()
+            user.delete()
+
+    def seed(self, user, rows):
+        Notification.objects.filter(recipient=user).delete()
+        Notification.objects.bulk_create(
+            (Notification(recipient=user, notification_type="follow") for _ in range(rows)), batch_size=2000
+        )
+
+    def run(self, user, queryset, action, batch_size):
+        marks = [time.perf_counter()]
+        processed, chunks = bulk.run_in_chunks(
+            user.id, queryset, action, batch_size=batch_size, progress=lambda *_: marks.append(time.perf_counter())
+        )
+        longest = max(end - start for start, end in zip(marks, marks[1:]))
+        return marks[-1] - marks[0], longest, chunks
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from notifications import retention
+
+
+class Command(BaseCommand):
+    help = "Deletes (or archives) read notifications older than the retention age, in bounded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Retention age (defaults to NOTIFICATION_RETENTION_DAYS).")
+        parser.add_argument('--batch-size', type=int, help="Rows per chunk (defaults to NOTIFICATION_RETENTION_BATCH).")
+        parser.add_argument('--archive', action='store_true', default=None, help="Copy rows to ArchivedNotification first.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows would go.")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = retention.expired(options['days']).count()
+            self.stdout.write(f"{count} notifications would be removed.")
+            return
+        removed = retention.prune(days=options['days'], batch_size=options['batch_size'], archive_rows=options['archive'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} notifications."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from notifications.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized unread notification counters from the Notification table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help="Only this user id (repeatable).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows written per bulk INSERT.")
+
+    def handle(self, *args, **options):
+        written = reconcile(user_ids=options['users'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled unread counters for {written} users."))
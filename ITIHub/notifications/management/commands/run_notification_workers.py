@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.pipeline import get_pool
+
+
+class Command(BaseCommand):
+    help = "Runs the notification fan-out workers in the foreground (use with NOTIFICATION_WORKERS_AUTOSTART = False)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Worker threads (defaults to NOTIFICATION_WORKERS).")
+        parser.add_argument('--drain', action='store_true', help="Process the queued events once and exit.")
+
+    def handle(self, *args, **options):
+        pool = get_pool()
+        if options['drain']:
+            total = 0
+            while True:
+                handled = pool.run_once()
+                if not handled:
+                    break
+                total += handled
+            self.stdout.write(self.style.SUCCESS(f"Processed {total} notification events."))
+            return
+
+        if options['workers']:
+            pool.workers = options['workers']
+        pool.start()
+        self.stdout.write(f"Notification workers running ({pool.workers} threads). Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pool.stop()
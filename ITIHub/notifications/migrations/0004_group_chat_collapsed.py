@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_initial'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0003_notificationevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chat.groupchat'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.groupmessage'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('group__isnull', False)), fields=('recipient', 'group'), name='unique_group_chat_notification'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+CHAT_TYPES = ("chat", "group_chat")
+POST_TYPES = ("new_post", "comment", "mention", "reaction")
+
+
+def backfill_counters(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationCounter = apps.get_model('notifications', 'NotificationCounter')
+    weight = models.Case(models.When(group__isnull=False, then=models.F('unread_count')), default=models.Value(1))
+    rows = (
+        Notification.objects.filter(is_read=False)
+        .values('recipient_id')
+        .annotate(
+            all_unread=models.Sum(weight),
+            chat_unread=models.Sum(weight, filter=models.Q(notification_type__in=CHAT_TYPES)),
+            post_unread=models.Sum(weight, filter=models.Q(notification_type__in=POST_TYPES)),
+        )
+        .order_by()
+    )
+    NotificationCounter.objects.bulk_create(
+        [
+            NotificationCounter(
+                user_id=row['recipient_id'],
+                all_unread=row['all_unread'] or 0,
+                chat_unread=row['chat_unread'] or 0,
+                post_unread=row['post_unread'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_group_chat_collapsed'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('all_unread', models.IntegerField(default=0)),
+                ('chat_unread', models.IntegerField(default=0)),
+                ('post_unread', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:27
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def point_at_targets(apps, schema_editor):
+    """Existing reaction / mention rows become one-actor coalesced rows pointing at the post or comment."""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationCounter = apps.get_model('notifications', 'NotificationCounter')
+    Reaction = apps.get_model('posts', 'Reaction')
+    Comment = apps.get_model('posts', 'Comment')
+    post_type, _ = ContentType.objects.get_or_create(app_label='posts', model='post')
+    comment_type, _ = ContentType.objects.get_or_create(app_label='posts', model='comment')
+    reaction_type = ContentType.objects.filter(app_label='posts', model='reaction').first()
+
+    rows = Notification.objects.filter(notification_type__in=['reaction', 'mention']).select_related('sender')
+    # Unread rows removed below, per recipient; reaction and mention count towards "all" and "post"
+    removed_unread = Counter()
+    for row in rows.iterator():
+        if row.related_content_type_id == getattr(reaction_type, 'id', None):
+            reaction = Reaction.objects.filter(id=row.related_object_id).first()
+            if reaction is None:
+                if not row.is_read:
+                    removed_unread[row.recipient_id] += 1
+                row.delete()
+                continue
+            if reaction.post_id:
+                row.related_content_type, row.related_object_id = post_type, reaction.post_id
+            else:
+                row.related_content_type, row.related_object_id = comment_type, reaction.comment_id
+        elif row.notification_type == 'mention' and row.related_content_type_id == comment_type.id:
+            comment = Comment.objects.filter(id=row.related_object_id).first()
+            if comment is not None:
+                row.related_content_type, row.related_object_id = post_type, comment.post_id
+        row.recent_actors = [{"id": row.sender.id, "username": row.sender.username}] if row.sender else []
+        row.save(update_fields=['related_content_type', 'related_object_id', 'recent_actors'])
+
+    for recipient_id, count in removed_unread.items():
+        NotificationCounter.objects.filter(user_id=recipient_id).update(
+            all_unread=models.F('all_unread') - count, post_unread=models.F('post_unread') - count
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('posts', '0008_reaction_type_indexes'),
+        ('notifications', '0006_notification_indexes_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recent_actors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(point_at_targets, migrations.RunPython.noop),
+    ]
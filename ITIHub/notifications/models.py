@@ -5,6 +5,53 @@ from django.contrib.contenttypes.models import ContentType
 
 User = get_user_model()
 
+# Notification types behind the chat and post badges / list views
+CHAT_TYPES = ("chat", "group_chat")
+POST_TYPES = ("new_post", "comment", "mention", "reaction")
+
+
+def unread_categories(notification_type):
+    """Badge categories a notification of this type counts towards."""
+    categories = ["all"]
+    if notification_type in CHAT_TYPES:
+        categories.append("chat")
+    elif notification_type in POST_TYPES:
+        categories.append("post")
+    return categories
+
+
+def unread_sums():
+    """
+    Sum() expressions of the unread weight per badge category.
+    A collapsed group chat row weighs its `unread_count`, any other row 1.
+    """
+    weight = models.Case(
+        models.When(group__isnull=False, then=models.F('unread_count')),
+        default=models.Value(1),
+    )
+    unread = models.Q(is_read=False)
+    return {
+        'all': models.Sum(weight, filter=unread),
+        'chat': models.Sum(weight, filter=unread & models.Q(notification_type__in=CHAT_TYPES)),
+        'post': models.Sum(weight, filter=unread & models.Q(notification_type__in=POST_TYPES)),
+    }
+
+
+class NotificationQuerySet(models.QuerySet):
+    def unread_counts(self):
+        """Unread weight per badge category over this queryset, in one query."""
+        counts = self.aggregate(**unread_sums())
+        return {category: total or 0 for category, total in counts.items()}
+
+    def unread_counts_by_recipient(self):
+        """{recipient_id: {category: count}} for every recipient in this queryset, in one query."""
+        rows = self.filter(is_read=False).values('recipient_id').annotate(**unread_sums()).order_by()
+        return {
+            row.pop('recipient_id'): {category: total or 0 for category, total in row.items()}
+            for row in rows
+        }
+
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('reaction', 'Reaction'),
@@ -41,5 +88,110 @@ class Notification(models.Model):
     related_object_id = models.PositiveIntegerField(null=True, blank=True)
     related_object = GenericForeignKey('related_content_type', 'related_object_id')
 
+    # Collapsed group chat rows (GROUP_CHAT_NOTIFICATION_MODE = "collapsed"):
+    # one row per (recipient, group), bumped in place for every new message.
+    group = models.ForeignKey('chat.GroupChat', related_name='+', on_delete=models.CASCADE, null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    last_message = models.ForeignKey('chat.GroupMessage', related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+
+    # Coalesced reaction / mention rows (see coalescing.py): how many actors the row
+    # stands for and the latest few of them as [{"id", "username"}], newest first.
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)
+
+    objects = NotificationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'group'], condition=models.Q(group__isnull=False), name='unique_group_chat_notification'
+            ),
+        ]
+        indexes = [
+            # List views: a recipient's rows newest first, optionally by type or unread only
+            models.Index(fields=['recipient', 'created_at', 'id'], name='notification_recipient_idx'),
+            models.Index(fields=['recipient', 'notification_type', 'created_at'], name='notification_type_idx'),
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_unread_idx'),
+            # Lookups by source object (reaction switch / removal)
+            models.Index(fields=['related_content_type', 'related_object_id'], name='notification_related_idx'),
+            # Retention: old read rows, oldest first
+            models.Index(fields=['is_read', 'created_at', 'id'], name='notification_retention_idx'),
+        ]
+
+    @property
+    def is_collapsed(self):
+        return self.group_id is not None
+
+    @property
+    def unread_weight(self):
+        if self.is_read:
+            return 0
+        return self.unread_count if self.is_collapsed else 1
+
     def __str__(self):
         return f"{self.recipient.username} - {self.get_notification_type_display()}"
+
+
+class NotificationEvent(models.Model):
+    """
+    Durable queue of pending notification fan-out work.
+    - Writers insert a compact event (ids only) in their own transaction.
+    - Workers claim events in batches, build the notifications and delete the event.
+    - An event whose claim is older than the lease is picked up again.
+    """
+    kind = models.CharField(max_length=30)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['claimed_at', 'id'], name='notification_event_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.payload}"
+
+
+class NotificationCounter(models.Model):
+    """
+    Materialized unread badge counts of one user, kept in step with the
+    Notification table by the `unread_changed` deltas (see counters.py).
+    `manage.py reconcile_notification_counts` rebuilds them from scratch.
+    """
+    CATEGORIES = {'all': 'all_unread', 'chat': 'chat_unread', 'post': 'post_unread'}
+
+    user = models.OneToOneField(User, related_name='notification_counter', on_delete=models.CASCADE, primary_key=True)
+    all_unread = models.IntegerField(default=0)
+    chat_unread = models.IntegerField(default=0)
+    post_unread = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def as_dict(self):
+        # Deltas can race a reconciliation run; never show a negative badge
+        return {category: max(getattr(self, field), 0) for category, field in self.CATEGORIES.items()}
+
+    def __str__(self):
+        return f"{self.user_id}: {self.as_dict()}"
+
+
+class ArchivedNotification(models.Model):
+    """Read notifications moved out of the live table by the retention job (see retention.py)."""
+    original_id = models.BigIntegerField()
+    recipient = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    sender = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    reaction_type = models.CharField(max_length=10, null=True, blank=True)
+    related_content_type = models.ForeignKey(ContentType, related_name='+', on_delete=models.CASCADE, null=True, blank=True)
+    related_object_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'created_at'], name='archived_notification_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient_id} - {self.notification_type} (archived)"
@@ -0,0 +1,7 @@
+from ITIHub.pagination import KeysetCursorPagination
+
+
+class NotificationCursorPagination(KeysetCursorPagination):
+    """A user's notifications newest first."""
+    ordering = ('-created_at', '-id')
+    page_size = 20
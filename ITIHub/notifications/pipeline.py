@@ -0,0 +1,269 @@
+"""
+Queued notification fan-out.
+
+Signal receivers call `enqueue(kind, **payload)` with a compact event (ids only)
+instead of building `Notification` rows in the request / WebSocket save path.
+A pool of worker threads claims events from the configured queue backend, runs
+the handler registered for the event kind and bulk-inserts the resulting
+notifications in chunks through `deliver()`.
+
+Settings:
+- NOTIFICATION_QUEUE_BACKEND: dotted path of the queue backend class.
+- NOTIFICATION_WORKERS: number of worker threads in the in-process pool.
+- NOTIFICATION_BATCH_SIZE: rows per bulk INSERT / events per claim.
+- NOTIFICATION_PIPELINE_EAGER: run handlers inline (tests, debugging).
+- NOTIFICATION_WORKERS_AUTOSTART: start the pool on the first enqueue.
+- NOTIFICATION_RETENTION_INTERVAL: also run the retention job (retention.py) every N seconds.
+"""
+import logging
+import queue
+import threading
+from datetime import timedelta
+from itertools import count
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import retention, unread
+from .models import Notification, NotificationEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, "NOTIFICATION_BATCH_SIZE", 500)
+POLL_INTERVAL = getattr(settings, "NOTIFICATION_POLL_INTERVAL", 1.0)
+LEASE_SECONDS = getattr(settings, "NOTIFICATION_QUEUE_LEASE", 60)
+MAX_ATTEMPTS = getattr(settings, "NOTIFICATION_MAX_ATTEMPTS", 5)
+
+# Sent after each chunk of notifications is inserted. Args: notifications (list).
+notifications_created = Signal()
+# Sent after existing rows are bumped in place (collapsed group chat). Args: notification_ids (list).
+notifications_updated = Signal()
+
+_handlers = {}
+
+
+def handler(kind):
+    """Registers the function that turns an event payload into notifications."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def deliver(notifications):
+    """Bulk-inserts notifications in chunks and announces each chunk."""
+    notifications = list(notifications)
+    for start in range(0, len(notifications), BATCH_SIZE):
+        chunk = Notification.objects.bulk_create(notifications[start:start + BATCH_SIZE])
+        notifications_created.send(sender=Notification, notifications=chunk)
+        unread.announce(unread.notification_changes(chunk))
+    return len(notifications)
+
+
+def process_event(kind, payload):
+    func = _handlers.get(kind)
+    if func is None:
+        logger.error("No notification handler registered for %r", kind)
+        return
+    func(payload)
+
+
+# ---------------------------------------------------------------- queue backends
+
+class DatabaseQueueBackend:
+    """Durable queue stored in the NotificationEvent table."""
+
+    def push(self, kind, payload):
+        NotificationEvent.objects.create(kind=kind, payload=payload)
+
+    def push_many(self, kind, payloads):
+        NotificationEvent.objects.bulk_create(
+            [NotificationEvent(kind=kind, payload=payload) for payload in payloads], batch_size=BATCH_SIZE
+        )
+
+    def claim(self, limit):
+        stale = timezone.now() - timedelta(seconds=LEASE_SECONDS)
+        with transaction.atomic():
+            pending = NotificationEvent.objects.filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale))
+            if connection.features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            events = list(pending.order_by('id')[:limit])
+            if events:
+                NotificationEvent.objects.filter(id__in=[event.id for event in events]).update(
+                    claimed_at=timezone.now(), attempts=F('attempts') + 1
+                )
+        return [(event.id, event.kind, event.payload, event.attempts + 1) for event in events]
+
+    def ack(self, event_ids):
+        NotificationEvent.objects.filter(id__in=event_ids).delete()
+
+    def pending(self):
+        return NotificationEvent.objects.count()
+
+
+class InMemoryQueueBackend:
+    """Process-local queue; events are lost if the process dies. For single-node / dev use."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._ids = count(1)
+
+    def push(self, kind, payload):
+        # Only hand the event to workers once the writer's transaction is committed
+        transaction.on_commit(lambda: self._queue.put((next(self._ids), kind, payload, 1)))
+
+    def push_many(self, kind, payloads):
+        for payload in payloads:
+            self.push(kind, payload)
+
+    def claim(self, limit):
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def ack(self, event_ids):
+        pass
+
+    def pending(self):
+        return self._queue.qsize()
+
+
+# ---------------------------------------------------------------- worker pool
+
+class WorkerPool:
+    """Threads that drain the queue backend and run the event handlers."""
+
+    def __init__(self, backend, workers=2, periodic=()):
+        self.backend = backend
+        self.workers = workers
+        # (interval_seconds, func) maintenance jobs run on their own threads
+        self.periodic = list(periodic)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"notification-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            for interval, func in self.periodic:
+                thread = threading.Thread(
+                    target=self._run_periodic, args=(interval, func), name=f"notification-{func.__name__}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        self._wakeup.set()
+
+    def run_once(self):
+        """Claims and processes one batch; returns how many events were handled."""
+        events = self.backend.claim(BATCH_SIZE)
+        dropped = []
+        for event_id, kind, payload, attempts in events:
+            try:
+                # The handler's writes and the ack commit together: a fan-out that
+                # fails partway leaves nothing behind for the retry to duplicate
+                with transaction.atomic():
+                    process_event(kind, payload)
+                    self.backend.ack([event_id])
+            except Exception:
+                logger.exception("Notification event %s (%s) failed", event_id, kind)
+                if attempts >= MAX_ATTEMPTS:
+                    logger.error("Dropping notification event %s after %s attempts", event_id, attempts)
+                    dropped.append(event_id)
+        if dropped:
+            self.backend.ack(dropped)
+        return len(events)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                handled = self.run_once()
+            except Exception:
+                logger.exception("Notification worker loop failed")
+                handled = 0
+            finally:
+                close_old_connections()
+            if not handled:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+
+    def _run_periodic(self, interval, func):
+        while not self._stop.wait(interval):
+            try:
+                func()
+            except Exception:
+                logger.exception("Periodic notification job %s failed", func.__name__)
+            finally:
+                close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            backend_path = getattr(settings, "NOTIFICATION_QUEUE_BACKEND", "notifications.pipeline.DatabaseQueueBackend")
+            periodic = []
+            retention_interval = getattr(settings, "NOTIFICATION_RETENTION_INTERVAL", None)
+            if retention_interval:
+                periodic.append((retention_interval, retention.run_periodic))
+            _pool = WorkerPool(
+                import_string(backend_path)(),
+                workers=getattr(settings, "NOTIFICATION_WORKERS", 2),
+                periodic=periodic,
+            )
+        return _pool
+
+
+def enqueue(kind, **payload):
+    """Queues a fan-out event. Runs inline when NOTIFICATION_PIPELINE_EAGER is set."""
+    if getattr(settings, "NOTIFICATION_PIPELINE_EAGER", False):
+        process_event(kind, payload)
+        return
+    pool = get_pool()
+    pool.backend.push(kind, payload)
+    if getattr(settings, "NOTIFICATION_WORKERS_AUTOSTART", True):
+        pool.start()
+    transaction.on_commit(pool.wake)
+
+
+def enqueue_many(kind, payloads):
+    """Queues a batch of events of one kind with a single backend write."""
+    payloads = list(payloads)
+    if not payloads:
+        return
+    if getattr(settings, "NOTIFICATION_PIPELINE_EAGER", False):
+        for payload in payloads:
+            process_event(kind, payload)
+        return
+    pool = get_pool()
+    pool.backend.push_many(kind, payloads)
+    if getattr(settings, "NOTIFICATION_WORKERS_AUTOSTART", True):
+        pool.start()
+    transaction.on_commit(pool.wake)
@@ -0,0 +1,50 @@
+"""
+Pushes notifications and unread-count deltas to the user's open
+NotificationConsumer sockets (channel layer group `notifications_<user_id>`).
+Messages go out after the writing transaction commits; a channel layer
+failure is logged and never breaks the write that triggered it.
+Notifications travel as ids only: the recipient's consumer renders them, so the
+fan-out path does no serialization work for users without an open socket.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def user_group(user_id):
+    return f"notifications_{user_id}"
+
+
+def send(user_id, message):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(user_group(user_id), message)
+    except Exception:
+        logger.exception("Notification push to user %s failed", user_id)
+
+
+def send_on_commit(messages):
+    """`messages` is a list of (user_id, message) pairs."""
+    if messages:
+        transaction.on_commit(lambda: [send(user_id, message) for user_id, message in messages])
+
+
+def push_notifications(rows, event="notification_created"):
+    """`rows` are (notification_id, recipient_id) pairs."""
+    send_on_commit([
+        (recipient_id, {"type": event, "notification_id": notification_id})
+        for notification_id, recipient_id in rows
+    ])
+
+
+def push_unread_changes(changes):
+    send_on_commit([
+        (recipient_id, {"type": "unread_changed", "deltas": deltas})
+        for recipient_id, deltas in changes.items()
+    ])
@@ -0,0 +1,76 @@
+"""
+Retention for the Notification table.
+
+Read notifications older than NOTIFICATION_RETENTION_DAYS are deleted, or first
+copied to ArchivedNotification when NOTIFICATION_RETENTION_ARCHIVE is set. The
+work is done in id-ordered chunks of NOTIFICATION_RETENTION_BATCH rows, each in
+its own short transaction, so the table is never locked for the whole run.
+Unread rows are never touched, so the unread counters do not change.
+
+Runs through `manage.py prune_notifications`, or periodically inside the
+notification worker pool when NOTIFICATION_RETENTION_INTERVAL (seconds) is set.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = getattr(settings, "NOTIFICATION_RETENTION_DAYS", 90)
+RETENTION_BATCH = getattr(settings, "NOTIFICATION_RETENTION_BATCH", 1000)
+RETENTION_ARCHIVE = getattr(settings, "NOTIFICATION_RETENTION_ARCHIVE", False)
+
+
+def expired(days=None):
+    cutoff = timezone.now() - timedelta(days=RETENTION_DAYS if days is None else days)
+    return Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+
+def archive(notifications):
+    ArchivedNotification.objects.bulk_create([
+        ArchivedNotification(
+            original_id=notification.id,
+            recipient_id=notification.recipient_id,
+            sender_id=notification.sender_id,
+            notification_type=notification.notification_type,
+            reaction_type=notification.reaction_type,
+            related_content_type_id=notification.related_content_type_id,
+            related_object_id=notification.related_object_id,
+            created_at=notification.created_at,
+        )
+        for notification in notifications
+    ])
+
+
+def prune(days=None, batch_size=None, archive_rows=None):
+    """Deletes (or archives) expired read notifications chunk by chunk; returns how many rows went."""
+    batch_size = batch_size or RETENTION_BATCH
+    archive_rows = RETENTION_ARCHIVE if archive_rows is None else archive_rows
+    queryset = expired(days).order_by('id')
+    total = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not chunk:
+                break
+            if archive_rows:
+                archive(chunk)
+            Notification.objects.filter(id__in=[notification.id for notification in chunk]).delete()
+        total += len(chunk)
+        last_id = chunk[-1].id
+    return total
+
+
+def run_periodic():
+    try:
+        removed = prune()
+        if removed:
+            logger.info("Notification retention removed %s rows", removed)
+    except Exception:
+        logger.exception("Notification retention run failed")
@@ -3,23 +3,90 @@ from django.urls import reverse
 from .models import Notification
 from chat.models import ChatMessage, GroupMessage
 from batches.models import Batch
-from posts.models import Post, Comment, Reaction
+from posts.models import Post, Comment
 from django.conf import settings
-
-
-class NotificationSerializer(serializers.ModelSerializer):
+from django.contrib.contenttypes.models import ContentType
+from ITIHub.eager_loading import EagerLoadingSerializerMixin
+
+# Model behind `related_object_id` for each notification type, and the relations
+# the text/link methods follow on it. Coalesced types point at whatever their
+# content type says (a post or a comment).
+RELATED_MODELS = {
+    "chat": ChatMessage,
+    "group_chat": GroupMessage,
+    "batch_assignment": Batch,
+    "batch_end": Batch,
+    "comment": Comment,
+}
+COALESCED_TYPES = ("reaction", "mention")
+RELATED_SELECT = {
+    ChatMessage: ("sender",),
+    GroupMessage: ("group",),
+    Comment: ("author", "post"),
+}
+
+
+def related_model(notification):
+    if notification.notification_type in COALESCED_TYPES:
+        if not notification.related_content_type_id:
+            return None
+        # get_for_id is served from the content type cache after the first call
+        return ContentType.objects.get_for_id(notification.related_content_type_id).model_class()
+    return RELATED_MODELS.get(notification.notification_type)
+
+
+def actors_text(notification):
+    """"X", "X and Y", "X, Y and Z" or "X, Y, Z and 47 others"."""
+    names = [actor["username"] for actor in notification.recent_actors]
+    if not names:
+        names = [getattr(notification.sender, "username", "Someone")]
+    others = notification.actor_count - len(names)
+    if others > 0:
+        return f"{', '.join(names)} and {others} other{'s' if others > 1 else ''}"
+    if len(names) == 1:
+        return names[0]
+    return f"{', '.join(names[:-1])} and {names[-1]}"
+
+
+class NotificationListSerializer(serializers.ListSerializer):
+    """Serializes a page of notifications, loading their related objects in one query per model."""
+
+    def to_representation(self, data):
+        notifications = list(data.all() if hasattr(data, 'all') else data)
+        ids_by_model = {}
+        for notification in notifications:
+            model = related_model(notification)
+            if model and notification.related_object_id:
+                ids_by_model.setdefault(model, set()).add(notification.related_object_id)
+
+        found = {
+            model: model.objects.select_related(*RELATED_SELECT.get(model, ())).in_bulk(ids)
+            for model, ids in ids_by_model.items()
+        }
+        for notification in notifications:
+            model = related_model(notification)
+            if model:
+                notification._cached_related_object = found.get(model, {}).get(notification.related_object_id)
+        return super().to_representation(notifications)
+
+
+class NotificationSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
     sender = serializers.SerializerMethodField()
     status = serializers.SerializerMethodField()
     notification_text = serializers.SerializerMethodField()
     notification_link = serializers.SerializerMethodField()
     reaction_type = serializers.CharField(source="get_reaction_type_display", read_only=True)
 
+    select_related_fields = ('sender', 'group')
+
     class Meta:
         model = Notification
         fields = [
             'id', 'sender', 'notification_type', 'reaction_type', 'created_at',
-            'is_read', 'status', 'notification_text', 'notification_link'
+            'is_read', 'status', 'notification_text', 'notification_link',
+            'group', 'unread_count', 'actor_count', 'recent_actors'
         ]
+        list_serializer_class = NotificationListSerializer
 
     def get_sender(self, obj):
         return {"id": obj.sender.id, "username": obj.sender.username} if obj.sender else None
@@ -29,16 +96,11 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     def get_related_object(self, obj):
         if not hasattr(obj, "_cached_related_object"):
-            model_map = {
-                "chat": ChatMessage,
-                "group_chat": GroupMessage,
-                "batch_assignment": Batch,
-                "batch_end": Batch,
-                "reaction": Reaction,
-                "comment": Comment,
-            }
-            model = model_map.get(obj.notification_type)
-            obj._cached_related_object = model.objects.filter(id=obj.related_object_id).first() if model else None
+            model = related_model(obj)
+            obj._cached_related_object = (
+                model.objects.select_related(*RELATED_SELECT.get(model, ())).filter(id=obj.related_object_id).first()
+                if model else None
+            )
         return obj._cached_related_object
 
     def get_notification_text(self, obj):
@@ -48,11 +110,19 @@ class NotificationSerializer(serializers.ModelSerializer):
         if obj.notification_type == "chat":
             return f"New message from {related_object.sender.username}" if related_object else "New message"
 
+        elif obj.notification_type == "group_chat" and obj.is_collapsed:
+            group_name = obj.group.name if obj.group else "a group chat"
+            if obj.unread_count > 1:
+                return f"{obj.unread_count} new messages in {group_name}"
+            return f"New message in {group_name}"
+
         elif obj.notification_type == "group_chat":
             group_name = related_object.group.name if related_object and related_object.group else "a group chat"
             return f"New message in {group_name}"
 
         elif obj.notification_type == "mention":
+            if obj.actor_count > 1:
+                return f"{actors_text(obj)} mentioned you"
             return f"You were mentioned by {sender_username}"
 
         elif obj.notification_type == "batch_assignment":
@@ -63,14 +133,12 @@ class NotificationSerializer(serializers.ModelSerializer):
 
         elif obj.notification_type == "reaction":
             reaction_type = getattr(obj, "reaction_type", None)
-            reaction = self.get_related_object(obj)
-
-            if reaction and getattr(reaction, "post", None):
-                return f"{sender_username} {reaction_type}d your post"
-            elif reaction and getattr(reaction, "comment", None):
-                return f"{sender_username} {reaction_type}d your comment"
-
-            return f"{sender_username} reacted"
+            if related_object is None:
+                return f"{actors_text(obj)} reacted"
+            target = "post" if isinstance(related_object, Post) else "comment"
+            if obj.actor_count > 1:
+                return f"{actors_text(obj)} reacted to your {target}"
+            return f"{sender_username} {reaction_type}d your {target}"
 
 
         elif obj.notification_type == "comment":
@@ -91,16 +159,15 @@ class NotificationSerializer(serializers.ModelSerializer):
             return f"{frontend_base_url}/batches/{related_object.id}/"
 
         elif obj.notification_type == "reaction":
-            if hasattr(related_object, "post") and related_object.post:
-                return f"{frontend_base_url}/posts/{related_object.post.id}/reactions/"
-            elif hasattr(related_object, "comment") and related_object.comment:
-                # Check if comment has a post associated with it
-                if hasattr(related_object.comment, "post") and related_object.comment.post:
-                    return f"{frontend_base_url}/posts/{related_object.comment.post.id}/comment/{related_object.comment.id}/reactions/"
-                else:
-                    return f"{frontend_base_url}/posts/{related_object.comment.id}/reactions/"
+            if isinstance(related_object, Post):
+                return f"{frontend_base_url}/posts/{related_object.id}/reactions/"
+            elif isinstance(related_object, Comment):
+                return f"{frontend_base_url}/posts/{related_object.post_id}/comment/{related_object.id}/reactions/"
             return f"{frontend_base_url}/"
 
+        elif obj.notification_type == "mention" and isinstance(related_object, Post):
+            return f"{frontend_base_url}/posts/{related_object.id}/"
+
         elif obj.notification_type == "comment":
             if hasattr(related_object, "post") and related_object.post:
                 return f"{frontend_base_url}/posts/{related_object.post.id}/comment/{related_object.id}"
@@ -1,55 +1,81 @@
-from django.db.models.signals import post_save, post_delete
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from .models import Notification
 from users.models import Follow
-from chat.models import ChatMessage, GroupMessage
-from posts.models import Post, Comment, Reaction
-from django.contrib.auth import get_user_model
+from chat.models import ChatMessage, GroupChat, GroupMessage, group_messages_created, messages_read
+from posts.models import Post, Comment, Reaction, reaction_changed
 from django.contrib.contenttypes.models import ContentType
-import re
+from django.utils import timezone
+from .pipeline import enqueue, enqueue_many, notifications_created, notifications_updated
+from . import coalescing, counters, realtime, unread
+from . import handlers  # registers the fan-out handlers
 
-User = get_user_model()
+# Receivers only queue a compact event; the notifications themselves are built
+# and bulk-inserted by the workers in notifications/handlers.py.
+
+def chat_notifications_enabled():
+    return getattr(settings, "CHAT_MESSAGE_NOTIFICATIONS", True)
 
 @receiver(post_save, sender=ChatMessage)
 def notify_private_message(sender, instance, created, **kwargs):
-    if created and instance.receiver:
-        Notification.objects.bulk_create([
-            Notification(
-                recipient=instance.receiver,
-                sender=instance.sender,
-                notification_type="chat",
-                related_content_type=ContentType.objects.get_for_model(instance),
-                related_object_id=instance.id
-            )
-        ])
+    if created and instance.receiver_id and chat_notifications_enabled():
+        enqueue("private_message", message_id=instance.id)
 
 @receiver(post_save, sender=GroupMessage)
 def notify_group_message(sender, instance, created, **kwargs):
-    if created:
-        group_members = instance.group.members.exclude(id=instance.sender.id)
-        notifications = [
-            Notification(
-                recipient=member,
-                sender=instance.sender,
-                notification_type="group_chat",
-                related_object_id=instance.id,
-                
-            )
-            for member in group_members
-        ]
-        Notification.objects.bulk_create(notifications)
+    if created and chat_notifications_enabled():
+        enqueue("group_message", message_id=instance.id, group_id=instance.group_id, sender_id=instance.sender_id)
+
+@receiver(group_messages_created)
+def notify_buffered_group_messages(sender, messages, **kwargs):
+    if not chat_notifications_enabled():
+        return
+    # bulk_create sends no post_save, so the chat write buffer announces its batches here
+    enqueue_many("group_message", [
+        {"message_id": message.id, "group_id": message.group_id, "sender_id": message.sender_id}
+        for message in messages
+    ])
+
+
+@receiver(m2m_changed, sender=GroupChat.members.through)
+def drop_removed_members_group_rows(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_remove", "post_clear"):
+        return
+    # Forward: instance is the group; reverse: instance is the user leaving groups
+    rows = Notification.objects.filter(group__isnull=False)
+    if reverse:
+        rows = rows.filter(recipient_id=instance.pk)
+        if pk_set:
+            rows = rows.filter(group_id__in=pk_set)
+    else:
+        rows = rows.filter(group_id=instance.pk)
+        if pk_set:
+            rows = rows.filter(recipient_id__in=pk_set)
+    still_member = GroupChat.members.through.objects.filter(
+        groupchat_id=OuterRef("group_id"), user_id=OuterRef("recipient_id")
+    )
+    with transaction.atomic():
+        removed = list(rows.exclude(Exists(still_member)))
+        if removed:
+            Notification.objects.filter(id__in=[row.id for row in removed]).delete()
+            unread.announce(unread.notification_changes(removed, sign=-1))
+
+
+@receiver(pre_delete, sender=GroupChat)
+def announce_deleted_group_rows(sender, instance, **kwargs):
+    # The collapsed rows go with the group through the foreign key cascade, which
+    # never passes through the code paths that announce unread changes
+    rows = list(Notification.objects.filter(group=instance, is_read=False))
+    unread.announce(unread.notification_changes(rows, sign=-1))
 
 
 @receiver(post_save, sender=Follow)
 def notify_follow(sender, instance, created, **kwargs):
     if created:
-        Notification.objects.create(
-            recipient=instance.following, 
-            sender=instance.follower,  
-            notification_type="follow", 
-            related_content_type=ContentType.objects.get_for_model(instance),
-            related_object_id=instance.id
-        )
+        enqueue("follow", follow_id=instance.id)
 
 # @receiver(post_save, sender=Post)
 # def notify_followers_on_new_post(sender, instance, created, **kwargs):
@@ -69,73 +95,96 @@ def notify_follow(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=Comment)
 def notify_post_author_on_comment(sender, instance, created, **kwargs):
-    if created and instance.post.author != instance.author: 
-        Notification.objects.create(
-            recipient=instance.post.author,
-            sender=instance.author,
-            notification_type="comment",
-            related_content_type=ContentType.objects.get_for_model(instance),
-            related_object_id=instance.id
-        )
-
-def extract_mentions(text):
-    return set(re.findall(r'@([\w.-]+)', text))  
+    if created:
+        enqueue("comment", comment_id=instance.id)
 
 @receiver(post_save, sender=Post)
 @receiver(post_save, sender=Comment)
 def notify_mentioned_users(sender, instance, created, **kwargs):
     if created:
-        if isinstance(instance, Post):
-            text = instance.body  
-        elif isinstance(instance, Comment):
-            text = instance.comment  
-        else:
-            return  
-
-        mentioned_usernames = extract_mentions(text) 
-        mentioned_users = User.objects.filter(username__in=mentioned_usernames)
-
-        notifications = [
-            Notification(
-                recipient=user,
-                sender=instance.author,
-                notification_type="mention",
-                related_content_type=ContentType.objects.get_for_model(instance),
-                related_object_id=instance.id
-            )
-            for user in mentioned_users if user != instance.author
-        ]
-        Notification.objects.bulk_create(notifications)
-
+        text = instance.body if isinstance(instance, Post) else instance.comment
+        # Most posts mention nobody; skip the queue round trip for them
+        if "@" in text:
+            enqueue("mention", model="post" if isinstance(instance, Post) else "comment", object_id=instance.id)
 
 
 @receiver(post_save, sender=Reaction)
 def notify_reaction(sender, instance, created, **kwargs):
     if created:
-        if instance.post and instance.post.author != instance.user:
-            Notification.objects.create(
-                recipient=instance.post.author,
-                sender=instance.user,
-                notification_type="reaction",
-                reaction_type=instance.reaction_type,
-                related_content_type=ContentType.objects.get_for_model(instance),
-                related_object_id=instance.id
-            )
-        elif instance.comment and instance.comment.author != instance.user:
-            print("✅ Reaction on comment: ", instance)
-            Notification.objects.create(
-                recipient=instance.comment.author,
-                sender=instance.user,
-                notification_type="reaction",
-                reaction_type=instance.reaction_type,
-                related_content_type=ContentType.objects.get_for_model(instance),
-                related_object_id=instance.id
-            )
+        enqueue("reaction", reaction_id=instance.id)
+
+def reaction_target(instance):
+    """(content type, id) of the post or comment a reaction belongs to."""
+    if instance.post_id:
+        return ContentType.objects.get_for_model(Post), instance.post_id
+    return ContentType.objects.get_for_model(Comment), instance.comment_id
+
+def reaction_target_author_id(instance):
+    model, object_id = (Post, instance.post_id) if instance.post_id else (Comment, instance.comment_id)
+    return model.objects.filter(id=object_id).values_list("author_id", flat=True).first()
+
+@receiver(reaction_changed, sender=Reaction)
+def update_reaction_notification(sender, instance, previous_type, **kwargs):
+    # The coalesced row shows the type of its latest actor
+    content_type, object_id = reaction_target(instance)
+    coalescing.target_rows("reaction", content_type, object_id).filter(sender_id=instance.user_id).update(
+        reaction_type=instance.reaction_type, updated_at=timezone.now()
+    )
 
 @receiver(post_delete, sender=Reaction)
 def remove_reaction_notification(sender, instance, **kwargs):
-    Notification.objects.filter(
-    sender=instance.user,
-    related_object_id=instance.id,
-    related_content_type=ContentType.objects.get_for_model(instance)
-    ).delete()
+    author_id = reaction_target_author_id(instance)
+    # Reactions on one's own post or comment were never counted on a notification
+    if author_id is None or author_id == instance.user_id:
+        return
+    content_type, object_id = reaction_target(instance)
+    coalescing.uncoalesce(author_id, instance.user_id, "reaction", content_type, object_id, since=instance.timestamp)
+
+
+# Chat read cursors (see chat/receipts.py) settle the chat notifications they cover
+
+@receiver(messages_read, sender=ChatMessage)
+def read_private_chat_notifications(sender, user_id, other_user_id, last_read_id, **kwargs):
+    rows = Notification.objects.filter(
+        recipient_id=user_id, sender_id=other_user_id, notification_type="chat", is_read=False,
+        related_object_id__lte=last_read_id,
+    )
+    unread.clear_unread(user_id, rows, lambda: rows.update(is_read=True, updated_at=timezone.now()))
+
+@receiver(messages_read, sender=GroupMessage)
+def read_group_chat_notifications(sender, user_id, group_id, last_read_id, unread_count, **kwargs):
+    with transaction.atomic():
+        # Collapsed row: its counter drops to the messages still after the cursor
+        row = Notification.objects.select_for_update().filter(recipient_id=user_id, group_id=group_id).first()
+        if row is not None and row.unread_weight > unread_count:
+            unread.announce(unread.bump_changes([user_id], "group_chat", unread_count - row.unread_weight))
+            row.unread_count = unread_count
+            row.is_read = unread_count == 0
+            row.save(update_fields=["unread_count", "is_read", "updated_at"])
+
+    # Per-message mode rows
+    rows = Notification.objects.filter(
+        recipient_id=user_id, notification_type="group_chat", group__isnull=True, is_read=False,
+        related_object_id__in=GroupMessage.objects.filter(group_id=group_id, id__lte=last_read_id).values("id"),
+    )
+    unread.clear_unread(user_id, rows, lambda: rows.update(is_read=True, updated_at=timezone.now()))
+
+
+# Real-time push to the recipients' notification sockets (see realtime.py)
+
+@receiver(notifications_created)
+def push_created_notifications(sender, notifications, **kwargs):
+    realtime.push_notifications((notification.id, notification.recipient_id) for notification in notifications)
+
+@receiver(notifications_updated)
+def push_updated_notifications(sender, notification_ids, **kwargs):
+    rows = Notification.objects.filter(id__in=notification_ids).values_list("id", "recipient_id")
+    realtime.push_notifications(rows, event="notification_updated")
+
+@receiver(unread.unread_changed)
+def update_unread_counters(sender, changes, **kwargs):
+    counters.apply_changes(changes)
+
+@receiver(unread.unread_changed)
+def push_unread_changes(sender, changes, **kwargs):
+    realtime.push_unread_changes(changes)
@@ -1,3 +1,549 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ITIHub.asgi import application
+
+from chat.models import ChatMessage, GroupChat, GroupMessage
+from posts.models import Post, Comment, Reaction
+from users.models import Follow, User
+from . import pipeline
+from .models import Notification, NotificationCounter, NotificationEvent
+
+
+class NotificationListQueryCountTests(APITestCase):
+    """Notification lists resolve related objects per model, not per row."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+        self.post = Post.objects.create(author=self.user, body="post")
+        self.group = GroupChat.objects.create(name="Track")
+        self.group.members.add(self.user)
+        self.senders = 0
+
+    def create_notifications(self, rounds):
+        # Every round adds a chat, comment, comment reaction and follow notification;
+        # the group chat and the post's reactions each collapse into a single row
+        for _ in range(rounds):
+            self.senders += 1
+            other = User.objects.create_user(
+                username=f"other{self.senders}", email=f"other{self.senders}@example.com", password="pass"
+            )
+            self.group.members.add(other)
+            ChatMessage.objects.create(sender=other, receiver=self.user, message="hi")
+            GroupMessage.objects.create(group=self.group, sender=other, content="hello")
+            comment = Comment.objects.create(author=other, post=self.post, comment="nice")
+            Reaction.objects.create(user=other, post=self.post, reaction_type="Like")
+            own_comment = Comment.objects.create(author=self.user, post=self.post, comment="mine")
+            Reaction.objects.create(user=other, comment=own_comment, reaction_type="Love")
+            Follow.objects.create(follower=other, following=self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_notification_list_query_count_is_constant_in_page_size(self):
+        self.create_notifications(8)
+
+        small, small_data = self.count_queries("/api/notifications/?page_size=6")
+        large, large_data = self.count_queries("/api/notifications/?page_size=30")
+
+        self.assertEqual(len(small_data["results"]), 6)
+        self.assertEqual(len(large_data["results"]), 30)
+        self.assertEqual(small, large)
+        self.assertIsNotNone(small_data["next"])
+
+    def test_cursor_walks_every_notification_once(self):
+        self.create_notifications(3)
+        seen = []
+        url = "/api/notifications/?page_size=4"
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(item["id"] for item in data["results"])
+            url = data["next"]
+        self.assertEqual(sorted(seen), sorted(Notification.objects.filter(recipient=self.user).values_list("id", flat=True)))
+
+
+class GroupChatNotificationTests(APITestCase):
+    """Group messages collapse into one unread-counter row per (recipient, group)."""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username="sender", email="sender@example.com", password="pass")
+        self.members = [
+            User.objects.create_user(username=f"member{i}", email=f"member{i}@example.com", password="pass")
+            for i in range(3)
+        ]
+        self.group = GroupChat.objects.create(name="Track")
+        self.group.members.add(self.sender, *self.members)
+
+    def send(self, count):
+        for i in range(count):
+            GroupMessage.objects.create(group=self.group, sender=self.sender, content=f"message {i}")
+
+    def test_messages_bump_a_single_row_per_member(self):
+        self.send(4)
+
+        rows = Notification.objects.filter(notification_type="group_chat")
+        self.assertEqual(rows.count(), len(self.members))
+        self.assertEqual(set(rows.values_list("unread_count", flat=True)), {4})
+        self.assertFalse(rows.filter(recipient=self.sender).exists())
+
+        self.client.force_authenticate(self.members[0])
+        data = self.client.get("/api/notifications/chat/unread/").json()["results"]
+        self.assertEqual(data[0]["unread_count"], 4)
+        self.assertEqual(data[0]["notification_text"], "4 new messages in Track")
+
+    def test_mark_as_read_resets_the_counter(self):
+        self.send(2)
+        notification = Notification.objects.get(recipient=self.members[0], group=self.group)
+        self.client.force_authenticate(self.members[0])
+
+        self.client.patch(f"/api/notifications/{notification.id}/mark-as-read/")
+        notification.refresh_from_db()
+        self.assertTrue(notification.is_read)
+        self.assertEqual(notification.unread_count, 0)
+
+        self.send(1)
+        notification.refresh_from_db()
+        self.assertFalse(notification.is_read)
+        self.assertEqual(notification.unread_count, 1)
+
+    def test_removed_member_row_is_dropped_and_not_bumped(self):
+        self.send(2)
+        removed = self.members[0]
+        self.group.members.remove(removed)
+        self.send(1)
+
+        self.assertFalse(Notification.objects.filter(recipient=removed).exists())
+        self.client.force_authenticate(removed)
+        self.assertEqual(self.client.get("/api/notifications/counts/").json()["chat"], 0)
+        self.assertEqual(Notification.objects.get(recipient=self.members[1], group=self.group).unread_count, 3)
+
+    def test_deleting_the_group_clears_its_unread_counts(self):
+        self.send(3)
+        self.group.delete()
+
+        self.client.force_authenticate(self.members[0])
+        self.assertEqual(self.client.get("/api/notifications/counts/").json(), {"all": 0, "chat": 0, "post": 0})
+
+    def test_stale_row_of_a_removed_member_is_not_bumped(self):
+        self.send(1)
+        removed = self.members[0]
+        GroupChat.members.through.objects.filter(groupchat_id=self.group.id, user_id=removed.id).delete()
+        self.send(1)
+        self.assertEqual(Notification.objects.get(recipient=removed, group=self.group).unread_count, 1)
+
+    @override_settings(GROUP_CHAT_NOTIFICATION_MODE="per_message")
+    def test_per_message_mode_keeps_one_row_per_message(self):
+        self.send(2)
+        self.assertEqual(Notification.objects.filter(notification_type="group_chat").count(), 2 * len(self.members))
+
+
+class NotificationCounterTests(APITestCase):
+    """The materialized unread counters follow every write path."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+        self.post = Post.objects.create(author=self.user, body="post")
+        self.group = GroupChat.objects.create(name="Track")
+        self.group.members.add(self.user)
+        self.others = [
+            User.objects.create_user(username=f"other{i}", email=f"other{i}@example.com", password="pass")
+            for i in range(3)
+        ]
+        for other in self.others:
+            self.group.members.add(other)
+            Comment.objects.create(author=other, post=self.post, comment="nice")
+            GroupMessage.objects.create(group=self.group, sender=other, content="hello")
+            ChatMessage.objects.create(sender=other, receiver=self.user, message="hi")
+
+    def counts(self):
+        return self.client.get("/api/notifications/counts/").json()
+
+    def assertCountsMatchTable(self):
+        self.assertEqual(self.counts(), Notification.objects.filter(recipient=self.user).unread_counts())
+
+    def test_counts_follow_creation_reads_and_deletes(self):
+        # 3 comments, 3 private messages and one collapsed group row holding 3 messages
+        self.assertEqual(self.counts(), {"all": 9, "chat": 6, "post": 3})
+
+        group_row = Notification.objects.get(recipient=self.user, group=self.group)
+        self.client.patch(f"/api/notifications/{group_row.id}/mark-as-read/")
+        self.assertEqual(self.counts(), {"all": 6, "chat": 3, "post": 3})
+
+        self.client.patch("/api/notifications/posts/mark-all-as-read/")
+        self.assertCountsMatchTable()
+
+        chat_row = Notification.objects.filter(recipient=self.user, notification_type="chat").first()
+        self.client.delete(f"/api/notifications/{chat_row.id}/")
+        self.assertCountsMatchTable()
+
+        self.client.delete("/api/notifications/clear-all/?type=chat")
+        self.assertEqual(self.counts(), {"all": 0, "chat": 0, "post": 0})
+
+    def test_chunked_mark_read_and_clear_keep_counts_exact(self):
+        from notifications import bulk
+
+        unread = Notification.objects.filter(recipient=self.user, is_read=False)
+        processed, chunks = bulk.run_in_chunks(self.user.id, unread, bulk.mark_read, batch_size=2)
+        self.assertEqual((processed, chunks), (7, 4))
+        self.assertEqual(self.counts(), {"all": 0, "chat": 0, "post": 0})
+
+        response = self.client.delete("/api/notifications/clear-all/").json()
+        self.assertEqual(response["processed"], 7)
+        self.assertFalse(Notification.objects.filter(recipient=self.user).exists())
+
+    def test_reconcile_repairs_drift(self):
+        from notifications.counters import reconcile
+        from .models import NotificationCounter
+
+        NotificationCounter.objects.filter(user=self.user).update(all_unread=100, chat_unread=-4)
+        reconcile()
+        self.assertCountsMatchTable()
+
+
+class NotificationCoalescingTests(APITestCase):
+    """Reactions and mentions on one target update a single row in place."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="pass")
+        self.post = Post.objects.create(author=self.author, body="popular post")
+        self.users = [
+            User.objects.create_user(username=f"fan{i}", email=f"fan{i}@example.com", password="pass")
+            for i in range(5)
+        ]
+
+    def react(self, user, reaction_type="Like"):
+        self.client.force_authenticate(user)
+        self.client.post(f"/api/posts/{self.post.id}/react/{reaction_type}/")
+
+    def test_reactions_coalesce_into_one_row(self):
+        for user in self.users:
+            self.react(user)
+
+        row = Notification.objects.get(recipient=self.author, notification_type="reaction")
+        self.assertEqual(row.actor_count, 5)
+        self.assertEqual([actor["username"] for actor in row.recent_actors], ["fan4", "fan3", "fan2"])
+
+        self.client.force_authenticate(self.author)
+        data = self.client.get("/api/notifications/posts/").json()["results"]
+        self.assertEqual(data[0]["notification_text"], "fan4, fan3, fan2 and 2 others reacted to your post")
+        self.assertEqual(self.client.get("/api/notifications/counts/").json()["post"], 1)
+
+    def test_removing_reactions_decrements_then_deletes(self):
+        for user in self.users[:2]:
+            self.react(user)
+        for user in self.users[:2]:
+            self.client.force_authenticate(user)
+            self.client.post(f"/api/posts/{self.post.id}/react/remove/")
+            if user is self.users[0]:
+                row = Notification.objects.get(recipient=self.author, notification_type="reaction")
+                self.assertEqual((row.actor_count, row.sender_id), (1, self.users[1].id))
+
+        self.assertFalse(Notification.objects.filter(notification_type="reaction").exists())
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get("/api/notifications/counts/").json()["all"], 0)
+
+    def test_authors_own_reaction_leaves_others_alone(self):
+        self.react(self.users[0])
+        self.react(self.author)
+        self.client.post(f"/api/posts/{self.post.id}/react/remove/")
+
+        row = Notification.objects.get(recipient=self.author, notification_type="reaction")
+        self.assertEqual((row.actor_count, row.sender_id), (1, self.users[0].id))
+
+    def test_removing_an_older_actor_uses_the_hidden_count(self):
+        for user in self.users:
+            self.react(user)
+        self.client.force_authenticate(self.users[0])
+        self.client.post(f"/api/posts/{self.post.id}/react/remove/")
+
+        row = Notification.objects.get(recipient=self.author, notification_type="reaction")
+        self.assertEqual(row.actor_count, 4)
+        self.assertEqual(len(row.recent_actors), 3)
+
+    def test_read_row_is_not_reused(self):
+        self.react(self.users[0])
+        Notification.objects.filter(recipient=self.author).update(is_read=True)
+        self.react(self.users[1])
+        self.assertEqual(Notification.objects.filter(recipient=self.author, notification_type="reaction").count(), 2)
+
+
+class ConcurrentMarkReadTests(TransactionTestCase):
+    """Parallel mark-as-read requests take a row's weight off the counters once."""
+
+    def test_parallel_mark_as_read(self):
+        user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        other = User.objects.create_user(username="other", email="other@example.com", password="pass")
+        for i in range(2):
+            ChatMessage.objects.create(sender=other, receiver=user, message=f"hi {i}")
+        row = Notification.objects.filter(recipient=user).first()
+        barrier = threading.Barrier(6)
+        errors = []
+
+        def mark_read():
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                response = client.patch(f"/api/notifications/{row.id}/mark-as-read/")
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=mark_read) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            NotificationCounter.objects.filter(user=user).values("all_unread", "chat_unread").get(),
+            {"all_unread": 1, "chat_unread": 1},
+        )
+
+
+class NotificationRetentionTests(APITestCase):
+    """Only read notifications past the retention age are pruned."""
+
+    def test_prune_removes_old_read_rows_in_chunks(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from notifications import retention
+        from .models import ArchivedNotification
+
+        user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        old = timezone.now() - timedelta(days=120)
+        rows = Notification.objects.bulk_create(
+            [Notification(recipient=user, notification_type="follow", is_read=i % 2 == 0) for i in range(10)]
+        )
+        Notification.objects.filter(id__in=[row.id for row in rows[:8]]).update(created_at=old)
+
+        removed = retention.prune(days=90, batch_size=3, archive_rows=True)
+
+        # Rows 0, 2, 4, 6 are old and read; 8 is read but recent; odd rows are unread
+        self.assertEqual(removed, 4)
+        self.assertEqual(Notification.objects.count(), 6)
+        self.assertEqual(
+            set(ArchivedNotification.objects.values_list("original_id", flat=True)),
+            {rows[i].id for i in (0, 2, 4, 6)},
+        )
+
+
+class NotificationDeliveryQueryTests(APITestCase):
+    """Inserting a chunk costs the same number of queries whatever its size."""
+
+    def deliver(self, count):
+        from .pipeline import deliver
+
+        recipients = User.objects.bulk_create([
+            User(username=f"r{count}_{i}", email=f"r{count}_{i}@example.com") for i in range(count)
+        ])
+        with CaptureQueriesContext(connection) as context, self.captureOnCommitCallbacks(execute=True):
+            deliver(
+                Notification(recipient_id=recipient.id, sender_id=self.sender.id, notification_type="follow")
+                for recipient in recipients
+            )
+        return len(context.captured_queries)
+
+    def test_delivery_query_count_is_constant_in_chunk_size(self):
+        self.sender = User.objects.create_user(username="sender", email="sender@example.com", password="pass")
+        self.assertEqual(self.deliver(5), self.deliver(50))
+
+
+@override_settings(NOTIFICATION_PIPELINE_EAGER=False, NOTIFICATION_WORKERS_AUTOSTART=False)
+class NotificationPipelineTests(APITestCase):
+    """Queued events are claimed, handled and acked; failures are retried after the lease."""
+
+    def setUp(self):
+        self.follower = User.objects.create_user(username="follower", email="follower@example.com", password="pass")
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="pass")
+        self.pool = pipeline.WorkerPool(pipeline.DatabaseQueueBackend(), workers=1)
+        patcher = mock.patch.object(pipeline, "_pool", self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def register(self, func):
+        patcher = mock.patch.dict(pipeline._handlers, {"flaky": func})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def expire_lease(self):
+        stale = timezone.now() - timedelta(seconds=pipeline.LEASE_SECONDS + 1)
+        NotificationEvent.objects.update(claimed_at=stale)
+
+    def test_run_once_handles_and_acks_queued_events(self):
+        Follow.objects.create(follower=self.follower, following=self.author)
+        self.assertEqual(NotificationEvent.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(self.pool.run_once(), 1)
+
+        self.assertEqual(Notification.objects.get().recipient, self.author)
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(self.pool.run_once(), 0)
+
+    def test_failed_event_is_retried_after_the_lease_expires(self):
+        calls = []
+
+        def flaky(payload):
+            calls.append(payload)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+
+        self.register(flaky)
+        pipeline.enqueue("flaky", value=1)
+
+        with self.assertLogs("notifications.pipeline", "ERROR"):
+            self.assertEqual(self.pool.run_once(), 1)
+        event = NotificationEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertIsNotNone(event.claimed_at)
+
+        # Still leased: nobody else picks it up
+        self.assertEqual(self.pool.run_once(), 0)
+
+        self.expire_lease()
+        self.assertEqual(self.pool.run_once(), 1)
+        self.assertEqual(calls, [{"value": 1}, {"value": 1}])
+        self.assertFalse(NotificationEvent.objects.exists())
+
+    def test_partial_fan_out_is_rolled_back_before_the_retry(self):
+        calls = []
+
+        def fan_out(payload):
+            calls.append(payload)
+            pipeline.deliver([Notification(recipient=self.author, notification_type="follow")])
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            pipeline.deliver([Notification(recipient=self.follower, notification_type="follow")])
+
+        self.register(fan_out)
+        pipeline.enqueue("flaky")
+
+        with self.assertLogs("notifications.pipeline", "ERROR"):
+            self.pool.run_once()
+        self.assertFalse(Notification.objects.exists())
+
+        self.expire_lease()
+        self.pool.run_once()
+        self.assertEqual(
+            sorted(Notification.objects.values_list("recipient_id", flat=True)),
+            sorted([self.author.id, self.follower.id]),
+        )
+        self.assertFalse(NotificationEvent.objects.exists())
+
+    def test_event_is_dropped_after_max_attempts(self):
+        def broken(payload):
+            raise RuntimeError("boom")
+
+        self.register(broken)
+        pipeline.enqueue("flaky")
+
+        with mock.patch.object(pipeline, "MAX_ATTEMPTS", 2), self.assertLogs("notifications.pipeline", "ERROR") as logs:
+            self.pool.run_once()
+            self.assertEqual(NotificationEvent.objects.get().attempts, 1)
+            self.expire_lease()
+            self.pool.run_once()
+
+        self.assertIn("Dropping notification event", logs.output[-1])
+
+        self.assertFalse(NotificationEvent.objects.exists())
+
+    def test_in_memory_backend_hands_events_over_on_commit(self):
+        self.pool.backend = pipeline.InMemoryQueueBackend()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.follower, following=self.author)
+            self.assertEqual(self.pool.backend.pending(), 0)
+        self.assertEqual(self.pool.backend.pending(), 1)
+
+        self.assertEqual(self.pool.run_once(), 1)
+        self.assertEqual(Notification.objects.get().recipient, self.author)
+        self.assertEqual(self.pool.backend.pending(), 0)
+
+    def test_worker_loop_survives_a_failing_batch(self):
+        calls = []
+
+        def run_once():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            self.pool._stop.set()
+            return 1
+
+        with mock.patch.object(self.pool, "run_once", run_once), \
+                mock.patch.object(pipeline, "POLL_INTERVAL", 0), \
+                mock.patch.object(pipeline, "close_old_connections") as close, \
+                self.assertLogs("notifications.pipeline", "ERROR"):
+            self.pool._run()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(close.call_count, 2)
+
+    def test_periodic_job_survives_a_failing_run(self):
+        calls = []
+
+        def job():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            self.pool._stop.set()
+
+        with mock.patch.object(pipeline, "close_old_connections"), \
+                self.assertLogs("notifications.pipeline", "ERROR") as logs:
+            self.pool._run_periodic(0, job)
+
+        self.assertEqual(len(calls), 2)
+        self.assertIn("Periodic notification job job failed", logs.output[0])
+
+
+class NotificationSocketTests(TransactionTestCase):
+    """New notifications and unread deltas are pushed to the recipient's socket."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass")
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(application, f"/ws/notifications/?token={AccessToken.for_user(user)}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_follow_is_pushed_with_unread_delta(self):
+        communicator = await self.connect(self.user)
+        initial = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(initial, {"event": "unread_counts", "counts": {"all": 0, "chat": 0, "post": 0}})
+
+        await database_sync_to_async(Follow.objects.create)(follower=self.other, following=self.user)
+
+        events = {}
+        for _ in range(2):
+            message = await communicator.receive_json_from(timeout=5)
+            events[message["event"]] = message
+        self.assertEqual(events["notification_created"]["notification"]["notification_type"], "follow")
+        self.assertEqual(events["unread_changed"]["deltas"], {"all": 1})
+        await communicator.disconnect()
+
+    async def test_anonymous_socket_is_rejected(self):
+        communicator = WebsocketCommunicator(application, "/ws/notifications/")
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
@@ -0,0 +1,59 @@
+"""
+Unread-count change announcements.
+
+Everything that changes how many unread notifications a user has reports it via
+`unread_changed`, as per-category deltas for each affected recipient:
+`{recipient_id: {"all": -3, "chat": -3}}`. The WebSocket push listens to it, so
+the write paths never need to know who consumes the numbers.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.dispatch import Signal
+
+from .models import Notification, unread_categories
+
+# Args: changes ({recipient_id: {category: delta}})
+unread_changed = Signal()
+
+
+def announce(changes):
+    changes = {
+        recipient_id: {category: delta for category, delta in deltas.items() if delta}
+        for recipient_id, deltas in changes.items()
+    }
+    changes = {recipient_id: deltas for recipient_id, deltas in changes.items() if deltas}
+    if changes:
+        unread_changed.send(sender=Notification, changes=changes)
+
+
+def notification_changes(notifications, sign=1):
+    """Unread weight of `notifications` per recipient; sign=-1 when they are read or removed."""
+    changes = defaultdict(lambda: defaultdict(int))
+    for notification in notifications:
+        weight = notification.unread_weight
+        if weight:
+            for category in unread_categories(notification.notification_type):
+                changes[notification.recipient_id][category] += sign * weight
+    return changes
+
+
+def bump_changes(recipient_ids, notification_type, amount=1):
+    """Changes for rows that gained `amount` unread items in place (collapsed group chat rows)."""
+    deltas = {category: amount for category in unread_categories(notification_type)}
+    return {recipient_id: dict(deltas) for recipient_id in recipient_ids}
+
+
+def clear_unread(recipient_id, queryset, action):
+    """
+    Runs `action()`, an update or delete that leaves `queryset` without unread
+    rows, and announces the unread weight it took away.
+    """
+    with transaction.atomic():
+        # Lock the unread rows first, so a concurrent clear waits and then counts
+        # only what is still unread instead of taking the same weight off twice
+        list(queryset.filter(is_read=False).select_for_update().values_list('id', flat=True))
+        removed = queryset.unread_counts()
+        result = action()
+        announce({recipient_id: {category: -count for category, count in removed.items()}})
+    return result
@@ -13,11 +13,13 @@ from .views import (
     MarkPostNotificationsAsRead,
     DeletePostNotifications,  
     UnreadPostNotificationsView,
+    NotificationCountsView,
 )
 
 urlpatterns = [
     path('', NotificationListView.as_view(), name='all-notifications'),
      path('unread/', UnreadNotificationsView.as_view(), name='unread-notifications'),
+    path('counts/', NotificationCountsView.as_view(), name='notification-counts'),
     path('mark-all-as-read/', MarkAllNotificationsAsRead.as_view(), name='mark_all_notifications_as_read'),
     path('clear-all/', ClearAllNotifications.as_view(), name='clear-all-notifications'),
 
@@ -1,29 +1,30 @@
+from django.db import transaction
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Notification
+from ITIHub.eager_loading import EagerLoadingMixin
+from . import bulk, counters, unread
+from .models import Notification, POST_TYPES
+from .pagination import NotificationCursorPagination
 from .serializers import NotificationSerializer
 
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
     notification_types = [] 
+    unread_only = False
 
     def get_queryset(self):
         queryset = Notification.objects.filter(recipient=self.request.user)
         if self.notification_types:
             queryset = queryset.filter(notification_type__in=self.notification_types)
+        if self.unread_only:
+            queryset = queryset.filter(is_read=False)
         return queryset.order_by('-created_at')
 
 class UnreadNotificationsView(NotificationListView):
-    serializer_class = NotificationSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        return Notification.objects.filter(
-            recipient=self.request.user,
-            is_read=False
-        ).order_by('-created_at')
+    unread_only = True
 
 
 class ChatNotificationsView(NotificationListView):
@@ -35,43 +36,43 @@ class GroupChatNotificationsView(NotificationListView):
 
 
 class UnreadChatNotificationsView(NotificationListView):
-    serializer_class = NotificationSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        return Notification.objects.filter(
-            recipient=self.request.user,
-            notification_type__in=["chat", "group_chat"], 
-            is_read=False
-        ).order_by('-created_at')
+    notification_types = ["chat", "group_chat"]
+    unread_only = True
 
 
 class PostNotificationsView(NotificationListView):
-    notification_types = ["new_post", "comment", "mention", "reaction"]
+    notification_types = POST_TYPES
 
 class UnreadPostNotificationsView(NotificationListView):
-    serializer_class = NotificationSerializer
+    notification_types = ["new_post", "comment", "mention"]
+    unread_only = True
+
+
+class NotificationCountsView(APIView):
+    """Unread badge counts (all / chat / post), read from the user's counter row."""
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return Notification.objects.filter(
-            recipient=self.request.user,
-            notification_type__in=["new_post", "comment", "mention"],  
-            is_read=False
-        ).order_by('-created_at')
+    def get(self, request):
+        return Response(counters.get_counts(request.user.id), status=status.HTTP_200_OK)
 
 
 class MarkNotificationAsRead(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def patch(self, request, notification_id):
-        notification = Notification.objects.filter(id=notification_id, recipient=request.user).first()
-        if not notification:
-            return Response({"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND)
-        
-        if not notification.is_read:
-            notification.is_read = True
-            notification.save()
+        # Locked so two concurrent requests cannot both take the row's weight off the counters
+        with transaction.atomic():
+            notification = (
+                Notification.objects.select_for_update().filter(id=notification_id, recipient=request.user).first()
+            )
+            if not notification:
+                return Response({"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND)
+
+            if not notification.is_read or notification.unread_count:
+                unread.announce(unread.notification_changes([notification], sign=-1))
+                notification.is_read = True
+                notification.unread_count = 0
+                notification.save(update_fields=["is_read", "unread_count", "updated_at"])
         return Response({"message": "Notification marked as read"}, status=status.HTTP_200_OK)
 
 
@@ -79,14 +80,15 @@ class MarkPostNotificationsAsRead(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def patch(self, request):
-        updated_count = Notification.objects.filter(
+        notifications = Notification.objects.filter(
             recipient=request.user,
-            notification_type__in=["new_post", "comment", "mention", "reaction"],
+            notification_type__in=POST_TYPES,
             is_read=False
-        ).update(is_read=True)
+        )
+        updated_count, chunks = bulk.run_in_chunks(request.user.id, notifications, bulk.mark_read)
 
         return Response(
-            {"message": f"{updated_count} post notifications marked as read"},
+            {"message": f"{updated_count} post notifications marked as read", "processed": updated_count, "chunks": chunks},
             status=status.HTTP_200_OK
         )
 
@@ -94,13 +96,14 @@ class DeletePostNotifications(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def delete(self, request):
-        deleted_count, _ = Notification.objects.filter(
+        notifications = Notification.objects.filter(
             recipient=request.user,
-            notification_type__in=["new_post", "comment", "mention", "reaction"]
-        ).delete()
+            notification_type__in=POST_TYPES
+        )
+        deleted_count, chunks = bulk.run_in_chunks(request.user.id, notifications, bulk.delete)
 
         return Response(
-            {"message": f"{deleted_count} post notifications deleted"},
+            {"message": f"{deleted_count} post notifications deleted", "processed": deleted_count, "chunks": chunks},
             status=status.HTTP_200_OK
         )
 
@@ -115,10 +118,11 @@ class MarkAllNotificationsAsRead(APIView):
         if notification_type:
             filters["notification_type"] = notification_type
 
-        updated_count = Notification.objects.filter(**filters).update(is_read=True)
+        notifications = Notification.objects.filter(**filters)
+        updated_count, chunks = bulk.run_in_chunks(request.user.id, notifications, bulk.mark_read)
 
         return Response(
-            {"message": f"{updated_count} notifications marked as read"},
+            {"message": f"{updated_count} notifications marked as read", "processed": updated_count, "chunks": chunks},
             status=status.HTTP_200_OK
         )
 
@@ -127,7 +131,8 @@ class DeleteNotification(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def delete(self, request, notification_id):
-        deleted_count, _ = Notification.objects.filter(id=notification_id, recipient=request.user).delete()
+        notifications = Notification.objects.filter(id=notification_id, recipient=request.user)
+        deleted_count, _ = unread.clear_unread(request.user.id, notifications, notifications.delete)
         if deleted_count == 0:
             return Response({"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND)
         return Response({"message": "Notification deleted"}, status=status.HTTP_200_OK)
@@ -143,8 +148,9 @@ class ClearAllNotifications(APIView):
         if notification_type:
             filters["notification_type"] = notification_type
 
-        deleted_count, _ = Notification.objects.filter(**filters).delete()
+        notifications = Notification.objects.filter(**filters)
+        deleted_count, chunks = bulk.run_in_chunks(request.user.id, notifications, bulk.delete)
         return Response(
-            {"message": f"{deleted_count} notifications deleted"},
+            {"message": f"{deleted_count} notifications deleted", "processed": deleted_count, "chunks": chunks},
             status=status.HTTP_200_OK
         )
@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+POST_CACHE_TIMEOUT = getattr(settings, "POST_CACHE_TIMEOUT", 60 * 60)
+FEED_PAGE_CACHE_TIMEOUT = getattr(settings, "FEED_PAGE_CACHE_TIMEOUT", 30)
+# Bump whenever the PostSerializer output changes shape so old entries are ignored.
+# Changes to a single post move `Post.version` instead, see `_post_key`.
+POST_CACHE_VERSION = 3
+
+FEED_GENERATION_KEY = "feed:generation"
+
+
+def _post_key(post):
+    return f"post:{post.id}:{post.version}"
+
+
+def get_posts(posts):
+    """Cached representations of `posts` at their loaded version, as {post_id: data}, in one round trip."""
+    keys = {_post_key(post): post.id for post in posts}
+    try:
+        found = cache.get_many(list(keys), version=POST_CACHE_VERSION)
+    except Exception:
+        logger.exception("Post cache read failed")
+        return {}
+    return {keys[key]: data for key, data in found.items()}
+
+
+def set_posts(representations):
+    """Caches {post: data}; each entry is keyed by the version the post was loaded at."""
+    if not representations:
+        return
+    try:
+        cache.set_many(
+            {_post_key(post): data for post, data in representations.items()},
+            timeout=POST_CACHE_TIMEOUT,
+            version=POST_CACHE_VERSION,
+        )
+    except Exception:
+        logger.exception("Post cache write failed")
+
+
+def feed_generation():
+    """Counter folded into every feed page key; bumping it drops all cached pages at once."""
+    try:
+        generation = cache.get(FEED_GENERATION_KEY)
+        if generation is None:
+            generation = int(time.time() * 1000)
+            cache.add(FEED_GENERATION_KEY, generation, timeout=None)
+        return generation
+    except Exception:
+        logger.exception("Feed generation read failed")
+        return None
+
+
+def bump_feed_generation():
+    try:
+        cache.incr(FEED_GENERATION_KEY)
+    except ValueError:
+        # Missing key: start a fresh generation that cannot collide with old pages
+        cache.set(FEED_GENERATION_KEY, int(time.time() * 1000), timeout=None)
+    except Exception:
+        logger.exception("Feed generation bump failed")
+
+
+def feed_page_key(url):
+    generation = feed_generation()
+    if generation is None:
+        return None
+    digest = hashlib.md5(url.encode("utf-8")).hexdigest()
+    return f"feed:{generation}:{digest}"
+
+
+def get_feed_page(key):
+    if key is None:
+        return None
+    try:
+        return cache.get(key)
+    except Exception:
+        logger.exception("Feed page cache read failed")
+        return None
+
+
+def set_feed_page(key, data):
+    if key is None:
+        return
+    try:
+        cache.set(key, data, timeout=FEED_PAGE_CACHE_TIMEOUT)
+    except Exception:
+        logger.exception("Feed page cache write failed")
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from posts.models import Post, Comment, Reaction
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the denormalized per-type reaction counters of posts and comments from the Reaction table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows written per bulk UPDATE.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = [Reaction.count_field(reaction) for reaction, _ in Reaction.REACTIONS]
+
+        with transaction.atomic():
+            for model, target in ((Post, 'post'), (Comment, 'comment')):
+                # One grouped query for every (target, type) pair
+                counts = {}
+                rows = (
+                    Reaction.objects.filter(**{f"{target}__isnull": False})
+                    .values_list(f"{target}_id", 'reaction_type')
+                    .annotate(total=Count('id'))
+                    .order_by()
+                )
+                for target_id, reaction_type, total in rows:
+                    counts.setdefault(target_id, {})[Reaction.count_field(reaction_type)] = total
+
+                resets = {field: 0 for field in fields}
+                if model is Post:
+                    # Moves every post off its cached representation
+                    resets['version'] = F('version') + 1
+                model.objects.update(**resets)
+                objs = [
+                    model(id=target_id, **{field: values.get(field, 0) for field in fields})
+                    for target_id, values in counts.items()
+                ]
+                model.objects.bulk_update(objs, fields, batch_size=batch_size)
+
+                self.stdout.write(f"Rebuilt reaction counters for {len(objs)} {model._meta.verbose_name_plural}.")
+
+        self.stdout.write(self.style.SUCCESS("Reaction counters rebuilt."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from users.models import User
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized following timelines from users' own posts and the Follow table."
+
+    def handle(self, *args, **options):
+        # One transaction per user: other timelines stay readable while the rebuild runs
+        total = 0
+        for user_id in User.objects.values_list('id', flat=True).iterator():
+            timeline.rebuild_timeline(user_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt timelines for {total} users."))
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_reaction_counters(apps, schema_editor):
+    Reaction = apps.get_model('posts', 'Reaction')
+    for model_name, target in (('Post', 'post'), ('Comment', 'comment')):
+        model = apps.get_model('posts', model_name)
+        rows = (
+            Reaction.objects.filter(**{f"{target}__isnull": False})
+            .values_list(f"{target}_id", 'reaction_type')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for target_id, reaction_type, total in rows:
+            model.objects.filter(id=target_id).update(**{f"{reaction_type.lower()}_count": total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='celebrate_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='funny_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='insightful_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='love_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='support_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='celebrate_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='funny_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='insightful_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='love_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='support_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_reaction_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_timelineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_on', 'id'], name='comment_post_idx'),
+        ),
+    ]
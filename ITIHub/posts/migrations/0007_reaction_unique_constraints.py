@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def remove_duplicate_reactions(apps, schema_editor):
+    """Keep the newest reaction per (user, post, comment) so the constraints can be created."""
+    Reaction = apps.get_model('posts', 'Reaction')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    duplicates = (
+        Reaction.objects.values('user_id', 'post_id', 'comment_id')
+        .annotate(total=Count('id'), keep=Max('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in duplicates:
+        extra = Reaction.objects.filter(
+            user_id=group['user_id'], post_id=group['post_id'], comment_id=group['comment_id']
+        ).exclude(id=group['keep'])
+        for reaction in extra:
+            field = f"{reaction.reaction_type.lower()}_count"
+            if reaction.post_id:
+                Post.objects.filter(id=reaction.post_id).update(**{field: F(field) - 1})
+            elif reaction.comment_id:
+                Comment.objects.filter(id=reaction.comment_id).update(**{field: F(field) - 1})
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_comment_post_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_reactions, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='reaction',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='reaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('comment__isnull', True)), fields=('user', 'post'), name='unique_post_reaction'),
+        ),
+        migrations.AddConstraint(
+            model_name='reaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('post__isnull', True)), fields=('user', 'comment'), name='unique_comment_reaction'),
+        ),
+    ]
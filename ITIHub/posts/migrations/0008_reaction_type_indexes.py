@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 08:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_reaction_unique_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['post', 'reaction_type', 'timestamp'], name='reaction_post_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['comment', 'reaction_type', 'timestamp'], name='reaction_comment_type_idx'),
+        ),
+    ]
@@ -1,37 +1,102 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.dispatch import Signal
 from django.utils import timezone
 from users.models import User
 
+# Sent by `Reaction.upsert` when an existing reaction switches type in place
+# (no post_save/post_delete fires on that path). Args: instance, previous_type.
+reaction_changed = Signal()
+
 class Attachment(models.Model):
     image = models.ImageField(upload_to="attachments/", null=True, blank=True)
     video = models.FileField(upload_to="attachments/", null=True, blank=True)
     uploaded_on = models.DateTimeField(default=timezone.now)
 
-class Post(models.Model):
+class ReactionCounters(models.Model):
+    """
+    Denormalized per-type reaction counts shared by posts and comments.
+    - Kept up to date by `Reaction.adjust_counters` (AddReaction / RemoveReaction).
+    - Rebuilt from the `Reaction` table with `manage.py rebuild_reaction_counts`.
+    """
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    love_count = models.PositiveIntegerField(default=0, editable=False)
+    celebrate_count = models.PositiveIntegerField(default=0, editable=False)
+    funny_count = models.PositiveIntegerField(default=0, editable=False)
+    insightful_count = models.PositiveIntegerField(default=0, editable=False)
+    support_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def reaction_counts(self):
+        return {reaction: getattr(self, Reaction.count_field(reaction)) for reaction, _ in Reaction.REACTIONS}
+
+class Post(ReactionCounters):
     author = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     body = models.TextField()
     created_on = models.DateTimeField(default=timezone.now)
     attachments = models.ManyToManyField(Attachment, blank=True)
+    # Moved forward in the same transaction as every change to the post; part of
+    # the cache key, so a representation written back late lands on a dead key
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the feed, globally and per author
+            models.Index(fields=['created_on', 'id'], name='post_feed_idx'),
+            models.Index(fields=['author', 'created_on', 'id'], name='post_author_feed_idx'),
+        ]
 
     def _str_(self):
         return f"Post by {self.author} on {self.created_on}"
 
-    def reaction_counts(self):
-        return {reaction: self.reaction_set.filter(reaction_type=reaction).count() for reaction, _ in Reaction.REACTIONS}
+    def save(self, *args, **kwargs):
+        # Bumped in the UPDATE itself, so saving a stale instance cannot move the
+        # version back onto a key that may still hold an old representation
+        if not self._state.adding:
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        if not isinstance(self.version, int):
+            self.refresh_from_db(fields=['version'])
+
+class TimelineEntry(models.Model):
+    """
+    Materialized "following" timeline.
+    - One row per (owner, post), written when the post is fanned out to the
+      author's followers, so reading a timeline is a range scan on
+      (owner, created_on, post).
+    - `created_on` is copied from the post to keep that scan index-only.
+    """
+    owner = models.ForeignKey(User, related_name='timeline_entries', on_delete=models.CASCADE)
+    post = models.ForeignKey('Post', related_name='timeline_entries', on_delete=models.CASCADE)
+    created_on = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', 'created_on', 'post'], name='timeline_owner_idx'),
+        ]
 
-class Comment(models.Model):
+class Comment(ReactionCounters):
     author = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     comment = models.TextField()
     created_on = models.DateTimeField(auto_now_add=True)
     attachments = models.ManyToManyField(Attachment, blank=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a post's comments and the feed's comment preview
+            models.Index(fields=['post', 'created_on', 'id'], name='comment_post_idx'),
+        ]
+
     def _str_(self):
         return f"Comment by {self.author} on {self.post}"
 
-    def reaction_counts(self):
-        return {reaction: self.reaction_set.filter(reaction_type=reaction).count() for reaction, _ in Reaction.REACTIONS}
-
 class Reaction(models.Model):
     # REACTIONS = [
     #     ("like", "Like"),
@@ -56,8 +121,95 @@ class Reaction(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('user', 'post', 'comment')
+        # One reaction per user and target. Two partial constraints because NULLs
+        # never compare equal, so ('user', 'post', 'comment') did not enforce it.
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], condition=Q(comment__isnull=True), name='unique_post_reaction'),
+            models.UniqueConstraint(fields=['user', 'comment'], condition=Q(post__isnull=True), name='unique_comment_reaction'),
+        ]
+        indexes = [
+            # Per-type reactor lists, newest first
+            models.Index(fields=['post', 'reaction_type', 'timestamp'], name='reaction_post_type_idx'),
+            models.Index(fields=['comment', 'reaction_type', 'timestamp'], name='reaction_comment_type_idx'),
+        ]
 
     def _str_(self):
         target = self.post if self.post else self.comment
-        return f"{self.user} reacted {self.reaction_type} on {target}"
\ No newline at end of file
+        return f"{self.user} reacted {self.reaction_type} on {target}"
+
+    @staticmethod
+    def count_field(reaction_type):
+        """Name of the counter column holding the count of `reaction_type`."""
+        return f"{reaction_type.lower()}_count"
+
+    @classmethod
+    def adjust_counters(cls, post_id=None, comment_id=None, increment=None, decrement=None):
+        """
+        Atomically moves the counters of a post or comment in a single UPDATE.
+        `increment` / `decrement` are reaction types (either may be None).
+        """
+        if increment == decrement:
+            return
+        updates = {}
+        if increment:
+            field = cls.count_field(increment)
+            updates[field] = F(field) + 1
+        if decrement:
+            field = cls.count_field(decrement)
+            updates[field] = Greatest(F(field) - 1, 0)
+
+        if post_id:
+            Post.objects.filter(id=post_id).update(**updates)
+        elif comment_id:
+            Comment.objects.filter(id=comment_id).update(**updates)
+
+    @classmethod
+    def upsert(cls, user, reaction_type, post_id=None, comment_id=None):
+        """
+        Sets `user`'s reaction on a post or comment in one transaction.
+        - No row yet: INSERT (post_save creates the notification).
+        - Different type: UPDATE the row in place and send `reaction_changed`.
+        - Same type: nothing is written.
+        Counters are adjusted in the same transaction. Returns (reaction_id, previous_type).
+        """
+        lookup = {'user': user, 'post_id': post_id, 'comment_id': comment_id}
+        with transaction.atomic():
+            existing = cls.objects.select_for_update().filter(**lookup).values_list('id', 'reaction_type').first()
+            if existing is None:
+                try:
+                    with transaction.atomic():
+                        reaction = cls.objects.create(reaction_type=reaction_type, **lookup)
+                except IntegrityError:
+                    # A concurrent request inserted first; switch to the update path
+                    existing = cls.objects.select_for_update().filter(**lookup).values_list('id', 'reaction_type').get()
+                else:
+                    cls.adjust_counters(post_id=post_id, comment_id=comment_id, increment=reaction_type)
+                    return reaction.id, None
+
+            reaction_id, previous_type = existing
+            if previous_type != reaction_type:
+                cls.objects.filter(id=reaction_id).update(reaction_type=reaction_type, timestamp=timezone.now())
+                cls.adjust_counters(post_id=post_id, comment_id=comment_id, increment=reaction_type, decrement=previous_type)
+                reaction = cls(id=reaction_id, reaction_type=reaction_type, **lookup)
+                reaction_changed.send(sender=cls, instance=reaction, previous_type=previous_type)
+            return reaction_id, previous_type
+
+    @classmethod
+    def remove(cls, user, post_id=None, comment_id=None):
+        """
+        Deletes `user`'s reaction on a post or comment in one transaction.
+        The row is locked first and the counter only moves if this call actually
+        deleted it, so concurrent removes cannot decrement twice.
+        Returns the removed reaction type, or None.
+        """
+        lookup = {'user': user, 'post_id': post_id, 'comment_id': comment_id}
+        with transaction.atomic():
+            existing = cls.objects.select_for_update().filter(**lookup).values_list('id', 'reaction_type').first()
+            if existing is None:
+                return None
+            reaction_id, reaction_type = existing
+            deleted, _ = cls.objects.filter(id=reaction_id).delete()
+            if not deleted:
+                return None
+            cls.adjust_counters(post_id=post_id, comment_id=comment_id, decrement=reaction_type)
+            return reaction_type
@@ -0,0 +1,25 @@
+from ITIHub.pagination import KeysetCursorPagination
+
+
+class PostCursorPagination(KeysetCursorPagination):
+    """Feed pages ordered newest first, backed by the `(created_on, id)` indexes on Post."""
+    ordering = ('-created_on', '-id')
+    page_size = 20
+
+
+class TimelineCursorPagination(KeysetCursorPagination):
+    """Following timeline pages, read straight off the `(owner, created_on, post)` index."""
+    ordering = ('-created_on', '-post_id')
+    page_size = 20
+
+
+class CommentCursorPagination(KeysetCursorPagination):
+    """A post's comments newest first, backed by the `(post, created_on, id)` index."""
+    ordering = ('-created_on', '-id')
+    page_size = 20
+
+
+class ReactionCursorPagination(KeysetCursorPagination):
+    """Reactors of a post or comment, newest first."""
+    ordering = ('-timestamp', '-id')
+    page_size = 50
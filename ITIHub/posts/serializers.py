@@ -1,23 +1,89 @@
 from rest_framework import serializers
+from ITIHub.eager_loading import EagerLoadingSerializerMixin
 from .models import Post, Comment, Attachment, Reaction
+from . import cache as post_cache
 
 class AttachmentSerializer(serializers.ModelSerializer):
+    # Rendered as relative URLs when there is no request in the context
+    file_fields = ('image', 'video')
+
     class Meta:
         model = Attachment
         fields = '__all__'
 
-class PostSerializer(serializers.ModelSerializer):
+    @classmethod
+    def absolute_urls(cls, attachments, request):
+        """Copies of serialized `attachments` with their file URLs made absolute for `request`."""
+        return [
+            {
+                key: request.build_absolute_uri(value) if key in cls.file_fields and value else value
+                for key, value in attachment.items()
+            }
+            for attachment in attachments
+        ]
+
+class PostListSerializer(serializers.ListSerializer):
+    """Serializes a page of posts, reading their cached representations in one round trip."""
+
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        cached = post_cache.get_posts(posts)
+        missing = {}
+        results = []
+        for post in posts:
+            base = cached.get(post.id)
+            if base is None:
+                base = missing[post] = self.child.base_representation(post)
+            results.append(self.child.add_context_fields(post, dict(base)))
+        post_cache.set_posts(missing)
+        return results
+
+class PostSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
     author = serializers.StringRelatedField()
     reaction_counts = serializers.SerializerMethodField()
     attachments = AttachmentSerializer(many=True, required=False)
 
+    select_related_fields = ('author',)
+    prefetch_related_fields = ('attachments',)
+
     class Meta:
         model = Post
         fields = ["id", "author", "body", "created_on", "reaction_counts", "attachments"]
+        list_serializer_class = PostListSerializer
 
     def get_reaction_counts(self, obj):
         return obj.reaction_counts()
 
+    def base_representation(self, instance):
+        """
+        The request-independent part of the output; this is what gets cached.
+        Rendered without the request so attachment URLs stay relative and the
+        entry can be shared across hosts; `add_context_fields` makes them absolute.
+        """
+        if 'request' not in self.context:
+            return super().to_representation(instance)
+        if not hasattr(self, '_base_serializer'):
+            context = {key: value for key, value in self.context.items() if key != 'request'}
+            self._base_serializer = type(self)(context=context)
+        return self._base_serializer.base_representation(instance)
+
+    def add_context_fields(self, instance, data):
+        request = self.context.get('request')
+        if request is not None:
+            data['attachments'] = AttachmentSerializer.absolute_urls(data['attachments'], request)
+        # Filled by CommentPreviewMixin when the client asks for ?comments_preview=N
+        previews = self.context.get('comment_previews')
+        if previews is not None:
+            data['latest_comments'] = CommentSerializer(previews.get(instance.id, []), many=True, context=self.context).data
+        return data
+
+    def to_representation(self, instance):
+        base = post_cache.get_posts([instance]).get(instance.id)
+        if base is None:
+            base = self.base_representation(instance)
+            post_cache.set_posts({instance: base})
+        return self.add_context_fields(instance, dict(base))
+
     def create(self, validated_data):
         attachments_data = self.context['request'].FILES.getlist('attachments')
         post = Post.objects.create(**validated_data)
@@ -28,11 +94,14 @@ class PostSerializer(serializers.ModelSerializer):
         
         return post
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
     author = serializers.StringRelatedField()
     reaction_counts = serializers.SerializerMethodField()
     attachments = AttachmentSerializer(many=True, required=False)
 
+    select_related_fields = ('author',)
+    prefetch_related_fields = ('attachments',)
+
     class Meta:
         model = Comment
         fields = ["id", "post", "author", "comment", "created_on", "reaction_counts", "attachments"]
@@ -58,6 +127,12 @@ class ReactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Reaction
         fields = ['id', 'user', 'reaction_type', 'post', 'comment', 'timestamp']
+class ReactorSerializer(serializers.Serializer):
+    """One row of a reactor list, built from `.values()` so only the username is read from users."""
+    id = serializers.IntegerField()
+    user = serializers.CharField(source='username')
+    reaction_type = serializers.CharField()
+    timestamp = serializers.DateTimeField()
 ## 
 class EditCommentSerializer(serializers.ModelSerializer):
     class Meta:
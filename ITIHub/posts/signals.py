@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from users.models import Follow
+from .models import Post, Comment, Reaction, reaction_changed
+from . import timeline
+from . import cache as post_cache
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill_follow(instance.follower_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline_on_unfollow(sender, instance, **kwargs):
+    timeline.remove_follow(instance.follower_id, instance.following_id)
+
+
+# ---------------------------------------------------------------- cache invalidation
+# Cached posts are keyed by `Post.version`, which moves in the writer's transaction,
+# so a reader that loaded the old row can only write back to a key nobody reads.
+# Feed pages are dropped after commit so a concurrent reader cannot re-cache them.
+
+def bump_post_version(post_id):
+    Post.objects.filter(id=post_id).update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_feed_on_post(sender, instance, **kwargs):
+    # Post.save moves the version itself
+    transaction.on_commit(post_cache.bump_feed_generation)
+
+
+@receiver(m2m_changed, sender=Post.attachments.through)
+def invalidate_cached_post_attachments(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Post):
+        bump_post_version(instance.id)
+        transaction.on_commit(post_cache.bump_feed_generation)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_feed_on_comment(sender, instance, **kwargs):
+    # Comments only show up in feed previews, not in the cached post itself
+    transaction.on_commit(post_cache.bump_feed_generation)
+
+
+@receiver(post_save, sender=Reaction)
+@receiver(post_delete, sender=Reaction)
+@receiver(reaction_changed, sender=Reaction)
+def invalidate_cached_post_on_reaction(sender, instance, **kwargs):
+    if instance.post_id:
+        bump_post_version(instance.post_id)
+    transaction.on_commit(post_cache.bump_feed_generation)
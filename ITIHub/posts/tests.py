@@ -0,0 +1,337 @@
+import base64
+import json
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from notifications.models import Notification
+from users.models import Follow, User
+from .models import Post, Comment, Attachment, Reaction, TimelineEntry
+from . import cache as post_cache
+from .serializers import PostSerializer
+from . import timeline
+
+
+class PostListQueryCountTests(APITestCase):
+    """The post and comment list endpoints must not issue per-row queries."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(author=self.author, body=f"post {i}")
+            post.attachments.add(Attachment.objects.create())
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_feed_query_count_is_constant_in_page_size(self):
+        self.create_posts(25)
+
+        small, small_data = self.count_queries("/api/posts/?page_size=5")
+        large, large_data = self.count_queries("/api/posts/?page_size=20")
+
+        self.assertEqual(len(small_data["results"]), 5)
+        self.assertEqual(len(large_data["results"]), 20)
+        self.assertEqual(small, large)
+
+    def test_tampered_cursor_is_not_found(self):
+        self.create_posts(3)
+        for position in (["garbage", 1], [{"a": 1}, 1], ["2024-01-01T00:00:00+00:00", "x"], [None, 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps({"p": position}).encode()).decode()
+            response = self.client.get(f"/api/posts/?cursor={cursor}")
+            self.assertEqual(response.status_code, 404, position)
+
+    def test_following_feed_query_count_is_constant_in_page_size(self):
+        Follow.objects.create(follower=self.user, following=self.author)
+        self.create_posts(25)
+
+        small, small_data = self.count_queries("/api/posts/following/?page_size=5")
+        large, large_data = self.count_queries("/api/posts/following/?page_size=20")
+
+        self.assertEqual(len(small_data["results"]), 5)
+        self.assertEqual(len(large_data["results"]), 20)
+        self.assertEqual(small, large)
+
+    def test_comment_list_query_count_is_constant_in_comment_count(self):
+        post = Post.objects.create(author=self.author, body="post")
+        other = Post.objects.create(author=self.author, body="other")
+        for i in range(3):
+            Comment.objects.create(author=self.author, post=post, comment=f"comment {i}")
+        for i in range(15):
+            Comment.objects.create(author=self.author, post=other, comment=f"comment {i}")
+
+        few, _ = self.count_queries(f"/api/posts/{post.id}/comments/")
+        many, _ = self.count_queries(f"/api/posts/{other.id}/comments/")
+
+        self.assertEqual(few, many)
+
+    def test_comment_preview_is_one_query_for_the_page(self):
+        self.create_posts(10)
+        for post in Post.objects.all():
+            for i in range(4):
+                Comment.objects.create(author=self.author, post=post, comment=f"comment {i}")
+
+        small, small_data = self.count_queries("/api/posts/?page_size=2&comments_preview=3")
+        large, large_data = self.count_queries("/api/posts/?page_size=10&comments_preview=3")
+
+        self.assertEqual(small, large)
+        latest = large_data["results"][0]["latest_comments"]
+        self.assertEqual([c["comment"] for c in latest], ["comment 3", "comment 2", "comment 1"])
+
+
+class PostCacheTests(APITestCase):
+    """Cached posts and feed pages are dropped when a post, comment or reaction changes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+        self.post = Post.objects.create(author=self.user, body="post")
+        cache.clear()
+
+    def test_cached_feed_page_is_served_without_queries(self):
+        self.client.get("/api/posts/")
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/posts/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_reaction_invalidates_cached_post_and_feed(self):
+        self.client.get("/api/posts/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/posts/{self.post.id}/react/Like/")
+
+        feed = self.client.get("/api/posts/").json()
+        detail = self.client.get(f"/api/posts/{self.post.id}/").json()
+
+        self.assertEqual(feed["results"][0]["reaction_counts"]["Like"], 1)
+        self.assertEqual(detail["reaction_counts"]["Like"], 1)
+
+    def test_late_write_back_of_a_stale_post_is_never_served(self):
+        # A reader loads the row, the reaction commits, then the reader caches what it loaded
+        stale = Post.objects.get(id=self.post.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/posts/{self.post.id}/react/Like/")
+        PostSerializer(stale).data
+
+        detail = self.client.get(f"/api/posts/{self.post.id}/").json()
+        feed = self.client.get("/api/posts/").json()
+
+        self.assertEqual(detail["reaction_counts"]["Like"], 1)
+        self.assertEqual(feed["results"][0]["reaction_counts"]["Like"], 1)
+
+    def test_saving_a_stale_instance_still_moves_the_version(self):
+        stale = Post.objects.get(id=self.post.id)
+        Reaction.upsert(self.user, "Like", post_id=self.post.id)
+        current = Post.objects.get(id=self.post.id).version
+
+        stale.body = "edited"
+        stale.save(update_fields=["body"])
+
+        self.assertEqual(stale.version, current + 1)
+        self.assertEqual(Post.objects.get(id=self.post.id).version, current + 1)
+
+    @override_settings(ALLOWED_HOSTS=["one.example.com", "two.example.com"])
+    def test_cached_post_builds_attachment_urls_for_each_request(self):
+        self.post.attachments.add(Attachment.objects.create(image="attachments/photo.png"))
+
+        first = self.client.get(f"/api/posts/{self.post.id}/", HTTP_HOST="one.example.com").json()
+        second = self.client.get("/api/posts/", HTTP_HOST="two.example.com").json()
+
+        self.assertEqual(first["attachments"][0]["image"], "http://one.example.com/media/attachments/photo.png")
+        self.assertEqual(
+            second["results"][0]["attachments"][0]["image"], "http://two.example.com/media/attachments/photo.png"
+        )
+        self.post.refresh_from_db()
+        cached = post_cache.get_posts([self.post])[self.post.id]
+        self.assertEqual(cached["attachments"][0]["image"], "/media/attachments/photo.png")
+
+
+class TimelineTests(APITestCase):
+    """Fan-out on write, the heavy-author fallback, and follow backfill / unfollow pruning."""
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="pass")
+        self.client.force_authenticate(self.reader)
+        cache.clear()
+
+    def timeline_post_ids(self, user):
+        return set(TimelineEntry.objects.filter(owner=user).values_list("post_id", flat=True))
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        post = Post.objects.create(author=self.author, body="post")
+
+        self.assertEqual(self.timeline_post_ids(self.reader), {post.id})
+        self.assertEqual(self.timeline_post_ids(self.author), {post.id})
+
+    def test_heavy_author_is_pulled_when_the_feed_is_read(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        with mock.patch.object(timeline, "FANOUT_MAX_FOLLOWERS", 0):
+            post = Post.objects.create(author=self.author, body="post")
+            self.assertEqual(self.timeline_post_ids(self.reader), set())
+
+            response = self.client.get("/api/posts/following/")
+
+        self.assertEqual([p["id"] for p in response.json()["results"]], [post.id])
+
+    def test_heavy_author_lookup_does_not_count_followers(self):
+        for i in range(5):
+            follower = User.objects.create_user(username=f"f{i}", email=f"f{i}@example.com", password="pass")
+            Follow.objects.create(follower=follower, following=self.author)
+        Follow.objects.create(follower=self.reader, following=self.author)
+
+        with mock.patch.object(timeline, "FANOUT_MAX_FOLLOWERS", 3):
+            with CaptureQueriesContext(connection) as context:
+                author_ids = timeline.heavy_author_ids(self.reader)
+
+        self.assertEqual(author_ids, [self.author.id])
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn("COUNT(", context.captured_queries[0]["sql"].upper())
+
+    def test_follower_count_follows_the_follow_table(self):
+        follow = Follow.objects.create(follower=self.reader, following=self.author)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.follower_count, 1)
+
+        follow.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.follower_count, 0)
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [Post.objects.create(author=self.author, body=f"post {i}") for i in range(3)]
+        own = Post.objects.create(author=self.reader, body="own")
+
+        follow = Follow.objects.create(follower=self.reader, following=self.author)
+        self.assertEqual(self.timeline_post_ids(self.reader), {own.id} | {p.id for p in posts})
+
+        follow.delete()
+        self.assertEqual(self.timeline_post_ids(self.reader), {own.id})
+
+    def test_rebuild_keeps_own_posts_and_followed_authors(self):
+        posts = [Post.objects.create(author=self.author, body=f"post {i}") for i in range(2)]
+        own = Post.objects.create(author=self.reader, body="own")
+        Follow.objects.create(follower=self.reader, following=self.author)
+        TimelineEntry.objects.all().delete()
+
+        call_command("rebuild_timelines", stdout=StringIO())
+
+        self.assertEqual(self.timeline_post_ids(self.reader), {own.id} | {p.id for p in posts})
+        self.assertEqual(self.timeline_post_ids(self.author), {p.id for p in posts})
+
+
+class ReactionCounterTests(APITestCase):
+    """Counter columns move with reactions and can be rebuilt from the Reaction table."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+        self.post = Post.objects.create(author=self.other, body="post")
+        self.comment = Comment.objects.create(author=self.other, post=self.post, comment="comment")
+
+    def counts(self, target):
+        target.refresh_from_db()
+        return {reaction: count for reaction, count in target.reaction_counts().items() if count}
+
+    def test_reaction_counts_follow_add_change_and_remove(self):
+        self.assertEqual(self.counts(self.post), {})
+        self.client.post(f"/api/posts/{self.post.id}/react/Like/")
+        Reaction.upsert(self.other, "Love", post_id=self.post.id)
+        self.assertEqual(self.counts(self.post), {"Like": 1, "Love": 1})
+        self.assertEqual(set(self.post.reaction_counts()), {reaction for reaction, _ in Reaction.REACTIONS})
+
+        self.client.post(f"/api/posts/{self.post.id}/react/Love/")
+        self.assertEqual(self.counts(self.post), {"Love": 2})
+
+        self.client.post(f"/api/posts/{self.post.id}/react/remove/")
+        self.assertEqual(self.counts(self.post), {"Love": 1})
+
+    def test_repeated_remove_decrements_once(self):
+        Reaction.upsert(self.user, "Like", post_id=self.post.id)
+        Reaction.upsert(self.other, "Like", post_id=self.post.id)
+
+        self.assertEqual(Reaction.remove(self.user, post_id=self.post.id), "Like")
+        self.assertIsNone(Reaction.remove(self.user, post_id=self.post.id))
+        self.client.post(f"/api/posts/{self.post.id}/react/remove/")
+
+        self.assertEqual(self.counts(self.post), {"Like": 1})
+
+    def test_rebuild_reaction_counts_repairs_drift(self):
+        Reaction.upsert(self.user, "Like", post_id=self.post.id)
+        Reaction.upsert(self.other, "Insightful", post_id=self.post.id)
+        Reaction.upsert(self.user, "Support", comment_id=self.comment.id)
+        Post.objects.filter(id=self.post.id).update(like_count=7, love_count=3, insightful_count=0)
+        Comment.objects.filter(id=self.comment.id).update(support_count=0, celebrate_count=2)
+
+        call_command("rebuild_reaction_counts", batch_size=1, stdout=StringIO())
+
+        self.assertEqual(self.counts(self.post), {"Like": 1, "Insightful": 1})
+        self.assertEqual(self.counts(self.comment), {"Support": 1})
+
+
+class ConcurrentReactionTests(TransactionTestCase):
+    """Parallel reaction toggles must leave one row per user and exact counters."""
+
+    def test_parallel_reaction_toggles(self):
+        author = User.objects.create_user(username="author", email="author@example.com", password="pass")
+        users = [
+            User.objects.create_user(username=f"user{i}", email=f"user{i}@example.com", password="pass")
+            for i in range(5)
+        ]
+        post = Post.objects.create(author=author, body="popular post")
+        reaction_types = ["Like", "Love", "Celebrate"]
+        # Two clients per user so the same (user, post) pair races with itself
+        workers = [user for user in users for _ in range(2)]
+        barrier = threading.Barrier(len(workers))
+        errors = []
+
+        def toggle(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                for i in range(10):
+                    response = client.post(f"/api/posts/{post.id}/react/{reaction_types[i % 3]}/")
+                    if response.status_code != 201:
+                        errors.append(response.status_code)
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=toggle, args=(user,)) for user in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        reactions = Reaction.objects.filter(post=post)
+        self.assertEqual(reactions.count(), len(users))
+
+        post.refresh_from_db()
+        actual = dict(reactions.values_list("reaction_type").annotate(total=Count("id")))
+        for reaction_type, count in post.reaction_counts().items():
+            self.assertEqual(count, actual.get(reaction_type, 0))
+
+        # All reactions on the post coalesce into one row counting every reactor once
+        notification = Notification.objects.get(notification_type="reaction", recipient=author)
+        self.assertEqual(notification.actor_count, len(users))
+        self.assertEqual(notification.reaction_type, "Like")
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.db import transaction
+
+from users.models import Follow, User
+from .models import Post, TimelineEntry
+
+# Authors with more followers than this are not fanned out on write;
+# their posts are pulled into the reader's timeline when it is read.
+FANOUT_MAX_FOLLOWERS = getattr(settings, "TIMELINE_FANOUT_MAX_FOLLOWERS", 1000)
+# Number of recent posts copied when following someone / pulling heavy authors
+BACKFILL_SIZE = getattr(settings, "TIMELINE_BACKFILL_SIZE", 50)
+BATCH_SIZE = 500
+
+
+def _write_entries(owner_ids, posts):
+    entries = [
+        TimelineEntry(owner_id=owner_id, post_id=post.id, created_on=post.created_on)
+        for owner_id in owner_ids
+        for post in posts
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Fan-out-on-write: push a new post into the timelines of its author's followers."""
+    if not post.author_id:
+        return
+    follower_count = User.objects.filter(id=post.author_id).values_list('follower_count', flat=True).first()
+    follower_ids = []
+    # Too many followers: only the author's own timeline gets the row,
+    # followers pick the post up in `pull_heavy_authors`.
+    if follower_count and follower_count <= FANOUT_MAX_FOLLOWERS:
+        follower_ids = list(Follow.objects.filter(following_id=post.author_id).values_list('follower_id', flat=True))
+    _write_entries(follower_ids + [post.author_id], [post])
+
+
+def heavy_author_ids(user):
+    """Authors followed by `user` whose posts are fanned out on read.
+
+    Reads the denormalized `User.follower_count`, so the cost does not grow
+    with the number of followers those authors have.
+    """
+    return list(
+        Follow.objects.filter(follower=user, following__follower_count__gt=FANOUT_MAX_FOLLOWERS)
+        .values_list('following_id', flat=True)
+    )
+
+
+def pull_heavy_authors(user):
+    """Fan-out-on-read: copy recent posts of heavily followed authors into `user`'s timeline."""
+    author_ids = heavy_author_ids(user)
+    if not author_ids:
+        return
+    posts = list(Post.objects.filter(author_id__in=author_ids).order_by('-created_on', '-id')[:BACKFILL_SIZE])
+    _write_entries([user.id], posts)
+
+
+def backfill_follow(follower_id, following_id):
+    """Copy the recent posts of a newly followed author into the follower's timeline."""
+    posts = list(Post.objects.filter(author_id=following_id).order_by('-created_on', '-id')[:BACKFILL_SIZE])
+    _write_entries([follower_id], posts)
+
+
+def remove_follow(follower_id, following_id):
+    """Drop an unfollowed author's posts from the follower's timeline."""
+    TimelineEntry.objects.filter(owner_id=follower_id, post__author_id=following_id).delete()
+
+
+def rebuild_timeline(user_id):
+    """
+    Rebuilds one user's timeline from their own posts and the people they follow.
+    Runs in one transaction, so readers see the old timeline until the new one commits.
+    """
+    with transaction.atomic():
+        TimelineEntry.objects.filter(owner_id=user_id).delete()
+        backfill_follow(user_id, user_id)
+        for following_id in Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True):
+            backfill_follow(user_id, following_id)
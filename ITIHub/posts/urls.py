@@ -1,10 +1,11 @@
 
 from django.urls import path
-from .views import (PostListCreateView, PostDetailView, CommentCreateView,
-                    CommentDetailView, AddReaction, RemoveReaction , ListCommentsView , PostReactionsView , CommentEditView , CommentDeleteView ,CommentReactionsView) 
+from .views import (PostListCreateView, FollowingFeedView, PostDetailView, CommentCreateView,
+                    CommentDetailView, AddReaction, RemoveReaction , ReactionStateView , ListCommentsView , PostReactionsView , CommentEditView , CommentDeleteView ,CommentReactionsView) 
 
 urlpatterns = [
     path('', PostListCreateView.as_view(), name='post-list-create'),
+    path('following/', FollowingFeedView.as_view(), name='post-following-feed'),
     path('<int:pk>/', PostDetailView.as_view(), name='post-detail'),  # Use post_id
     path('<int:post_id>/comment/', CommentCreateView.as_view(), name='comment-create'),  # Use post_id
     # path('comment/<int:pk>/', CommentDetailView.as_view(), name='comment-detail'),
@@ -14,6 +15,7 @@ urlpatterns = [
     path('<int:post_id>/react/<str:reaction_type>/', AddReaction.as_view(), name='post-react'),
     path('comment/<int:comment_id>/react/<str:reaction_type>/', AddReaction.as_view(), name='comment-react'),
     path('<int:post_id>/reactions/', PostReactionsView.as_view(), name='post-reactions'),
+    path('reactions/state/', ReactionStateView.as_view(), name='reaction-state'),
     path('comment/edit/<int:post_id>/<int:comment_id>/', CommentEditView.as_view(), name='comment_edit'),
     path('comment/delete/<int:post_id>/<int:comment_id>/', CommentDeleteView.as_view(), name='comment_delete'),
     path('comment/<int:comment_id>/reactions/', CommentReactionsView.as_view(), name='comment-reactions'),
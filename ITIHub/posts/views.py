@@ -4,9 +4,15 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from .models import Post, Comment, Reaction
-from .serializers import PostSerializer, CommentSerializer, ReactionSerializer , EditCommentSerializer, DeleteCommentSerializer
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from .models import Post, Comment, Reaction, TimelineEntry
+from .pagination import PostCursorPagination, TimelineCursorPagination, CommentCursorPagination, ReactionCursorPagination
+from . import timeline
+from . import cache as post_cache
+from .serializers import PostSerializer, CommentSerializer, ReactorSerializer, EditCommentSerializer, DeleteCommentSerializer
 from users.decorators import student_or_supervisor_required
+from ITIHub.eager_loading import EagerLoadingMixin
 from rest_framework.views import APIView
 from django.utils.decorators import method_decorator
 from users.permissions import IsStudentOrSupervisor
@@ -17,22 +23,101 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
 
-class PostListCreateView(generics.ListCreateAPIView):
+class CommentPreviewMixin:
+    """
+    `?comments_preview=N` embeds the latest N comments of every post on the page
+    as `latest_comments`, fetched with one windowed query for the whole page.
+    """
+    comments_preview_query_param = 'comments_preview'
+    max_comments_preview = 5
+
+    def get_comments_preview_size(self):
+        try:
+            size = int(self.request.query_params.get(self.comments_preview_query_param, 0))
+        except ValueError:
+            return 0
+        return max(0, min(size, self.max_comments_preview))
+
+    def get_comment_previews(self, posts, size):
+        post_ids = [post.id for post in posts]
+        comments = Comment.objects.filter(post_id__in=post_ids).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('post_id'),
+                order_by=(F('created_on').desc(), F('id').desc()),
+            )
+        ).filter(row_number__lte=size).order_by('post_id', '-created_on', '-id')
+        comments = CommentSerializer.setup_eager_loading(comments)
+
+        previews = {post_id: [] for post_id in post_ids}
+        for comment in comments:
+            previews[comment.post_id].append(comment)
+        return previews
+
+    def get_serializer(self, *args, **kwargs):
+        size = self.get_comments_preview_size()
+        if size and kwargs.get('many') and args:
+            self.comment_previews = self.get_comment_previews(args[0], size)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        previews = getattr(self, 'comment_previews', None)
+        if previews is not None:
+            context['comment_previews'] = previews
+        return context
+
+class PostListCreateView(CommentPreviewMixin, EagerLoadingMixin, generics.ListCreateAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PostCursorPagination
 
     def get_queryset(self):
-        queryset = Post.objects.all().order_by('-created_on')
+        queryset = Post.objects.all()
         author_id = self.request.query_params.get('author')
         if author_id:
             queryset = queryset.filter(author_id=author_id)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Feed pages are shared by every reader; keep each window for a few seconds.
+        # Any post/comment/reaction change moves the feed generation and drops them all.
+        key = post_cache.feed_page_key(request.build_absolute_uri())
+        data = post_cache.get_feed_page(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        post_cache.set_feed_page(key, response.data)
+        return response
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+class FollowingFeedView(CommentPreviewMixin, EagerLoadingMixin, generics.ListAPIView):
+    """
+    Posts from the people the user follows, served from the materialized
+    TimelineEntry rows instead of joining Follow and Post on every request.
+    """
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = TimelineCursorPagination
+    eager_loading_prefix = 'post__'
+
+    def get_queryset(self):
+        return TimelineEntry.objects.filter(owner=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        # Heavily followed authors are not fanned out on write; pull them in
+        # when the first page is requested.
+        if not request.query_params.get(self.paginator.cursor_query_param):
+            timeline.pull_heavy_authors(request.user)
+
+        entries = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer([entry.post for entry in entries], many=True)
+        return self.get_paginated_response(serializer.data)
+
 @method_decorator(csrf_exempt, name="dispatch")
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PostDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
@@ -96,7 +181,7 @@ class CommentCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CommentDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
@@ -123,22 +208,73 @@ class AddReaction(APIView):
             return Response({"error": "Invalid reaction type"}, status=status.HTTP_400_BAD_REQUEST)
 
         if post_id:
-            target = get_object_or_404(Post, id=post_id)
+            target_exists = Post.objects.filter(id=post_id).exists()
         elif comment_id:
-            target = get_object_or_404(Comment, id=comment_id)
+            target_exists = Comment.objects.filter(id=comment_id).exists()
         else:
             return Response({"error": "Invalid target"}, status=status.HTTP_400_BAD_REQUEST)
+        if not target_exists:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        Reaction.objects.filter(user=request.user, post=post_id, comment=comment_id).delete()
-        reaction =Reaction.objects.create(
-            user=request.user, 
-            post=target if isinstance(target, Post) else None, 
-            comment=target if isinstance(target, Comment) else None, 
-            reaction_type=reaction_type
-        )
+        # Insert or switch the reaction in place; counters and the notification
+        # are updated in the same transaction
+        Reaction.upsert(request.user, reaction_type, post_id=post_id, comment_id=comment_id)
 
         return Response({"message": "Reaction added successfully"}, status=status.HTTP_201_CREATED)
 
+class ReactionStateView(APIView):
+    """
+    Reaction buttons for a whole feed page in one round trip.
+    `?posts=1,2,3&comments=4,5` returns, per id, the caller's reaction and the
+    per-type counts: one query for the caller's reactions, one per target model
+    for the counter columns.
+    """
+    permission_classes = [IsAuthenticated]
+    max_ids = 100
+
+    def parse_ids(self, request, param):
+        raw = request.query_params.get(param, '')
+        try:
+            return list(dict.fromkeys(int(value) for value in raw.split(',') if value.strip()))
+        except ValueError:
+            raise ValidationError(f"'{param}' must be a comma separated list of ids")
+
+    def get(self, request):
+        try:
+            post_ids = self.parse_ids(request, 'posts')
+            comment_ids = self.parse_ids(request, 'comments')
+        except ValidationError as e:
+            return Response({"error": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        if len(post_ids) + len(comment_ids) > self.max_ids:
+            return Response({"error": f"At most {self.max_ids} ids per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        mine = {'post': {}, 'comment': {}}
+        if post_ids or comment_ids:
+            rows = Reaction.objects.filter(
+                Q(post_id__in=post_ids) | Q(comment_id__in=comment_ids), user=request.user
+            ).values_list('post_id', 'comment_id', 'reaction_type')
+            for reaction_post_id, reaction_comment_id, reaction_type in rows:
+                if reaction_post_id:
+                    mine['post'][reaction_post_id] = reaction_type
+                else:
+                    mine['comment'][reaction_comment_id] = reaction_type
+
+        count_fields = [Reaction.count_field(reaction) for reaction, _ in Reaction.REACTIONS]
+
+        def state(model, ids, key):
+            result = {}
+            for target in model.objects.filter(id__in=ids).only('id', *count_fields):
+                result[str(target.id)] = {
+                    "my_reaction": mine[key].get(target.id),
+                    "reaction_counts": target.reaction_counts(),
+                }
+            return result
+
+        return Response({
+            "posts": state(Post, post_ids, 'post') if post_ids else {},
+            "comments": state(Comment, comment_ids, 'comment') if comment_ids else {},
+        }, status=status.HTTP_200_OK)
+
 #   RemoveReaction API
 @method_decorator(csrf_exempt, name="dispatch")
 class RemoveReaction(APIView):
@@ -147,43 +283,68 @@ class RemoveReaction(APIView):
     def post(self, request, post_id=None, comment_id=None):
         """Removes a reaction from a post or comment"""
         if post_id:
-            target = get_object_or_404(Post, id=post_id)
-            Reaction.objects.filter(user=request.user, post=target).delete()
+            get_object_or_404(Post, id=post_id)
         elif comment_id:
-            target = get_object_or_404(Comment, id=comment_id)
-            Reaction.objects.filter(user=request.user, comment=target).delete()
+            get_object_or_404(Comment, id=comment_id)
         else:
             return Response({"error": "Invalid target"}, status=status.HTTP_400_BAD_REQUEST)
 
+        Reaction.remove(request.user, post_id=post_id, comment_id=comment_id)
+
         return Response({"success": True}, status=status.HTTP_200_OK)
 
 @method_decorator(csrf_exempt, name="dispatch")
-class ListCommentsView(generics.ListAPIView):
+class ListCommentsView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CommentCursorPagination
 
     def get_queryset(self):
-        # Get the post using the 'post_id' in the URL
+        # Get the post using the 'post_id' in the URL; ordering comes from the paginator
         post_id = self.kwargs['post_id']
-        return Comment.objects.filter(post_id=post_id).order_by('-created_on')  # Assuming you have a 'created_on' field
-@method_decorator(csrf_exempt, name="dispatch")
-class PostReactionsView(APIView):
-    permission_classes = [IsAuthenticated]  # Ensure the user is authenticated
-    
-    def get(self, request, post_id):
-        """Retrieve all reactions for a specific post"""
-        try:
-            # Get the post instance
-            post = Post.objects.get(id=post_id)
-        except Post.DoesNotExist:
-            return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        # Filter reactions by post
-        reactions = Reaction.objects.filter(post=post)
+        return Comment.objects.filter(post_id=post_id)
+class TargetReactionsView(generics.GenericAPIView):
+    """
+    Reactions of a post or comment.
+    - `?summary=true`: total and per-type counts, read from the counter columns.
+    - otherwise: cursor-paginated reactor list (optionally `?type=Like`) that only
+      reads the username from the users table.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ReactorSerializer
+    pagination_class = ReactionCursorPagination
+    target_model = None
+    target_field = None
+    not_found_message = None
+
+    def get(self, request, **kwargs):
+        count_fields = [Reaction.count_field(reaction) for reaction, _ in Reaction.REACTIONS]
+        target = self.target_model.objects.filter(id=kwargs[f"{self.target_field}_id"]).only('id', *count_fields).first()
+        if target is None:
+            return Response({"error": self.not_found_message}, status=status.HTTP_404_NOT_FOUND)
+
+        if request.query_params.get('summary', '').lower() in ('1', 'true'):
+            counts = target.reaction_counts()
+            return Response({"total": sum(counts.values()), "reaction_counts": counts}, status=status.HTTP_200_OK)
+
+        reactions = Reaction.objects.filter(**{self.target_field: target})
+        reaction_type = request.query_params.get('type')
+        if reaction_type:
+            if reaction_type not in dict(Reaction.REACTIONS):
+                return Response({"error": "Invalid reaction type"}, status=status.HTTP_400_BAD_REQUEST)
+            reactions = reactions.filter(reaction_type=reaction_type)
+
+        rows = reactions.values('id', 'reaction_type', 'timestamp', username=F('user__username'))
+        page = self.paginate_queryset(rows)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-        # Serialize the reactions
-        serializer = ReactionSerializer(reactions, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+@method_decorator(csrf_exempt, name="dispatch")
+class PostReactionsView(TargetReactionsView):
+    """Retrieve the reactions of a specific post"""
+    target_model = Post
+    target_field = 'post'
+    not_found_message = "Post not found"
     ## Edit Comment API
 class CommentEditView(APIView):
     permission_classes = [IsAuthenticated]
@@ -225,16 +386,8 @@ class CommentDeleteView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 @method_decorator(csrf_exempt, name="dispatch")
-class CommentReactionsView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request, comment_id):
-        """Retrieve all reactions for a specific comment"""
-        try:
-            comment = Comment.objects.get(id=comment_id)
-        except Comment.DoesNotExist:
-            return Response({"error": "Comment not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        reactions = Reaction.objects.filter(comment=comment)
-        serializer = ReactionSerializer(reactions, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+class CommentReactionsView(TargetReactionsView):
+    """Retrieve the reactions of a specific comment"""
+    target_model = Comment
+    target_field = 'comment'
+    not_found_message = "Comment not found"
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_follower_counts(apps, schema_editor):
+    # One UPDATE with a correlated COUNT, so large user tables are not loaded row by row
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    totals = (
+        Follow.objects.filter(following_id=OuterRef('pk'))
+        .order_by()
+        .values('following_id')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    User.objects.update(follower_count=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_follower_counts, migrations.RunPython.noop),
+    ]
@@ -34,6 +34,10 @@ class User(AbstractUser):
     
     is_two_factor_enabled = models.BooleanField(default=False)
 
+    # Maintained from Follow saves / deletes (users/signals.py); lets the timeline
+    # tell heavily followed authors apart without counting Follow rows
+    follower_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+
 
     # Fields for password reset functionality
     password_reset_code = models.CharField(max_length=50, blank=True, null=True)  # Code for password reset
@@ -3,7 +3,9 @@ from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from chat.models import GroupChat
 from batches.models import Batch, StudentBatch
-from .models import Profile
+from django.db.models import F
+from django.db.models.functions import Greatest
+from .models import Follow, Profile
 
 #from django.contrib.auth.models import User ---> instead we will import the custom user model
 from .models import User
@@ -43,6 +45,19 @@ def add_user_to_batch_chat(sender, instance, **kwargs):
 
 # =====================================================================================================================
 
+# Keep User.follower_count in step with the Follow table
+@receiver(post_save, sender=Follow)
+def count_new_follower(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(id=instance.following_id).update(follower_count=F('follower_count') + 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_lost_follower(sender, instance, **kwargs):
+    User.objects.filter(id=instance.following_id).update(follower_count=Greatest(F('follower_count') - 1, 0))
+
+# =====================================================================================================================
+
 # Create a profile when a new user is created
 def createProfile(sender, instance, created, **kwargs):
     if created:
@@ -97,6 +97,8 @@ class LoginView(APIView):
                 access_token["is_student"] = user.is_student
                 access_token["is_supervisor"] = user.is_supervisor
                 access_token["user_id"] = user.id
+                # Lets the WebSocket middleware build the user from the token alone
+                access_token["username"] = user.username
 
                 print("Access Token Payload:", access_token)  # Debugging statement
                     